@@ -1,10 +1,27 @@
+# Event-driven gateway: one uasyncio task per job so that no I/O operation
+# (ultrasonic echo timing, HTTP upload, server outage) stalls ESP-NOW
+# reception. Needs MicroPython 1.21+ (aioespnow).
+#
+#   receive_task     - awaits ESP-NOW packets, appends them to the batch and
+#                      answers each node with its latest config frame
+#   ultrasonic_task  - samples both sensors every ULTRASONIC_INTERVAL_MS,
+#                      timing the echo with pin IRQs instead of time_pulse_us
+#   uplink_task      - flushes the batch when it is full or due, and drains
+#                      the flash rings after an outage
+#   stats_task       - prints counters for load tests (see loadgen.py)
 import network
-import espnow
-import urequests
 import json
 import time
 import ubinascii
-from machine import Pin, time_pulse_us
+from machine import Pin
+try:
+    import asyncio
+except ImportError:
+    import uasyncio as asyncio
+import aioespnow
+import wireframe  # copy EspCodes/wireframe.py to the board too
+import uplink     # and EspCodes/uplink.py
+import ringbuf    # and EspCodes/ringbuf.py
 
 # ---------------- CONFIG ----------------
 WIFI_SSID = "x"
@@ -12,10 +29,33 @@ WIFI_PASS = "duckduckduck"
 
 SERVER_HOST = "192.168.16.112"
 SERVER_PORT = 8000
-DJANGO_URL = "http://{}:{}/api/data/receive/".format(SERVER_HOST, SERVER_PORT)
+BATCH_PATH = "/api/data/receive/batch/"
+
+# Uplink batching: flush at MAX_BATCH_READINGS, or sooner so that no reading
+# reaches the server later than MAX_UPLINK_LATENCY_MS after it arrived
+MAX_BATCH_READINGS = 50
+MAX_UPLINK_LATENCY_MS = 1000
+HTTP_TIMEOUT_MS = 2000
+
+# Store-and-forward: frames that can't be uploaded wait in a flash ring
+# (2000 x 32 B slots = 64 KB) and are drained DRAIN_CHUNK at a time
+RING_PATH = "ring.dat"
+RING_CAPACITY = 2000
+DRAIN_CHUNK = 200
+# JSON readings (long node ids, other payloads) wait in their own ring of
+# larger slots (500 x 128 B = 64 KB); longer readings can't be buffered
+JSON_RING_PATH = "json_ring.dat"
+JSON_RING_CAPACITY = 500
+JSON_SLOT_SIZE = 128
+JSON_DRAIN_CHUNK = 50
+# Circuit breaker: open after 3 failures, probe after 2 s, 4 s, ... up to 5 min
+BREAKER_FAILURES = 3
+BREAKER_BASE_DELAY_MS = 2000
+BREAKER_MAX_DELAY_MS = 300000
 
 # Ultrasonic config
 ULTRASONIC_NODE_ID = "us01"
+# Until the server's first reply; after that its "sampling" advice sets the pace
 ULTRASONIC_INTERVAL_MS = 3000
 
 # Ultrasonic 1 pins
@@ -25,6 +65,12 @@ ECHO1_PIN = 18
 # Ultrasonic 2 pins
 TRIG2_PIN = 19
 ECHO2_PIN = 21
+
+# Echo timeout: 30 ms covers ~5 m
+ECHO_TIMEOUT_MS = 30
+STATS_INTERVAL_MS = 30000
+# ESP-NOW keeps at most 20 peers; config frames go to the most recent ones
+MAX_ESPNOW_PEERS = 20
 # ----------------------------------------
 
 # ---------- WiFi Setup ----------
@@ -42,108 +88,319 @@ try:
 except:
     pass
 
+# Real time for stamping buffered readings; without it the server stamps them
+try:
+    import ntptime
+    ntptime.settime()
+except Exception as err:
+    print("NTP sync failed:", err)
+
 print("IP Address:", sta.ifconfig()[0])
 mac_bytes = sta.config("mac")
 print("Gateway MAC:", ubinascii.hexlify(mac_bytes, b":").decode())
 print("===========================\n")
 
 # ---------- ESP-NOW Setup ----------
-e = espnow.ESPNow()
+e = aioespnow.AIOESPNow()
 e.active(True)
 
 # ---------- Ultrasonic Setup ----------
-trig1 = Pin(TRIG1_PIN, Pin.OUT, pull=None)
-echo1 = Pin(ECHO1_PIN, Pin.IN, pull=None)
+class EchoSensor:
+    """HC-SR04 style sensor timed by pin interrupts, so waiting for the echo yields."""
 
-trig2 = Pin(TRIG2_PIN, Pin.OUT, pull=None)
-echo2 = Pin(ECHO2_PIN, Pin.IN, pull=None)
+    def __init__(self, trig_pin, echo_pin):
+        self.trig = Pin(trig_pin, Pin.OUT, pull=None)
+        self.echo = Pin(echo_pin, Pin.IN, pull=None)
+        self.trig.value(0)
+        self.flag = asyncio.ThreadSafeFlag()
+        self.rise_us = 0
+        self.duration_us = 0
+        self.echo.irq(self._edge, Pin.IRQ_RISING | Pin.IRQ_FALLING)
 
-trig1.value(0)
-trig2.value(0)
+    def _edge(self, pin):
+        now = time.ticks_us()
+        if pin.value():
+            self.rise_us = now
+        else:
+            self.duration_us = time.ticks_diff(now, self.rise_us)
+            self.flag.set()
 
-def read_ultrasonic_cm(trig, echo):
-    trig.value(0)
-    time.sleep_us(2)
-    trig.value(1)
-    time.sleep_us(10)
-    trig.value(0)
+    async def read_cm(self):
+        self.duration_us = 0
+        self.trig.value(0)
+        time.sleep_us(2)
+        self.trig.value(1)
+        time.sleep_us(10)
+        self.trig.value(0)
+        try:
+            await asyncio.wait_for_ms(self.flag.wait(), ECHO_TIMEOUT_MS)
+        except asyncio.TimeoutError:
+            return None
+        if self.duration_us <= 0:
+            return None
+        return round((self.duration_us * 0.0343) / 2, 2)
 
-    try:
-        duration = time_pulse_us(echo, 1, 30000)
-    except OSError:
-        print('la muji')
-        return None
+sensor1 = EchoSensor(TRIG1_PIN, ECHO1_PIN)
+sensor2 = EchoSensor(TRIG2_PIN, ECHO2_PIN)
 
-    if duration <= 0:
-        print('barbad muji')
+# ---------- Uplink ----------
+client = uplink.KeepAliveClient(SERVER_HOST, SERVER_PORT, timeout_ms=HTTP_TIMEOUT_MS)
+batch = uplink.Batcher(MAX_BATCH_READINGS, MAX_UPLINK_LATENCY_MS)
+breaker = uplink.CircuitBreaker(BREAKER_FAILURES, BREAKER_BASE_DELAY_MS, BREAKER_MAX_DELAY_MS)
+ring = ringbuf.FlashRing(RING_PATH, RING_CAPACITY)
+json_ring = ringbuf.FlashRing(JSON_RING_PATH, JSON_RING_CAPACITY, JSON_SLOT_SIZE)
+seq = wireframe.SeqCounter()  # for readings the gateway turns into frames
+batch_ready = asyncio.Event()
+# Server sampling advice: a config frame per node, relayed when it next sends
+node_configs = {}
+peers = []  # ESP-NOW peers, least recently used first
+ultrasonic_interval_ms = ULTRASONIC_INTERVAL_MS
+print("Buffered readings from last run:", len(ring) + len(json_ring))
+
+stats = {
+    "received": 0,     # ESP-NOW packets
+    "forwarded": 0,    # readings uploaded directly
+    "buffered": 0,     # readings written to the flash rings
+    "drained": 0,      # ring readings uploaded after an outage
+    "latency_max_ms": 0,   # oldest reading's receive -> upload done, this interval
+    "latency_sum_ms": 0,
+    "flushes": 0,
+}
+
+def to_frame(nodeid, value):
+    return wireframe.encode(nodeid, seq.next(), value, wireframe.unix_time())
+
+def add_frames(frames):
+    batch.add_frames(frames)
+    # Wake the uplink on every add, like the JSON path: with an empty batch it
+    # sleeps up to a minute and must re-read batch.ms_until_due() to keep the
+    # MAX_UPLINK_LATENCY_MS bound for a lone frame
+    batch_ready.set()
+
+def iso_time():
+    # Receive time for JSON readings, like wireframe.stamp() for frames (None
+    # until NTP has set the clock); ms precision because readings without a
+    # seq are deduplicated by timestamp
+    if not wireframe.unix_time():
         return None
+    now_ns = time.time_ns()
+    t = time.gmtime(now_ns // 1000000000)
+    return "%04d-%02d-%02dT%02d:%02d:%02d.%03dZ" % (t[0], t[1], t[2], t[3], t[4], t[5], now_ns // 1000000 % 1000)
 
-    return round((duration * 0.0343) / 2, 2)
+def buffer_frames(frames, count):
+    ring.push_frames(frames)
+    ring.sync()
+    stats["buffered"] += count
 
-def forward_to_django(payload):
+def buffer_readings(readings):
+    for reading in readings:
+        json_ring.push(json.dumps(reading).encode())
+    json_ring.sync()
+    stats["buffered"] += len(readings)
+
+async def upload(body, content_type):
+    status, reply = await client.post(BATCH_PATH, body, content_type)
+    if status >= 500:
+        raise OSError("server error %d" % status)
+    if status >= 300:
+        # The server is up but refused the data - retrying won't help
+        print("!! Server rejected upload:", status)
+    return reply
+
+def apply_sampling(reply):
+    # {"data": {"sampling": {nodeid: {"next_interval_ms": ..., "threshold": ..., "hysteresis": ...}}}}
+    global ultrasonic_interval_ms
     try:
-        headers = {"Content-Type": "application/json"}
-        r = urequests.post(
-            DJANGO_URL,
-            data=json.dumps(payload),
-            headers=headers
-        )
-        r.close()
-        print(">> Forwarded to Server:", payload)
-    except Exception as err:
-        print("!! HTTP Error:", err)
+        sampling = json.loads(reply)["data"]["sampling"]
+    except (ValueError, KeyError, TypeError):
+        return
+    for nodeid, advice in sampling.items():
+        interval_ms = advice["next_interval_ms"]
+        if nodeid == ULTRASONIC_NODE_ID:
+            ultrasonic_interval_ms = interval_ms
+        elif len(nodeid) <= 4:
+            node_configs[nodeid] = wireframe.encode_config(
+                nodeid, interval_ms, advice["threshold"], advice.get("hysteresis")
+            )
 
-# ---------- Main Loop ----------
-print("Gateway running...")
-last_ultrasonic_time = 0
+def espnow_error(err):
+    # MicroPython raises OSError(errno, "ESP_ERR_ESPNOW_...")
+    return err.args[1] if len(err.args) > 1 else str(err)
 
-while True:
-    now = time.ticks_ms()
+def use_peer(mac):
+    # Register mac as a peer, evicting the least recently used one when the
+    # ESP-NOW table is full. Returns False if it can't be added.
+    if mac in peers:
+        peers.remove(mac)
+        peers.append(mac)
+        return True
+    if len(peers) >= MAX_ESPNOW_PEERS:
+        oldest = peers.pop(0)
+        try:
+            e.del_peer(oldest)
+        except OSError as err:
+            print("!! Peer removal failed:", espnow_error(err))
+    try:
+        e.add_peer(mac)
+    except OSError as err:
+        if espnow_error(err) != "ESP_ERR_ESPNOW_EXIST":
+            print("!! Peer add failed:", espnow_error(err))
+            return False
+    peers.append(mac)
+    return True
 
-    # 1. Receive ESP-NOW packets
+async def send_config(mac, nodeid):
+    config = node_configs.get(nodeid)
+    if config is None or not use_peer(mac):
+        return
     try:
-        host, msg = e.irecv(0)
-        if msg:
-            try:
-                data = json.loads(msg.decode())
-                print("<< Received ESP-NOW:", data)
-                forward_to_django(data)
-            except ValueError:
-                print("Received non-JSON ESP-NOW payload")
-    except Exception:
-        pass
-
-    # 2. Read both ultrasonic sensors and average
-    if time.ticks_diff(now, last_ultrasonic_time) > ULTRASONIC_INTERVAL_MS:
-        d1 = read_ultrasonic_cm(trig1, echo1)
-        d2 = read_ultrasonic_cm(trig2, echo2)
-
-        valid_readings = []
-        if d1 is not None:
-            valid_readings.append(d1)
-        if d2 is not None:
-            valid_readings.append(d2)
+        await e.asend(mac, config, False)
+    except OSError as err:
+        print("!! Config send failed:", err)
 
-        if valid_readings:
-            avg_distance = round(
-                sum(valid_readings) / len(valid_readings),
-                2
-            )
+async def flush_batch():
+    # One POST per payload type over the same keep-alive connection;
+    # binary frames go to the batch endpoint untouched
+    if not len(batch):
+        return
+    count = len(batch)
+    first_ms = batch.first_ms
+    frames, readings = batch.take()
+    frame_count = count - len(readings)
+    # Queue behind the backlog; drain_ring uploads it in order
+    if frames and len(ring):
+        buffer_frames(frames, frame_count)
+        frames = b""
+    if readings and len(json_ring):
+        buffer_readings(readings)
+        readings = []
+    if not frames and not readings:
+        return
+    if not breaker.allow():
+        # Server is down - buffer without touching the network
+        if frames:
+            buffer_frames(frames, frame_count)
+        if readings:
+            buffer_readings(readings)
+        return
+    started = time.ticks_ms()
+    try:
+        # Only live readings update the advice - ring drains carry old values
+        if frames:
+            apply_sampling(await upload(frames, wireframe.CONTENT_TYPE))
+            frames = b""
+        if readings:
+            apply_sampling(await upload(json.dumps({"readings": readings}), "application/json"))
+            readings = []
+        breaker.success()
+        done = time.ticks_ms()
+        batch.record_upload(time.ticks_diff(done, started))
+        latency = time.ticks_diff(done, first_ms)
+        stats["forwarded"] += count
+        stats["flushes"] += 1
+        stats["latency_sum_ms"] += latency
+        stats["latency_max_ms"] = max(stats["latency_max_ms"], latency)
+    except Exception as err:
+        print("!! HTTP Error:", err)
+        breaker.failure()
+        # Whatever wasn't uploaded yet
+        if frames:
+            buffer_frames(frames, frame_count)
+        if readings:
+            buffer_readings(readings)
 
-            payload = {
-                "nodeid": ULTRASONIC_NODE_ID,
-                "value": avg_distance,
- #               "raw": {
-  #                  "sensor1": d1,
-   #                 "sensor2": d2
-       #         }
-            }
+async def drain(buffered, body, content_type, count):
+    try:
+        await upload(body, content_type)
+        breaker.success()
+        buffered.pop(count)
+        buffered.sync()
+        stats["drained"] += count
+        print(">> Drained", count, "buffered reading(s),", len(buffered), "left")
+    except Exception as err:
+        print("!! Drain failed:", err)
+        breaker.failure()
+
+async def drain_ring():
+    if len(ring) and breaker.allow():
+        frames, count = ring.peek(DRAIN_CHUNK)
+        await drain(ring, frames, wireframe.CONTENT_TYPE, count)
+    if len(json_ring) and breaker.allow():
+        records, count = json_ring.peek_records(JSON_DRAIN_CHUNK)
+        body = b'{"readings": [' + b",".join(records) + b"]}"
+        await drain(json_ring, body, "application/json", count)
+
+# ---------- Tasks ----------
+async def receive_task():
+    async for mac, msg in e:
+        stats["received"] += 1
+        if wireframe.is_frame(msg):
+            # Stamp with receive time so buffered frames keep it
+            add_frames(wireframe.stamp(msg, wireframe.unix_time()))
+            # The node listens briefly after each send (see Kullo1.py)
+            await send_config(mac, wireframe.node_id(msg))
+            continue
+        try:
+            data = json.loads(msg.decode())
+        except ValueError:
+            print("Received non-JSON ESP-NOW payload")
+            continue
+        nodeid = str(data.get("nodeid", ""))
+        if 0 < len(nodeid) <= 4 and "value" in data:
+            # Short ids fit a frame, which the ring can buffer
+            add_frames(to_frame(nodeid, data["value"]))
+            await send_config(mac, nodeid)
+        else:
+            # Stamped now so a reading buffered through an outage keeps it
+            received_at = iso_time()
+            if received_at and "timestamp" not in data:
+                data["timestamp"] = received_at
+            batch.add_reading(data)
+            batch_ready.set()
 
-            forward_to_django(payload)
+async def ultrasonic_task():
+    while True:
+        d1 = await sensor1.read_cm()
+        d2 = await sensor2.read_cm()
+        valid_readings = [d for d in (d1, d2) if d is not None]
+        if valid_readings:
+            avg_distance = round(sum(valid_readings) / len(valid_readings), 2)
+            add_frames(to_frame(ULTRASONIC_NODE_ID, avg_distance))
         else:
             print("Ultrasonic read failed on both sensors")
+        await asyncio.sleep_ms(ultrasonic_interval_ms)
+
+async def uplink_task():
+    while True:
+        wait_ms = batch.ms_until_due()
+        if wait_ms is None:
+            # Nothing waiting: sleep until a reading arrives (or poll the ring)
+            wait_ms = 1000 if len(ring) or len(json_ring) else 60000
+        if wait_ms:
+            batch_ready.clear()
+            try:
+                await asyncio.wait_for_ms(batch_ready.wait(), wait_ms)
+            except asyncio.TimeoutError:
+                pass
+        if batch.due():
+            await flush_batch()
+        await drain_ring()
 
-        last_ultrasonic_time = now
+async def stats_task():
+    while True:
+        await asyncio.sleep_ms(STATS_INTERVAL_MS)
+        flushes = stats["flushes"] or 1
+        print("Stats: rx=%d fwd=%d buf=%d drained=%d dropped=%d ring=%d latency avg=%dms max=%dms" % (
+            stats["received"], stats["forwarded"], stats["buffered"], stats["drained"],
+            ring.dropped + json_ring.dropped, len(ring) + len(json_ring),
+            stats["latency_sum_ms"] // flushes, stats["latency_max_ms"]))
+        stats["latency_sum_ms"] = stats["latency_max_ms"] = stats["flushes"] = 0
 
-    time.sleep_ms(10)
+async def main():
+    print("Gateway running...")
+    asyncio.create_task(receive_task())
+    asyncio.create_task(ultrasonic_task())
+    asyncio.create_task(stats_task())
+    await uplink_task()
 
+asyncio.run(main())
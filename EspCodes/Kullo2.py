@@ -1,8 +1,10 @@
 import network
 import espnow
 import time
-import json
+import machine
 from machine import ADC, Pin
+import wireframe  # copy EspCodes/wireframe.py to the board too
+import reporting  # and EspCodes/reporting.py
 
 # ---------------- CONFIG ----------------
 NODE_ID = "002"
@@ -10,6 +12,26 @@ DEVICE_NAME = "Kullo2"
 SENSOR_PIN = 34
 READ_INTERVAL = 5000 
 
+# Report-on-change: send when the value moves more than DEADBAND points,
+# crosses THRESHOLD (the server's config frame keeps it in sync), or after
+# HEARTBEAT_S of silence. Within GUARD_BAND of the threshold sample every
+# FAST_INTERVAL ms so crossings aren't delayed. Once the server has sent its
+# motor hysteresis, a crossing is passing either edge where it switches the
+# motor (threshold +/- that); before, a crossing counts once the value is
+# HYSTERESIS points past the threshold. HYSTERESIS also stops noise flapping.
+OVERSAMPLE = 9
+DEADBAND = 2.0
+HEARTBEAT_S = 300
+THRESHOLD = 50.0
+GUARD_BAND = 5.0
+HYSTERESIS = 0.5
+FAST_INTERVAL = 1000
+# After each send, listen this long for the gateway's config frame: the
+# server's recommended READ_INTERVAL and THRESHOLD for this node
+CONFIG_WAIT_MS = 50
+# Deep sleep between samples (battery/solar); WiFi/ESP-NOW restart each wake
+DEEP_SLEEP = False
+
 # !!! UPDATE THESE TWO LINES FROM GATEWAY OUTPUT !!!
 GATEWAY_MAC = b'\xcc\x50\xe3\x93\x0f\x58'  # Example: b'\x24\x6f...'
 WIFI_CHANNEL = 3  # MUST match the Gateway's channel
@@ -39,29 +61,55 @@ adc = ADC(Pin(SENSOR_PIN))
 adc.atten(ADC.ATTN_11DB)
 adc.width(ADC.WIDTH_12BIT)
 
+def read_raw():
+    return adc.read()
+
 def read_humidity():
-    raw = adc.read()
+    raw = reporting.median_read(read_raw, OVERSAMPLE)
     # Map 0-4095 to 0-100%
     return round((raw / 4095.0) * 100, 2)
 
+policy = reporting.ReportPolicy(
+    DEADBAND, HEARTBEAT_S, THRESHOLD, GUARD_BAND, READ_INTERVAL, FAST_INTERVAL, HYSTERESIS
+)
+
+# Sequence numbers let the server drop retried duplicates; after a deep-sleep
+# wake both the counter and the policy come back from RTC memory
+seq = wireframe.SeqCounter(resume=reporting.load_rtc_state(policy))
+
 def send_data(val):
-    payload = {
-        "nodeid": NODE_ID,
-        "value": val
-    }
-    msg = json.dumps(payload)
+    # 16-byte binary frame instead of a JSON string (see wireframe.py)
+    msg = wireframe.encode(NODE_ID, seq.next(), val)
     
     try:
         e.send(GATEWAY_MAC, msg)
-        print(f"Sent: {msg}")
+        return True
     except OSError as err:
         if err.args[0] == 116: # ESP_ERR_ESPNOW_NOT_FOUND
             print("Error: Gateway not found (Check Channel/MAC)")
         else:
             print("Send Error:", err)
+        return False
+
+def receive_config():
+    host, msg = e.recv(CONFIG_WAIT_MS)
+    config = wireframe.decode_config(msg) if msg else None
+    if config and config[0] == NODE_ID:
+        _, interval_ms, threshold, motor_hysteresis = config
+        policy.apply_config(interval_ms, threshold, motor_hysteresis)
+        print(f"Config: interval {interval_ms} ms, threshold {threshold} +/- {motor_hysteresis}")
 
 while True:
     hum = read_humidity()
-    send_data(hum)
-    time.sleep_ms(READ_INTERVAL)
-
+    now = time.time()
+    reason = policy.reason(hum, now)
+    if reason and send_data(hum):
+        policy.sent(hum, now)
+        print(f"Sent: {NODE_ID} {hum}% ({reason})")
+        receive_config()
+    
+    interval = policy.next_interval_ms(hum)
+    if DEEP_SLEEP:
+        reporting.save_rtc_state(policy, seq)
+        machine.deepsleep(interval)
+    time.sleep_ms(interval)
@@ -0,0 +1,68 @@
+# ESP-NOW load generator for gateway testing (MicroPython)
+# Flash to a spare ESP32 together with wireframe.py. It impersonates
+# VIRTUAL_NODES sensor nodes ("L000", "L001", ...), each sending one frame
+# every PERIOD_MS, spread evenly over the period so the gateway sees a
+# steady packet rate instead of bursts.
+#
+# Every virtual node has its own sequence counter, so the backend can count
+# lost packets from gaps: python manage.py uplink_report --prefix L
+#
+# Use two boards (different PREFIX) to go past what one radio can send.
+
+import network
+import espnow
+import time
+import wireframe
+
+# ---------------- CONFIG ----------------
+GATEWAY_MAC = b'\xcc\x50\xe3\x93\x0f\x58'  # from the gateway's boot output
+WIFI_CHANNEL = 3  # MUST match the Gateway's channel
+PREFIX = "L"          # node ids are PREFIX + 3 digits
+VIRTUAL_NODES = 24
+PERIOD_MS = 1000      # per virtual node
+DURATION_S = 600      # 0 = run forever
+# ----------------------------------------
+
+sta = network.WLAN(network.STA_IF)
+sta.active(True)
+sta.config(channel=WIFI_CHANNEL)
+sta.disconnect()
+
+e = espnow.ESPNow()
+e.active(True)
+try:
+    e.add_peer(GATEWAY_MAC)
+except OSError:
+    pass
+
+# One boot epoch for all virtual nodes; counts restart at 0 every run
+epoch = wireframe.SeqCounter().epoch
+node_ids = ["%s%03d" % (PREFIX, i) for i in range(VIRTUAL_NODES)]
+counts = [0] * VIRTUAL_NODES
+gap_ms = max(1, PERIOD_MS // VIRTUAL_NODES)
+
+print("Load: %d nodes x %d ms, one frame every %d ms" % (VIRTUAL_NODES, PERIOD_MS, gap_ms))
+started = time.ticks_ms()
+sent = failed = 0
+node = 0
+
+while not DURATION_S or time.ticks_diff(time.ticks_ms(), started) < DURATION_S * 1000:
+    next_at = time.ticks_add(time.ticks_ms(), gap_ms)
+    value = 30 + (counts[node] % 40)  # sweeps across the 50% threshold
+    frame = wireframe.encode(node_ids[node], (epoch << 16) | counts[node], value)
+    counts[node] += 1
+    try:
+        if e.send(GATEWAY_MAC, frame):
+            sent += 1
+        else:
+            failed += 1
+    except OSError:
+        failed += 1
+    node = (node + 1) % VIRTUAL_NODES
+    if sent and sent % 1000 == 0:
+        print("sent=%d failed=%d" % (sent, failed))
+    delay = time.ticks_diff(next_at, time.ticks_ms())
+    if delay > 0:
+        time.sleep_ms(delay)
+
+print("Done: sent=%d failed=%d (per node: %d)" % (sent, failed, max(counts)))
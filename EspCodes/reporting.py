@@ -0,0 +1,158 @@
+# Sensor node reporting policy: oversampling + report-on-change (MicroPython)
+# Copy this file to every Kullo node alongside main.py and wireframe.py.
+#
+# A node reads its sensor every interval but only transmits when:
+#   - the median-filtered value moved by more than the deadband since the
+#     last transmitted value, or
+#   - it crossed an edge where the server switches the motor (always sent,
+#     even inside the deadband; a small hysteresis keeps noise around the
+#     edge from flapping), or
+#   - nothing was sent for heartbeat_s (so the server knows the node is alive).
+# Near the threshold the node samples faster, so a crossing is reported
+# within fast_interval_ms rather than a full interval later.
+#
+# The server can override the base interval and threshold with a config frame
+# relayed by the gateway (wireframe.decode_config -> ReportPolicy.apply_config):
+# long while the soil is far from the threshold, short near it or while the
+# motor runs. The frame also carries the server's motor hysteresis: the motor
+# switches ON above threshold + hysteresis and OFF at or below threshold -
+# hysteresis, so those two edges are what the node watches.
+
+import struct
+import time
+
+try:
+    import machine
+except ImportError:
+    machine = None
+
+RTC_MAGIC = 0x4B57
+# magic, last sent value, last sent time (s), seq epoch, seq count,
+# base interval (ms), threshold and motor hysteresis (-1 = none) - the last
+# three as set by the server
+RTC_FMT = "<HfIHIIff"
+
+
+def median_read(read, samples=9, gap_us=200):
+    """Median of `samples` consecutive reads - rejects ADC spikes cheaply."""
+    values = []
+    for _ in range(samples):
+        values.append(read())
+        time.sleep_us(gap_us)
+    values.sort()
+    return values[len(values) // 2]
+
+
+class ReportPolicy:
+    """Decides whether a reading is worth transmitting and how long to wait for the next."""
+
+    def __init__(self, deadband=2.0, heartbeat_s=300, threshold=50.0, guard_band=5.0,
+                 interval_ms=5000, fast_interval_ms=1000, hysteresis=0.5):
+        self.deadband = deadband
+        self.heartbeat_s = heartbeat_s
+        self.threshold = threshold
+        self.guard_band = guard_band
+        self.interval_ms = interval_ms
+        self.fast_interval_ms = fast_interval_ms
+        self.hysteresis = hysteresis
+        self.motor_hysteresis = None  # the server's, from the config frame
+        self.last_value = None
+        self.last_sent_s = 0
+        self.above = None  # which side of each switching edge was last reported
+
+    def _edges(self):
+        """(rise, fall) per switching edge: above past rise, below at or under fall."""
+        if not self.motor_hysteresis:
+            # One edge at the threshold, cleared by the hysteresis either way
+            return ((self.threshold + self.hysteresis, self.threshold - self.hysteresis),)
+        on = self.threshold + self.motor_hysteresis
+        off = self.threshold - self.motor_hysteresis
+        # Exactly where the server switches, with the hysteresis on the way back
+        return ((on, on - self.hysteresis), (off + self.hysteresis, off))
+
+    def _above(self, value):
+        sides = []
+        for i, (rise, fall) in enumerate(self._edges()):
+            if value > rise:
+                sides.append(True)
+            elif value <= fall:
+                sides.append(False)
+            elif self.above is not None:
+                # Inside the hysteresis the side doesn't change
+                sides.append(self.above[i])
+            else:
+                sides.append(value > (rise + fall) / 2)
+        return tuple(sides)
+
+    def reason(self, value, now_s):
+        """Why this reading should be sent ("first", "crossing", "change", "heartbeat") or None."""
+        last = self.last_value
+        if last is None:
+            return "first"
+        if self.threshold is not None and self._above(value) != self.above:
+            return "crossing"
+        if abs(value - last) > self.deadband:
+            return "change"
+        if now_s - self.last_sent_s >= self.heartbeat_s:
+            return "heartbeat"
+        return None
+
+    def sent(self, value, now_s):
+        self.last_value = value
+        self.last_sent_s = now_s
+        if self.threshold is not None:
+            self.above = self._above(value)
+
+    def apply_config(self, interval_ms, threshold, motor_hysteresis=None):
+        """Adopt the server's recommended base interval, motor threshold and hysteresis."""
+        self.interval_ms = max(self.fast_interval_ms, interval_ms)
+        if threshold != self.threshold or motor_hysteresis != self.motor_hysteresis:
+            self.threshold = threshold
+            self.motor_hysteresis = motor_hysteresis
+            self.above = None
+            if threshold is not None and self.last_value is not None:
+                self.above = self._above(self.last_value)
+
+    def next_interval_ms(self, value):
+        """Sample faster while the value sits close to the threshold."""
+        if self.threshold is not None and abs(value - self.threshold) <= self.guard_band:
+            return self.fast_interval_ms
+        return self.interval_ms
+
+
+def save_rtc_state(policy, seq):
+    """Keep policy and sequence state in RTC memory, which survives deep sleep."""
+    if machine is None:
+        return
+    last = policy.last_value if policy.last_value is not None else -1.0
+    threshold = policy.threshold if policy.threshold is not None else -1.0
+    motor_hysteresis = policy.motor_hysteresis if policy.motor_hysteresis is not None else -1.0
+    machine.RTC().memory(struct.pack(
+        RTC_FMT, RTC_MAGIC, last, int(policy.last_sent_s), seq.epoch, seq.count,
+        policy.interval_ms, threshold, motor_hysteresis
+    ))
+
+
+def load_rtc_state(policy):
+    """
+    Restore policy state after a deep-sleep wake. Returns (epoch, count) for
+    wireframe.SeqCounter(resume=...), or None on a cold boot.
+    """
+    if machine is None or machine.reset_cause() != machine.DEEPSLEEP_RESET:
+        return None
+    raw = machine.RTC().memory()
+    if len(raw) < struct.calcsize(RTC_FMT):
+        return None
+    magic, last, last_sent_s, epoch, count, interval_ms, threshold, motor_hysteresis = struct.unpack(
+        RTC_FMT, raw[:struct.calcsize(RTC_FMT)]
+    )
+    if magic != RTC_MAGIC:
+        return None
+    policy.interval_ms = interval_ms
+    policy.threshold = threshold if threshold >= 0 else None
+    policy.motor_hysteresis = motor_hysteresis if motor_hysteresis >= 0 else None
+    policy.last_value = last if last >= 0 else None
+    policy.last_sent_s = last_sent_s
+    if policy.last_value is not None and policy.threshold is not None:
+        policy.above = policy._above(policy.last_value)
+    return epoch, count
@@ -0,0 +1,130 @@
+# Flash-backed ring buffer of binary frames for the gateway (MicroPython)
+# Copy this file to the gateway alongside main.py.
+#
+# While the server is unreachable the gateway appends frames here instead of
+# dropping them, then drains the buffer in bulk once the server is back.
+# Frames are stamped with the gateway's receive time before they are stored
+# (see wireframe.stamp), so late uploads keep their original timestamps.
+# A second ring with larger slots holds JSON readings the same way, one
+# encoded reading per slot (push / peek_records).
+#
+# File layout: 12-byte header (magic, slot size, head, count) followed by
+# `capacity` fixed-size slots of [length byte][record bytes]. The header is
+# only rewritten on sync(), so a power cut can at worst resend frames the
+# server already has - the backend skips those by (nodeid, seq).
+
+import struct
+
+import wireframe
+
+MAGIC = 0x5242
+HEADER_FMT = "<HHII"
+HEADER_SIZE = struct.calcsize(HEADER_FMT)
+
+
+class FlashRing:
+    """Fixed-capacity FIFO of frames stored in a file; overwrites the oldest when full."""
+
+    def __init__(self, path="ring.dat", capacity=2000, slot_size=32):
+        self.path = path
+        self.capacity = capacity
+        self.slot_size = slot_size
+        self.head = 0
+        self.count = 0
+        self.dropped = 0
+        self._dirty = False
+        self._file = None
+        try:
+            self._open_existing()
+        except (OSError, ValueError):
+            self._create()
+
+    def _open_existing(self):
+        f = open(self.path, "r+b")
+        try:
+            magic, slot_size, head, count = struct.unpack(HEADER_FMT, f.read(HEADER_SIZE))
+        except Exception:
+            f.close()
+            raise ValueError("bad header")
+        if magic != MAGIC or slot_size != self.slot_size or head >= self.capacity or count > self.capacity:
+            f.close()
+            raise ValueError("ring geometry changed")
+        self._file = f
+        self.head = head
+        self.count = count
+
+    def _create(self):
+        f = open(self.path, "w+b")
+        f.write(struct.pack(HEADER_FMT, MAGIC, self.slot_size, 0, 0))
+        # Preallocate in small pieces to keep heap use low
+        zeros = bytes(512)
+        remaining = self.capacity * self.slot_size
+        while remaining > 0:
+            f.write(zeros[:min(remaining, 512)])
+            remaining -= 512
+        f.flush()
+        self._file = f
+
+    def __len__(self):
+        return self.count
+
+    def _seek_slot(self, index):
+        self._file.seek(HEADER_SIZE + index * self.slot_size)
+
+    def push(self, frame):
+        """Append one frame (or record); the oldest is overwritten when full."""
+        if len(frame) >= self.slot_size:
+            print("Ring: record too large, dropped")
+            self.dropped += 1
+            return
+        slot = (self.head + self.count) % self.capacity
+        if self.count == self.capacity:
+            self.head = (self.head + 1) % self.capacity
+            self.dropped += 1
+        else:
+            self.count += 1
+        self._seek_slot(slot)
+        self._file.write(bytes([len(frame)]) + frame)
+        self._dirty = True
+
+    def push_frames(self, buf):
+        """Split a buffer of concatenated frames and append each one."""
+        offset = 0
+        while offset + wireframe.HEADER_SIZE <= len(buf):
+            size = wireframe.frame_size(buf, offset)
+            self.push(bytes(buf[offset:offset + size]))
+            offset += size
+
+    def _read(self, i):
+        self._seek_slot((self.head + i) % self.capacity)
+        slot = self._file.read(self.slot_size)
+        return slot[1:1 + slot[0]]
+
+    def peek(self, max_frames):
+        """Return (concatenated frames, count) for up to max_frames oldest frames."""
+        n = min(max_frames, self.count)
+        out = bytearray()
+        for i in range(n):
+            out.extend(self._read(i))
+        return bytes(out), n
+
+    def peek_records(self, max_records):
+        """Return (list of records, count) for up to max_records oldest records."""
+        n = min(max_records, self.count)
+        return [self._read(i) for i in range(n)], n
+
+    def pop(self, n):
+        """Drop the n oldest frames (after they were uploaded)."""
+        n = min(n, self.count)
+        self.head = (self.head + n) % self.capacity
+        self.count -= n
+        self._dirty = True
+
+    def sync(self):
+        """Persist head/count. Called once per flush, not per frame, to spare the flash."""
+        if not self._dirty:
+            return
+        self._file.seek(0)
+        self._file.write(struct.pack(HEADER_FMT, MAGIC, self.slot_size, self.head, self.count))
+        self._file.flush()
+        self._dirty = False
@@ -0,0 +1,266 @@
+# Host-side tests for the gateway (CPython, not the board), plus the node
+# reporting policy it configures
+#
+#   python -m unittest EspCodes/test_gateway_host.py
+#
+# Gateway.py is imported with stand-ins for the MicroPython-only modules
+# (machine, network, aioespnow, ...) and the MicroPython additions to time and
+# asyncio (ticks_ms, sleep_ms, wait_for_ms, ThreadSafeFlag). The import skips
+# asyncio.run(main()), so each test drives the tasks it needs itself.
+
+import asyncio
+import binascii
+import importlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import types
+import unittest
+from unittest import mock
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# MicroPython time: wrap-around tick counters (no wrap needed on a host)
+_TIME = {
+    "ticks_ms": lambda: time.monotonic_ns() // 1000000,
+    "ticks_us": lambda: time.monotonic_ns() // 1000,
+    "ticks_diff": lambda a, b: a - b,
+    "ticks_add": lambda a, b: a + b,
+    "sleep_us": lambda us: None,
+}
+
+
+async def _wait_for_ms(awaitable, ms):
+    return await asyncio.wait_for(awaitable, ms / 1000)
+
+
+async def _sleep_ms(ms):
+    await asyncio.sleep(ms / 1000)
+
+
+_ASYNCIO = {
+    "wait_for_ms": _wait_for_ms,
+    "sleep_ms": _sleep_ms,
+    "ThreadSafeFlag": asyncio.Event,
+}
+
+
+class _Anything:
+    """Accepts any call or attribute - stands in for WLAN, Pin and AIOESPNow."""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __call__(self, *args, **kwargs):
+        return _Anything()
+
+    def __getattr__(self, name):
+        return _Anything()
+
+    def __or__(self, other):
+        return self
+
+    def isconnected(self):
+        return True
+
+    def config(self, *args, **kwargs):
+        return b"\x00" * 6
+
+    def ifconfig(self):
+        return ("127.0.0.1",)
+
+
+def _module(name, **attrs):
+    module = types.ModuleType(name)
+    module.__dict__.update(attrs)
+    return module
+
+
+def import_gateway(workdir):
+    """Import a fresh Gateway module with the board stubbed out."""
+    stubs = {
+        "network": _module("network", WLAN=_Anything, STA_IF=0),
+        "machine": _module("machine", Pin=_Anything()),
+        "aioespnow": _module("aioespnow", AIOESPNow=_Anything),
+        "ubinascii": binascii,
+        "ntptime": _module("ntptime", settime=lambda: None),
+    }
+    patches = [mock.patch.dict(sys.modules, stubs), mock.patch.object(sys, "path", [HERE] + sys.path)]
+    patches += [mock.patch.object(time, name, value, create=True) for name, value in _TIME.items()]
+    patches += [mock.patch.object(asyncio, name, value, create=True) for name, value in _ASYNCIO.items()]
+    for patch in patches:
+        patch.start()
+    cwd = os.getcwd()
+    os.chdir(workdir)  # the flash ring file
+    try:
+        for name in ("Gateway", "uplink", "ringbuf", "wireframe"):
+            sys.modules.pop(name, None)
+        # Don't start the gateway: close main() instead of running it
+        with mock.patch.object(asyncio, "run", lambda coro: coro.close()):
+            return importlib.import_module("Gateway"), patches
+    finally:
+        os.chdir(cwd)
+
+
+class FakeESPNow:
+    """ESP-NOW peer table with the firmware's limit and error codes."""
+
+    def __init__(self, limit=20):
+        self.limit = limit
+        self.peers = set()
+        self.sent = []
+
+    def add_peer(self, mac):
+        if mac in self.peers:
+            raise OSError(-12395, "ESP_ERR_ESPNOW_EXIST")
+        if len(self.peers) >= self.limit:
+            raise OSError(-12394, "ESP_ERR_ESPNOW_FULL")
+        self.peers.add(mac)
+
+    def del_peer(self, mac):
+        if mac not in self.peers:
+            raise OSError(-12393, "ESP_ERR_ESPNOW_NOT_FOUND")
+        self.peers.remove(mac)
+
+    async def asend(self, mac, msg, sync=True):
+        if mac not in self.peers:
+            raise OSError(-12393, "ESP_ERR_ESPNOW_NOT_FOUND")
+        self.sent.append(mac)
+
+
+class GatewayTestCase(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.workdir, True)
+        self.gateway, self.patches = import_gateway(self.workdir)
+        self.addCleanup(self.stop_patches)
+
+    def stop_patches(self):
+        for patch in reversed(self.patches):
+            patch.stop()
+        for name in ("Gateway", "uplink", "ringbuf", "wireframe"):
+            sys.modules.pop(name, None)
+
+
+class UplinkLatencyTests(GatewayTestCase):
+
+    def test_lone_frame_is_flushed_within_latency_budget(self):
+        gateway = self.gateway
+        flushed = []
+
+        async def flush_batch():
+            flushed.append(time.ticks_ms())
+            gateway.batch.take()
+
+        async def drain_ring():
+            pass
+
+        async def scenario():
+            # The Event must belong to this loop
+            gateway.batch_ready = asyncio.Event()
+            uplink = asyncio.ensure_future(gateway.uplink_task())
+            # Let the uplink settle into its idle (60 s) wait on an empty batch
+            await asyncio.sleep(0.05)
+            added = time.ticks_ms()
+            gateway.add_frames(gateway.to_frame("n1", 42.0))
+            for _ in range(300):
+                if flushed:
+                    break
+                await asyncio.sleep(0.01)
+            uplink.cancel()
+            return added
+
+        with mock.patch.object(gateway, "flush_batch", flush_batch), \
+                mock.patch.object(gateway, "drain_ring", drain_ring):
+            added = asyncio.run(scenario())
+
+        self.assertEqual(len(flushed), 1)
+        latency = flushed[0] - added
+        self.assertLessEqual(latency, gateway.MAX_UPLINK_LATENCY_MS + 200)
+        self.assertGreaterEqual(latency, gateway.MAX_UPLINK_LATENCY_MS - 50)
+
+
+class JsonBufferingTests(GatewayTestCase):
+    def test_json_readings_survive_an_outage(self):
+        gateway = self.gateway
+        uploads = []
+
+        async def failing_upload(body, content_type):
+            raise OSError("timeout")
+
+        async def upload(body, content_type):
+            uploads.append((body, content_type))
+            return b"{}"
+
+        reading = {"nodeid": "field-7", "value": 40.5, "timestamp": "2026-01-01T10:00:00.123Z"}
+        gateway.batch.add_reading(dict(reading))
+        with mock.patch.object(gateway, "upload", failing_upload):
+            asyncio.run(gateway.flush_batch())
+        # Breaker open: buffered without touching the network
+        gateway.batch.add_reading(dict(reading, value=41.0))
+        with mock.patch.object(gateway.breaker, "allow", lambda: False):
+            asyncio.run(gateway.flush_batch())
+        self.assertEqual(len(gateway.json_ring), 2)
+
+        with mock.patch.object(gateway, "upload", upload):
+            asyncio.run(gateway.drain_ring())
+        self.assertEqual(len(gateway.json_ring), 0)
+        self.assertEqual(len(uploads), 1)
+        self.assertEqual(uploads[0][1], "application/json")
+        self.assertEqual(json.loads(uploads[0][0])["readings"], [reading, dict(reading, value=41.0)])
+
+
+class PeerTableTests(GatewayTestCase):
+    def test_config_reaches_nodes_past_the_peer_limit(self):
+        gateway = self.gateway
+        espnow = FakeESPNow()
+        macs = [bytes([0, 0, 0, 0, 0, n]) for n in range(30)]
+        gateway.node_configs.update(
+            ("n%d" % n, gateway.wireframe.encode_config("n%d" % n, 5000, 50.0)) for n in range(30)
+        )
+
+        async def scenario():
+            # 30 nodes, then the last three again (already peers)
+            for mac in macs + macs[-3:]:
+                await gateway.send_config(mac, "n%d" % mac[-1])
+
+        with mock.patch.object(gateway, "e", espnow):
+            asyncio.run(scenario())
+
+        self.assertEqual(espnow.sent, macs + macs[-3:])
+        self.assertEqual(len(espnow.peers), gateway.MAX_ESPNOW_PEERS)
+        self.assertEqual(espnow.peers, set(macs[-20:]))
+
+
+class ReportPolicyTests(unittest.TestCase):
+    def setUp(self):
+        with mock.patch.object(sys, "path", [HERE] + sys.path):
+            self.reporting = importlib.import_module("reporting")
+            self.wireframe = importlib.import_module("wireframe")
+
+    def test_config_frame_carries_motor_hysteresis(self):
+        frame = self.wireframe.encode_config("001", 5000, 50.0, 2.0)
+        self.assertEqual(self.wireframe.decode_config(frame), ("001", 5000, 50.0, 2.0))
+        # A frame from a gateway without the field
+        self.assertEqual(self.wireframe.decode_config(frame[:12]), ("001", 5000, 50.0, None))
+
+    def test_crossing_the_servers_on_edge_is_reported(self):
+        policy = self.reporting.ReportPolicy(deadband=2.0, heartbeat_s=300, threshold=50.0, hysteresis=0.5)
+        policy.apply_config(5000, 50.0, 2.0)
+        policy.sent(50.5, 0)
+        # Under the deadband and no bare-threshold crossing, but past 52 (ON)
+        self.assertIsNone(policy.reason(51.9, 1))
+        self.assertEqual(policy.reason(52.4, 2), "crossing")
+        policy.sent(52.4, 2)
+        # Noise just under the edge isn't another crossing
+        self.assertIsNone(policy.reason(51.8, 3))
+        # Down to the OFF edge (48)
+        policy.sent(49.0, 4)
+        self.assertEqual(policy.reason(48.0, 5), "crossing")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,255 @@
+# Gateway uplink: reading batcher, circuit breaker and a persistent
+# HTTP/1.1 client on uasyncio streams (MicroPython)
+# Copy this file to the gateway alongside main.py and wireframe.py.
+#
+# Instead of one urequests.post (TCP handshake, request build, close) per
+# ESP-NOW packet, the gateway collects readings in a Batcher and flushes
+# them as one POST to /api/data/receive/batch/ over a KeepAliveClient
+# connection that stays open between flushes. Every network wait is an
+# await, so ESP-NOW reception keeps running while an upload is in flight.
+
+try:
+    import asyncio
+except ImportError:
+    import uasyncio as asyncio
+import time
+
+import wireframe
+
+
+class KeepAliveClient:
+    """Minimal async HTTP/1.1 POST client that reuses one TCP connection."""
+
+    def __init__(self, host, port, timeout_ms=2000, max_body=8192):
+        self.host = host
+        self.port = port
+        self.timeout_ms = timeout_ms
+        self.max_body = max_body
+        self.reader = None
+        self.writer = None
+        self.connects = 0
+
+    async def _wait(self, awaitable):
+        try:
+            return await asyncio.wait_for_ms(awaitable, self.timeout_ms)
+        except asyncio.TimeoutError:
+            raise OSError("timeout")
+
+    async def _connect(self):
+        self.reader, self.writer = await self._wait(asyncio.open_connection(self.host, self.port))
+        self.connects += 1
+
+    async def close(self):
+        if self.writer is not None:
+            try:
+                self.writer.close()
+                await self.writer.wait_closed()
+            except Exception:
+                pass
+            self.reader = self.writer = None
+
+    async def post(self, path, body, content_type):
+        """
+        POST body and return (HTTP status code, response body bytes). Bodies
+        longer than max_body are skipped and returned as b"". A request on a
+        reused connection that the server already closed is retried once on
+        a fresh one. Raises OSError when the server can't be reached.
+        """
+        for attempt in (0, 1):
+            fresh = self.writer is None
+            if fresh:
+                await self._connect()
+            try:
+                return await self._request(path, body, content_type)
+            except OSError:
+                await self.close()
+                if fresh or attempt:
+                    raise
+
+    async def _request(self, path, body, content_type):
+        if isinstance(body, str):
+            body = body.encode()
+        head = (
+            "POST %s HTTP/1.1\r\n"
+            "Host: %s:%d\r\n"
+            "Content-Type: %s\r\n"
+            "Content-Length: %d\r\n"
+            "Connection: keep-alive\r\n\r\n"
+        ) % (path, self.host, self.port, content_type, len(body))
+        self.writer.write(head.encode())
+        self.writer.write(body)
+        await self._wait(self.writer.drain())
+
+        line = await self._wait(self.reader.readline())
+        if not line:
+            raise OSError("connection closed by server")
+        status = int(line.split(None, 2)[1])
+
+        length = None
+        close = False
+        while True:
+            line = await self._wait(self.reader.readline())
+            if not line or line == b"\r\n":
+                break
+            name, _, value = line.partition(b":")
+            name = name.strip().lower()
+            if name == b"content-length":
+                length = int(value)
+            elif name == b"connection" and value.strip().lower() == b"close":
+                close = True
+
+        body = bytearray()
+        if length is None:
+            # No length means the body runs until the server closes
+            close = True
+        else:
+            # Read (or skip) the whole body so the next response starts at a
+            # clean boundary
+            keep = length <= self.max_body
+            while length > 0:
+                chunk = await self._wait(self.reader.read(min(length, 256)))
+                if not chunk:
+                    close = True
+                    keep = False
+                    break
+                if keep:
+                    body.extend(chunk)
+                length -= len(chunk)
+            if not keep:
+                body = b""
+
+        if close:
+            await self.close()
+        return status, bytes(body)
+
+
+class Batcher:
+    """
+    Buffers binary frames and JSON readings until a flush is due.
+
+    A flush is due when max_readings are waiting, or when the oldest reading
+    is old enough that waiting any longer would push its delivery past
+    max_latency_ms (the recent upload time is subtracted, so latency is
+    bounded end to end, not just in the buffer).
+    """
+
+    def __init__(self, max_readings=50, max_latency_ms=1000):
+        self.max_readings = max_readings
+        self.max_latency_ms = max_latency_ms
+        self.upload_ms = 0
+        self._reset()
+
+    def _reset(self):
+        self.frames = bytearray()
+        self.frame_count = 0
+        self.readings = []
+        self.first_ms = None
+
+    def __len__(self):
+        return self.frame_count + len(self.readings)
+
+    def _mark(self):
+        if self.first_ms is None:
+            self.first_ms = time.ticks_ms()
+
+    def add_frames(self, msg):
+        """Add one ESP-NOW payload of one or more concatenated frames."""
+        offset = 0
+        while offset + wireframe.HEADER_SIZE <= len(msg):
+            offset += wireframe.frame_size(msg, offset)
+            self.frame_count += 1
+        self.frames.extend(msg)
+        self._mark()
+
+    def add_reading(self, reading):
+        """Add one JSON reading dict ({"nodeid": ..., "value": ...})."""
+        self.readings.append(reading)
+        self._mark()
+
+    def due(self, now=None):
+        if not len(self):
+            return False
+        if len(self) >= self.max_readings:
+            return True
+        if now is None:
+            now = time.ticks_ms()
+        budget = self.max_latency_ms - self.upload_ms
+        return time.ticks_diff(now, self.first_ms) >= budget
+
+    def ms_until_due(self, now=None):
+        """How long the uplink can sleep before this batch must go (None if empty)."""
+        if not len(self):
+            return None
+        if len(self) >= self.max_readings:
+            return 0
+        if now is None:
+            now = time.ticks_ms()
+        budget = self.max_latency_ms - self.upload_ms
+        return max(0, budget - time.ticks_diff(now, self.first_ms))
+
+    def take(self):
+        """Return (frames bytes, readings list) and start a new batch."""
+        frames, readings = bytes(self.frames), self.readings
+        self._reset()
+        return frames, readings
+
+    def record_upload(self, ms):
+        # Smoothed so one slow request doesn't collapse the batching window
+        self.upload_ms = (self.upload_ms * 3 + ms) // 4
+
+
+class CircuitBreaker:
+    """
+    Stops the gateway from hammering (and blocking on) a server that is down.
+
+    CLOSED: requests go through. After failure_threshold consecutive failures
+    it OPENs and allow() says no - readings go to the flash ring instead -
+    until the backoff expires. Then one probe is let through (HALF_OPEN): a
+    success closes the breaker, a failure reopens it with the delay doubled,
+    up to max_delay_ms.
+    """
+
+    CLOSED = 0
+    OPEN = 1
+    HALF_OPEN = 2
+
+    def __init__(self, failure_threshold=3, base_delay_ms=2000, max_delay_ms=300000):
+        self.failure_threshold = failure_threshold
+        self.base_delay_ms = base_delay_ms
+        self.max_delay_ms = max_delay_ms
+        self.state = self.CLOSED
+        self.failures = 0
+        self.delay_ms = base_delay_ms
+        self.retry_at = 0
+
+    def allow(self, now=None):
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.HALF_OPEN:
+            # The probe is still out
+            return False
+        if now is None:
+            now = time.ticks_ms()
+        if time.ticks_diff(now, self.retry_at) >= 0:
+            self.state = self.HALF_OPEN
+            return True
+        return False
+
+    def success(self):
+        if self.state != self.CLOSED:
+            print("Uplink: server reachable again")
+        self.state = self.CLOSED
+        self.failures = 0
+        self.delay_ms = self.base_delay_ms
+
+    def failure(self, now=None):
+        if now is None:
+            now = time.ticks_ms()
+        self.failures += 1
+        if self.state == self.HALF_OPEN:
+            self.delay_ms = min(self.delay_ms * 2, self.max_delay_ms)
+        elif self.failures < self.failure_threshold:
+            return
+        self.state = self.OPEN
+        self.retry_at = time.ticks_add(now, self.delay_ms)
+        print("Uplink: server down, next probe in", self.delay_ms, "ms")
@@ -0,0 +1,176 @@
+# Binary sensor frame encoder/decoder (MicroPython)
+# Copy this file to every node and to the gateway alongside main.py.
+#
+# Layout (little-endian), must match ThopaSichai_backend/soil_moisture/wire.py:
+#   0   1  version (FRAME_VERSION)
+#   1   1  flags - low nibble: number of extra channels
+#   2   4  node id, ASCII, NUL padded
+#   6   4  sequence number (uint32)
+#   10  4  timestamp, Unix seconds (0 = unknown, server stamps it)
+#   14  2  value * 100 as uint16
+#   16  2n extra channels, uint16, same scaling
+#
+# A JSON reading is ~35 bytes; a frame is 16.
+#
+# Config frames go the other way, gateway -> node, carrying the server's
+# sampling advice from the ingest response ("sampling" in the batch reply):
+#   0   1  CONFIG_KIND
+#   1   1  flags (0)
+#   2   4  node id, ASCII, NUL padded
+#   6   4  next sample interval, ms (uint32)
+#   10  2  motor threshold * 100 as uint16 (NO_THRESHOLD = sensor has no motor)
+#   12  2  motor hysteresis * 100 as uint16 (NO_THRESHOLD = unknown); the
+#          motor switches at threshold +/- hysteresis. Frames from older
+#          gateways end at byte 12.
+
+import struct
+import time
+
+FRAME_VERSION = 1
+CONTENT_TYPE = "application/vnd.thopasichai.frame"
+
+HEADER_FMT = "<BB4sIIH"
+HEADER_SIZE = struct.calcsize(HEADER_FMT)
+VALUE_SCALE = 100
+
+# MicroPython ports with a 2000-01-01 epoch need shifting to Unix time
+EPOCH_OFFSET = 946684800 if time.gmtime(0)[0] == 2000 else 0
+
+SEQ_FILE = "seq.dat"
+
+CONFIG_KIND = 0x80
+CONFIG_FMT = "<BB4sIHH"
+CONFIG_SIZE = struct.calcsize(CONFIG_FMT)
+CONFIG_V0_SIZE = CONFIG_SIZE - 2  # without the hysteresis
+NO_THRESHOLD = 0xFFFF
+
+
+def _scale(value):
+    raw = int(round(value * VALUE_SCALE))
+    if raw < 0:
+        return 0
+    if raw > 0xFFFF:
+        return 0xFFFF
+    return raw
+
+
+def encode(node_id, seq, value, timestamp=0, extras=()):
+    """Pack one reading into a frame (bytes)."""
+    header = struct.pack(
+        HEADER_FMT,
+        FRAME_VERSION,
+        len(extras) & 0x0F,
+        node_id.encode(),
+        seq & 0xFFFFFFFF,
+        timestamp,
+        _scale(value),
+    )
+    if not extras:
+        return header
+    return header + struct.pack("<%dH" % len(extras), *[_scale(x) for x in extras])
+
+
+def frame_size(buf, offset=0):
+    """Total size of the frame starting at offset (header + extra channels)."""
+    return HEADER_SIZE + 2 * (buf[offset + 1] & 0x0F)
+
+
+def is_frame(msg):
+    """True if an ESP-NOW payload looks like a binary frame rather than JSON."""
+    return len(msg) >= HEADER_SIZE and msg[0] == FRAME_VERSION
+
+
+def stamp(msg, timestamp):
+    """
+    Fill in the timestamp of every frame in msg that has none (0), e.g. with
+    the gateway's receive time. Returns msg unchanged when timestamp is 0.
+    """
+    if not timestamp:
+        return msg
+    buf = bytearray(msg)
+    offset = 0
+    while offset + HEADER_SIZE <= len(buf):
+        if struct.unpack_from("<I", buf, offset + 10)[0] == 0:
+            struct.pack_into("<I", buf, offset + 10, int(timestamp))
+        offset += frame_size(buf, offset)
+    return buf
+
+
+def node_id(msg, offset=0):
+    """Node id of the frame (or config frame) starting at offset."""
+    return bytes(msg[offset + 2:offset + 6]).rstrip(b"\x00").decode()
+
+
+def _scale_optional(value):
+    return NO_THRESHOLD if value is None else min(_scale(value), NO_THRESHOLD - 1)
+
+
+def _unscale_optional(raw):
+    return None if raw == NO_THRESHOLD else raw / VALUE_SCALE
+
+
+def encode_config(node_id, interval_ms, threshold=None, hysteresis=None):
+    """Pack the server's sampling advice for one node into a config frame."""
+    return struct.pack(
+        CONFIG_FMT, CONFIG_KIND, 0, node_id.encode(), int(interval_ms),
+        _scale_optional(threshold), _scale_optional(hysteresis)
+    )
+
+
+def decode_config(msg):
+    """
+    Return (node id, interval ms, threshold or None, hysteresis or None) for
+    a config frame, or None if msg isn't one.
+    """
+    if len(msg) < CONFIG_V0_SIZE or msg[0] != CONFIG_KIND:
+        return None
+    if len(msg) < CONFIG_SIZE:
+        msg = bytes(msg[:CONFIG_V0_SIZE]) + struct.pack("<H", NO_THRESHOLD)
+    _, _, node, interval_ms, raw_threshold, raw_hysteresis = struct.unpack(CONFIG_FMT, bytes(msg[:CONFIG_SIZE]))
+    return node.rstrip(b"\x00").decode(), interval_ms, _unscale_optional(raw_threshold), _unscale_optional(raw_hysteresis)
+
+
+def unix_time():
+    """Unix seconds if the clock looks set (NTP), else 0 so the server stamps it."""
+    now = int(time.time()) + EPOCH_OFFSET
+    # Anything before 2024 means the RTC was never set
+    return now if now > 1704067200 else 0
+
+
+class SeqCounter:
+    """
+    Per-node sequence numbers that stay unique across reboots.
+
+    The high 16 bits are a boot epoch persisted in flash (one write per boot,
+    and one more every 65536 readings); the low 16 bits count readings. The
+    server uses (nodeid, seq) to drop retried duplicates.
+    """
+
+    def __init__(self, path=SEQ_FILE, resume=None):
+        self.path = path
+        if resume is not None:
+            # (epoch, count) kept in RTC memory across deep sleep - no flash write
+            self.epoch, self.count = resume
+            return
+        try:
+            with open(path, "rb") as f:
+                epoch = struct.unpack("<H", f.read(2))[0]
+        except (OSError, ValueError):
+            epoch = 0
+        self._bump(epoch + 1)
+
+    def _bump(self, epoch):
+        self.epoch = epoch & 0xFFFF
+        self.count = 0
+        try:
+            with open(self.path, "wb") as f:
+                f.write(struct.pack("<H", self.epoch))
+        except OSError as err:
+            print("Seq persist error:", err)
+
+    def next(self):
+        if self.count > 0xFFFF:
+            self._bump(self.epoch + 1)
+        seq = (self.epoch << 16) | self.count
+        self.count += 1
+        return seq
@@ -16,8 +16,10 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ThopaSichai_backend.settings')
 
 django_asgi_app = get_asgi_application()
 
+# Imported after Django is set up - consumers pull in settings and models
+from soil_moisture.routing import websocket_urlpatterns  # noqa: E402
+
 application = ProtocolTypeRouter({
     "http": django_asgi_app,
-    # WebSocket routing will be added later
-    # "websocket": URLRouter([...]),
+    "websocket": URLRouter(websocket_urlpatterns),
 })
@@ -31,6 +31,8 @@ ALLOWED_HOSTS = ['*']  # Allow all hosts for development
 # Application definition
 
 INSTALLED_APPS = [
+    # ASGI runserver, so the dev server also serves ws/live/ and data/stream/
+    'daphne',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -173,8 +175,55 @@ SPECTACULAR_SETTINGS = {
     'SERVE_INCLUDE_SCHEMA': False,
     'COMPONENT_SPLIT_REQUEST': True,
     'SCHEMA_PATH_PREFIX': r'/api',
+    'PREPROCESSING_HOOKS': ['soil_moisture.schema.add_async_endpoints'],
 }
 
+# Sensor ingestion
+# Shared runtime state (cache version stamps) for all worker processes on this box
+STATE_DIR = BASE_DIR / '.state'
+
+# Readings per bulk INSERT when streaming NDJSON backfills to /api/data/receive/stream/
+INGEST_STREAM_CHUNK_SIZE = 500
+
+# Write-behind mode for /api/data/receive/: validate, queue, answer 202 and let a
+# background writer bulk-insert. Queued readings are lost if the process dies.
+INGEST_QUEUE_ENABLED = False
+INGEST_QUEUE_MAXSIZE = 10000  # readings; a full queue answers 503
+INGEST_QUEUE_FLUSH_INTERVAL_MS = 200
+INGEST_QUEUE_FLUSH_BATCH_SIZE = 500
+INGEST_QUEUE_RETRY_MAX_MS = 5000  # longest backoff after e.g. "database is locked"; the batch is kept
+
+# Batch/stream readings older than this are stored but don't drive motors
+# (e.g. a gateway uploading its store-and-forward buffer after an outage)
+MOTOR_DECISION_MAX_AGE_SECONDS = 900
+
+# AUTOMATIC motor control anti-flapping (see soil_moisture/motor_logic.py MotorGuard):
+# ON above threshold + MOTOR_HYSTERESIS, OFF at or below threshold - MOTOR_HYSTERESIS
+MOTOR_HYSTERESIS = 2.0
+MOTOR_MIN_ON_SECONDS = 60
+MOTOR_MIN_OFF_SECONDS = 60
+MOTOR_MAX_ON_SECONDS = 3600  # forced stop after this long (MAX_IRRIGATION_DURATION)
+MOTOR_COOLDOWN_SECONDS = 300  # rest after a forced stop (PUMP_COOLDOWN_TIME)
+
+# Longest a /api/motorsinfo/?wait=N long-poll is held (awaited on the event loop, no thread held)
+MOTORS_INFO_MAX_WAIT_SECONDS = 30
+
+# Recommended next sample interval returned to nodes (see soil_moisture/sampling.py):
+# shortest within SAMPLING_NEAR_BAND points of the threshold or while the motor
+# runs, longest from SAMPLING_FAR_BAND points away
+SAMPLING_MIN_INTERVAL_MS = 1000
+SAMPLING_MAX_INTERVAL_MS = 60000
+SAMPLING_NEAR_BAND = 5.0
+SAMPLING_FAR_BAND = 25.0
+
+# MQTT bridge (python manage.py mqtt_ingest)
+MQTT_BROKER_HOST = 'localhost'
+MQTT_BROKER_PORT = 1883
+MQTT_INGEST_TOPIC = 'irrigation/#'
+MQTT_INGEST_BATCH_SIZE = 200  # readings per bulk INSERT
+MQTT_INGEST_FLUSH_INTERVAL_MS = 500  # max wait to fill a batch
+MQTT_INGEST_QUEUE_SIZE = 5000  # a full queue blocks the MQTT client (backpressure)
+
 # Django Admin Site Configuration थोपा सिचाई
 ADMIN_SITE_HEADER = 'थोपा सिँचाइ'
 ADMIN_SITE_TITLE = 'Thopa sichai'
@@ -182,8 +231,49 @@ ADMIN_INDEX_TITLE = 'Welcome to Thopa sichai'
 
 # Channels Configuration for WebSocket
 ASGI_APPLICATION = 'ThopaSichai_backend.asgi.application'
+# Works across daphne/uvicorn worker processes without Redis: group sends go over
+# LISTEN/NOTIFY on PostgreSQL, or Unix sockets under STATE_DIR on SQLite
 CHANNEL_LAYERS = {
     'default': {
-        'BACKEND': 'channels.layers.InMemoryChannelLayer'
+        'BACKEND': 'soil_moisture.channel_layers.BroadcastChannelLayer',
+        'CONFIG': {'transport': 'auto'},
     },
 }
+
+# Live feed (ws/live/): events are coalesced per sensor and sent at most this often
+LIVE_FEED_FLUSH_MS = 250
+
+# SSE stream (data/stream/): recent events kept per worker for Last-Event-ID
+# resume, the most readings a resume replays from the database, and how often
+# an idle stream gets a keepalive comment
+STREAM_BUFFER_SIZE = 1000
+STREAM_REPLAY_LIMIT = 1000
+STREAM_HEARTBEAT_SECONDS = 15
+
+# Cache for composite payloads (stats/dashboard/, status/). Per-process memory by
+# default; a file-based cache shares entries between the worker processes on this box:
+# CACHES = {
+#     'default': {
+#         'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+#         'LOCATION': BASE_DIR / '.state' / 'cache',
+#     }
+# }
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+PAYLOAD_CACHE_ALIAS = 'default'
+PAYLOAD_CACHE_TTL_SECONDS = 10  # 0 disables the cache
+
+# Retention (python manage.py prune_readings, run daily): days each level is kept,
+# None keeps it forever. A finer level can't outlive a coarser one. Summaries
+# reaching past a horizon are answered from the coarser rollups.
+READING_RETENTION_DAYS = {
+    'raw': 30,
+    'minute': 30,
+    'hour': 730,
+    'day': None,
+}
+RETENTION_CHUNK_SIZE = 5000  # rows deleted per transaction
+RETENTION_SQLITE_VACUUM = True  # incremental vacuum after pruning (auto_vacuum=INCREMENTAL only)
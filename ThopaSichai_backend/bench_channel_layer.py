@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Benchmark broadcasting reading events through the cross-process channel layer.
+
+Starts W worker processes, each with S channels subscribed to the live.all
+group (S WebSocket consumers per daphne worker), then group_sends M messages
+of B reading events each - the shape live.publish_readings() produces - from
+a separate publisher process, as a gateway batch POST would. Reports how many
+of the W * S * M deliveries arrived and deliveries per second, next to the
+same W * S sockets served by one process with the stock InMemoryChannelLayer
+and with BroadcastChannelLayer.
+
+Deliveries are counted when a channel's receive() returns; writing the frame
+to the client socket is not included.
+
+Usage:
+    python bench_channel_layer.py                       # 4 workers x 250 sockets, 200 messages
+    python bench_channel_layer.py -w 8 -s 500 -m 1000
+    python bench_channel_layer.py --transport postgres  # needs DATABASES on PostgreSQL
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import tempfile
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ThopaSichai_backend.settings')
+django.setup()
+
+from channels.layers import InMemoryChannelLayer
+
+from soil_moisture.channel_layers import BroadcastChannelLayer
+
+GROUP = 'live.all'
+IDLE_SECONDS = 3
+
+
+def reading_message(batch, seq):
+    return {'type': 'live.events', 'events': [
+        {'type': 'reading', 'nodeid': f'{i:03d}', 'value': 42.5, 'timestamp': f'2025-12-25T10:30:{seq % 60:02d}+00:00'}
+        for i in range(batch)
+    ]}
+
+
+async def consume(layer, sockets, expected):
+    """Subscribe `sockets` channels and start a reader on each; returns (tasks, counts, done)."""
+    channels = [await layer.new_channel() for _ in range(sockets)]
+    for channel in channels:
+        await layer.group_add(GROUP, channel)
+    counts = {'n': 0, 'last': None}
+    done = asyncio.Event()
+
+    async def reader(channel):
+        while True:
+            await layer.receive(channel)
+            counts['n'] += 1
+            counts['last'] = time.time()
+            if counts['n'] == expected:
+                done.set()
+
+    tasks = [asyncio.create_task(reader(channel)) for channel in channels]
+    return tasks, counts, done
+
+
+def worker(options, ready, results):
+    logging.disable(logging.WARNING)
+
+    async def main():
+        layer = BroadcastChannelLayer(transport=options.transport, path=options.path, capacity=options.messages)
+        tasks, counts, done = await consume(layer, options.sockets, options.sockets * options.messages)
+        await asyncio.sleep(0.2)  # let the listener start
+        ready.release()
+        seen = -1
+        while not done.is_set() and counts['n'] != seen:
+            seen = counts['n']
+            try:
+                await asyncio.wait_for(done.wait(), IDLE_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+        for task in tasks:
+            task.cancel()
+        results.put((counts['n'], counts['last']))
+        layer.transport.close()
+
+    asyncio.run(main())
+
+
+async def publish(layer, messages, batch):
+    started = time.time()
+    for seq in range(messages):
+        await layer.group_send(GROUP, reading_message(batch, seq))
+    return started, time.time()
+
+
+def run_broadcast(options):
+    context = multiprocessing.get_context('fork')
+    ready, results = context.Semaphore(0), context.Queue()
+    workers = [context.Process(target=worker, args=(options, ready, results)) for _ in range(options.workers)]
+    for process in workers:
+        process.start()
+    for _ in workers:
+        ready.acquire()
+
+    publisher = BroadcastChannelLayer(transport=options.transport, path=options.path)
+    started, published = asyncio.run(publish(publisher, options.messages, options.batch))
+    delivered, finished = 0, published
+    for _ in workers:
+        count, last = results.get()
+        delivered += count
+        finished = max(finished, last or published)
+    for process in workers:
+        process.join()
+    return delivered, published - started, finished - started
+
+
+def run_in_process(options, make_layer):
+    async def main():
+        layer = make_layer()
+        sockets = options.workers * options.sockets
+        tasks, counts, done = await consume(layer, sockets, sockets * options.messages)
+        started = time.time()
+        await publish(layer, options.messages, options.batch)
+        await asyncio.wait_for(done.wait(), 60)
+        for task in tasks:
+            task.cancel()
+        return counts['n'], counts['last'] - started
+
+    return asyncio.run(main())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('-w', '--workers', type=int, default=4)
+    parser.add_argument('-s', '--sockets', type=int, default=250, help='Sockets (channels) per worker')
+    parser.add_argument('-m', '--messages', type=int, default=200)
+    parser.add_argument('-b', '--batch', type=int, default=10, help='Reading events per message')
+    parser.add_argument('--transport', default='auto', choices=('auto', 'unix', 'postgres'))
+    options = parser.parse_args()
+    options.path = tempfile.mkdtemp(prefix='bench_channels_')
+
+    sockets = options.workers * options.sockets
+    expected = sockets * options.messages
+    print(f"{options.workers} worker(s) x {options.sockets} socket(s), {options.messages} message(s) "
+          f"of {options.batch} reading(s), transport {options.transport}\n")
+
+    single = (
+        ('InMemoryChannelLayer', lambda: InMemoryChannelLayer(capacity=options.messages)),
+        ('Broadcast, 1 process', lambda: BroadcastChannelLayer(
+            transport=options.transport, path=tempfile.mkdtemp(prefix='bench_channels_'), capacity=options.messages
+        )),
+    )
+    for name, make_layer in single:
+        delivered, seconds = run_in_process(options, make_layer)
+        print(f"{name:<24} {delivered:>9}/{expected} delivered  "
+              f"{delivered / seconds:>10.0f} deliveries/s  {options.messages / seconds:>8.0f} msg/s")
+
+    delivered, publish_s, total_s = run_broadcast(options)
+    print(f"{f'Broadcast, {options.workers} workers':<24} {delivered:>9}/{expected} delivered  "
+          f"{delivered / total_s:>10.0f} deliveries/s  {options.messages / total_s:>8.0f} msg/s  "
+          f"(publisher {options.messages / publish_s:.0f} msg/s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Benchmark the device ingest endpoints on a throwaway SQLite database.
+
+Runs N POSTs against /api/data/receive/ (DRF) and /api/data/receive/fast/
+(plain Django view) in-process through the full middleware stack and prints
+requests per second for each. Both runs use the same fresh SQLite file, the
+same sensor/motor setup and AUTOMATIC mode, so only the view differs.
+
+Usage:
+    python bench_ingest.py              # 2000 requests per endpoint
+    python bench_ingest.py -n 5000
+"""
+import argparse
+import logging
+import os
+import tempfile
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ThopaSichai_backend.settings')
+django.setup()
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connections
+from django.test import Client
+
+
+def use_temp_database():
+    """Point the default database at a fresh SQLite file and migrate it."""
+    path = os.path.join(tempfile.mkdtemp(prefix='bench_ingest_'), 'bench.sqlite3')
+    connections['default'].close()
+    settings.DATABASES['default']['NAME'] = path
+    connections['default'].settings_dict['NAME'] = path
+    settings.STATE_DIR = os.path.join(os.path.dirname(path), '.state')
+    call_command('migrate', verbosity=0)
+    return path
+
+
+def setup_sensors(count):
+    from soil_moisture.models import Sensor, Motor, ThresholdConfig, SystemMode
+
+    SystemMode.set_mode(SystemMode.Mode.AUTOMATIC)
+    for i in range(count):
+        sensor = Sensor.objects.create(nodeid=f'{i:03d}')
+        Motor.objects.create(sensor=sensor, name=f'Pump {i}')
+        ThresholdConfig.objects.create(sensor=sensor, threshold=50.0)
+
+
+def run(client, url, requests, sensors):
+    # Moisture alternates around the threshold so some requests flip a motor
+    payloads = [
+        f'{{"nodeid": "{i % sensors:03d}", "value": {30.0 if (i // sensors) % 4 else 70.0}}}'
+        for i in range(requests)
+    ]
+    client.post(url, payloads[0], content_type='application/json')  # warm caches
+
+    started = time.perf_counter()
+    for payload in payloads:
+        response = client.post(url, payload, content_type='application/json')
+        assert response.status_code == 201, response.content
+    elapsed = time.perf_counter() - started
+    return requests / elapsed, elapsed * 1000 / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('-n', '--requests', type=int, default=2000)
+    parser.add_argument('-s', '--sensors', type=int, default=10)
+    args = parser.parse_args()
+
+    # Per-request INFO logging would dominate the measurement
+    logging.disable(logging.INFO)
+
+    path = use_temp_database()
+    setup_sensors(args.sensors)
+    client = Client()
+
+    print(f"SQLite database: {path}")
+    print(f"{args.requests} requests per endpoint, {args.sensors} sensors, AUTOMATIC mode\n")
+    for name, url in (('receive (DRF)', '/api/data/receive/'), ('receive/fast', '/api/data/receive/fast/')):
+        rps, ms = run(client, url, args.requests, args.sensors)
+        print(f"{name:<16} {rps:8.0f} req/s  {ms:6.2f} ms/req")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Benchmark the batch motor-decision engine against per-reading get_motor_state().
+
+Decides N sensors (default 10000) with random moisture, thresholds and motor
+states, once by calling get_motor_state() per sensor (a MotorController, two
+log calls and a formatted reason each) and once with one
+decide_motor_states() call, and checks both agree. No database is touched.
+
+Usage:
+    python bench_motor_logic.py              # 10000 sensors
+    python bench_motor_logic.py -n 100000 -r 20
+"""
+import argparse
+import logging
+import os
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ThopaSichai_backend.settings')
+django.setup()
+
+import numpy as np
+
+from soil_moisture.motor_logic import decide_motor_states, get_motor_state
+
+
+def best_of(repeats, fn):
+    times = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - started)
+    return min(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('-n', '--sensors', type=int, default=10000)
+    parser.add_argument('-r', '--repeats', type=int, default=5)
+    parser.add_argument('--hysteresis', type=float, default=2.0)
+    args = parser.parse_args()
+
+    # Logging is disabled for both runs - otherwise the loop is measuring log I/O
+    logging.disable(logging.INFO)
+
+    rng = np.random.default_rng(42)
+    nodeids = [f'{i:05d}' for i in range(args.sensors)]
+    moisture = rng.uniform(0, 100, args.sensors).round(2)
+    thresholds = rng.uniform(30, 70, args.sensors).round(1)
+    states = np.where(rng.random(args.sensors) < 0.5, 'ON', 'OFF')
+
+    moisture_list, threshold_list, state_list = moisture.tolist(), thresholds.tolist(), states.tolist()
+    h = args.hysteresis
+
+    def loop():
+        return [
+            get_motor_state(m, s, t, low_threshold=max(0.0, t - h), high_threshold=min(100.0, t + h))['desired_state']
+            for m, s, t in zip(moisture_list, state_list, threshold_list)
+        ]
+
+    def batch():
+        return decide_motor_states(nodeids, moisture, states, thresholds, hysteresis=h)
+
+    loop_s, expected = best_of(args.repeats, loop)
+    batch_s, decisions = best_of(args.repeats, batch)
+    assert [decisions.state(i) for i in range(args.sensors)] == expected
+
+    print(f"{args.sensors} sensors, best of {args.repeats}, {len(decisions.changed_indices())} change(s)\n")
+    print(f"{'get_motor_state loop':<22} {loop_s * 1000:9.2f} ms  {loop_s * 1e6 / args.sensors:7.3f} us/sensor")
+    print(f"{'decide_motor_states':<22} {batch_s * 1000:9.2f} ms  {batch_s * 1e6 / args.sensors:7.3f} us/sensor")
+    print(f"\nspeedup: {loop_s / batch_s:.0f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import SoilMoisture, Motor, SystemMode, ThresholdConfig, Sensor
+from .ingest import delete_readings
+from .models import SoilMoisture, Motor, SystemMode, ThresholdConfig, Sensor, ReadingRollup
 
 
 @admin.register(Sensor)
@@ -39,6 +40,13 @@ class SoilMoistureAdmin(admin.ModelAdmin):
         """Optimize queryset"""
         qs = super().get_queryset(request)
         return qs.select_related('sensor')
+    
+    def delete_model(self, request, obj):
+        """Keep the reading counters in step"""
+        delete_readings(SoilMoisture.objects.filter(pk=obj.pk))
+    
+    def delete_queryset(self, request, queryset):
+        delete_readings(queryset)
 
 
 @admin.register(Motor)
@@ -46,7 +54,7 @@ class MotorAdmin(admin.ModelAdmin):
     list_display = ('id', 'name', 'state_badge', 'updated_at')
     list_filter = ('state',)
     search_fields = ('name',)
-    readonly_fields = ('created_at', 'updated_at')
+    readonly_fields = ('switched_to', 'switched_at', 'cooldown_until', 'created_at', 'updated_at')
     
     def state_badge(self, obj):
         """Display state with color badge"""
@@ -120,3 +128,18 @@ class ThresholdConfigAdmin(admin.ModelAdmin):
     def has_delete_permission(self, request, obj=None):
         """Prevent deletion"""
         return False
+
+
+@admin.register(ReadingRollup)
+class ReadingRollupAdmin(admin.ModelAdmin):
+    list_display = ('sensor', 'resolution', 'bucket', 'count', 'mean', 'value_min', 'value_max')
+    list_filter = ('resolution', 'sensor')
+    ordering = ('-bucket',)
+    date_hierarchy = 'bucket'
+    
+    def has_add_permission(self, request):
+        """Rollups are maintained by ingestion and rollup_readings"""
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class SoilMoistureConfig(AppConfig):
     name = 'soil_moisture'
+
+    def ready(self):
+        # Connect cache invalidation signals
+        from . import signals  # noqa: F401
@@ -0,0 +1,432 @@
+"""
+Channel layer for several daphne/uvicorn workers on one box, without Redis.
+
+InMemoryChannelLayer only reaches consumers in its own process. This layer
+keeps its in-memory queues and groups for local delivery, and broadcasts every
+group_send (and every send() to another process's channel) to the other worker
+processes, which deliver it to their own members:
+
+- on PostgreSQL through LISTEN/NOTIFY, on the database we already run;
+- otherwise (SQLite) through Unix datagram sockets, one per listening
+  process, in a shared directory under STATE_DIR.
+
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'soil_moisture.channel_layers.BroadcastChannelLayer',
+            'CONFIG': {'transport': 'auto'},    # or 'postgres' / 'unix'
+        },
+    }
+
+Group membership stays in each process, so a group_send costs one broadcast
+however many sockets are connected. Delivery is at most once, as with any
+channel layer: a worker that stops draining its socket loses messages instead
+of stalling the sender. Messages must be JSON-serialisable (ours are).
+bench_channel_layer.py measures broadcast throughput.
+"""
+import asyncio
+import atexit
+import json
+import logging
+import os
+import random
+import socket
+import string
+import threading
+import time
+import uuid
+from copy import deepcopy
+from pathlib import Path
+
+from channels.layers import InMemoryChannelLayer
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+logger = logging.getLogger('soil_moisture')
+
+# Largest datagram read; the default Unix socket send buffer caps sends near this
+MAX_DATAGRAM = 256 * 1024
+
+# NOTIFY payloads must be shorter than 8000 bytes
+NOTIFY_PAYLOAD_LIMIT = 7900
+
+
+class UnixSocketTransport:
+    """
+    Fan-out over Unix datagram sockets, one bound socket per listening process.
+
+    Linux queues only a few datagrams per socket (net.unix.max_dgram_qlen), so
+    publish() blocks up to SEND_TIMEOUT_SECONDS for a busy worker to drain its
+    queue before dropping the message for that worker.
+    """
+
+    PEER_CACHE_SECONDS = 1.0
+    SEND_TIMEOUT_SECONDS = 0.25
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.path = None
+        self._sock = None
+        self._senders = {}  # peer path -> socket connected to it
+        self._peers = None  # (directory stat, expires, [paths])
+        self._bind_lock = threading.Lock()
+        self._send_lock = threading.Lock()
+
+    def bind(self):
+        """Create this process's socket so peers start sending to it."""
+        with self._bind_lock:
+            if self._sock is not None:
+                return
+            self.directory.mkdir(parents=True, exist_ok=True)
+            path = self.directory / f'{os.getpid()}-{uuid.uuid4().hex[:8]}.sock'
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            sock.bind(str(path))
+            os.chmod(path, 0o600)
+            sock.setblocking(False)
+            self._sock, self.path = sock, path
+            atexit.register(self.close)
+
+    def peers(self):
+        """Socket paths in the directory; rescanned when it changes (or every second)."""
+        try:
+            st = os.stat(self.directory)
+        except FileNotFoundError:
+            return []
+        key = (st.st_ino, st.st_mtime_ns)
+        now = time.monotonic()
+        cached = self._peers
+        if cached is None or cached[0] != key or cached[1] < now:
+            paths = [entry.path for entry in os.scandir(self.directory) if entry.name.endswith('.sock')]
+            self._peers = cached = (key, now + self.PEER_CACHE_SECONDS, paths)
+        return cached[2]
+
+    def _sender(self, path):
+        # A connected socket can wait for room in that peer's queue
+        sock = self._senders.get(path)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            try:
+                sock.connect(path)
+            except OSError:
+                sock.close()
+                raise
+            sock.settimeout(self.SEND_TIMEOUT_SECONDS)
+            self._senders[path] = sock
+        return sock
+
+    def _forget(self, path, unlink=False):
+        sock = self._senders.pop(path, None)
+        if sock is not None:
+            sock.close()
+        if unlink:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            self._peers = None
+
+    def publish(self, payload):
+        own = str(self.path) if self.path else None
+        # One publisher at a time keeps each peer's messages in order
+        with self._send_lock:
+            peers = self.peers()
+            for path in peers:
+                if path == own:
+                    continue
+                try:
+                    self._sender(path).send(payload)
+                except (ConnectionRefusedError, FileNotFoundError):
+                    # The process died without removing its socket
+                    self._forget(path, unlink=True)
+                except TimeoutError:
+                    logger.warning(f"Channel layer: {path} is not keeping up, message dropped")
+                except OSError as e:
+                    logger.error(f"Channel layer: send to {path} failed: {str(e)}")
+                    self._forget(path)
+            for path in set(self._senders) - set(peers):
+                self._forget(path)
+
+    async def listen(self, deliver):
+        self.bind()
+        loop = asyncio.get_running_loop()
+        while True:
+            deliver(await loop.sock_recv(self._sock, MAX_DATAGRAM))
+
+    def close(self):
+        with self._send_lock:
+            for path in list(self._senders):
+                self._forget(path)
+        with self._bind_lock:
+            if self._sock is None:
+                return
+            self._sock.close()
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+            self._sock, self.path = None, None
+
+
+def split_notify_payload(text, limit=NOTIFY_PAYLOAD_LIMIT):
+    """
+    NOTIFY payloads for one message. Short messages go as-is; longer ones are
+    split into '~<id> <i> <n> <part>' chunks for NotifyAssembler. `text` must
+    be ASCII (json.dumps output), so slicing never splits a character.
+    """
+    if len(text) <= limit:
+        return [text]
+    size = limit - 40
+    parts = [text[i:i + size] for i in range(0, len(text), size)]
+    message_id = uuid.uuid4().hex
+    return [f'~{message_id} {i} {len(parts)} {part}' for i, part in enumerate(parts)]
+
+
+class NotifyAssembler:
+    """Joins chunked NOTIFY payloads back into messages."""
+
+    MAX_PARTIAL = 100
+
+    def __init__(self):
+        self._partial = {}
+
+    def feed(self, payload):
+        """Return the complete message text, or None while chunks are missing."""
+        if not payload.startswith('~'):
+            return payload
+        message_id, index, count, part = payload[1:].split(' ', 3)
+        parts = self._partial.setdefault(message_id, {})
+        parts[int(index)] = part
+        if len(parts) < int(count):
+            if len(self._partial) > self.MAX_PARTIAL:
+                # A sender died mid-message; forget the oldest
+                self._partial.pop(next(iter(self._partial)))
+            return None
+        del self._partial[message_id]
+        return ''.join(parts[i] for i in range(int(count)))
+
+
+class PostgresNotifyTransport:
+    """Fan-out through PostgreSQL LISTEN/NOTIFY on one channel."""
+
+    def __init__(self, channel, conninfo):
+        self.channel = channel
+        self.conninfo = conninfo
+        self._conn = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_database(cls, channel, database):
+        try:
+            from psycopg.conninfo import make_conninfo
+        except ImportError:
+            raise ImproperlyConfigured(
+                'psycopg is not installed - pip install "psycopg[binary]" for the postgres channel layer transport'
+            )
+
+        params = {
+            'dbname': database.get('NAME'),
+            'user': database.get('USER'),
+            'password': database.get('PASSWORD'),
+            'host': database.get('HOST'),
+            'port': database.get('PORT'),
+        }
+        return cls(channel, make_conninfo(**{key: str(value) for key, value in params.items() if value}))
+
+    def publish(self, payload):
+        import psycopg
+
+        notes = split_notify_payload(payload.decode())
+        with self._lock:
+            for attempt in range(2):
+                if self._conn is None or self._conn.closed:
+                    self._conn = psycopg.connect(self.conninfo, autocommit=True)
+                try:
+                    # One transaction, so the chunks of a message arrive together
+                    with self._conn.transaction():
+                        for note in notes:
+                            self._conn.execute('SELECT pg_notify(%s, %s)', (self.channel, note))
+                    return
+                except psycopg.OperationalError:
+                    self._conn.close()
+                    self._conn = None
+                    if attempt:
+                        raise
+
+    async def listen(self, deliver):
+        import psycopg
+        from psycopg import sql
+
+        assembler = NotifyAssembler()
+        while True:
+            try:
+                conn = await psycopg.AsyncConnection.connect(self.conninfo, autocommit=True)
+                async with conn:
+                    await conn.execute(sql.SQL('LISTEN {}').format(sql.Identifier(self.channel)))
+                    async for notify in conn.notifies():
+                        message = assembler.feed(notify.payload)
+                        if message is not None:
+                            deliver(message)
+            except psycopg.OperationalError as e:
+                logger.error(f"Channel layer: LISTEN connection lost ({str(e)}), reconnecting")
+                await asyncio.sleep(1)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class BroadcastChannelLayer(InMemoryChannelLayer):
+    """
+    InMemoryChannelLayer whose group and cross-process sends reach every worker.
+
+    Local delivery is also cheaper than the stock layer's, which sweeps every
+    channel and group for expired entries on each receive()/group_send() and
+    deep-copies a group message once per member: here the sweep runs at most
+    every CLEAN_INTERVAL_SECONDS and group members share one copy (consumers
+    only read their messages).
+
+    The queues belong to the event loop the consumers run on (the listener's).
+    Sends from another thread - async_to_sync() in the ingest queue or MQTT
+    writer runs on a fresh loop - hand local delivery to that loop with
+    call_soon_threadsafe(), so waiting consumers are woken right away.
+    """
+
+    CLEAN_INTERVAL_SECONDS = 1.0
+
+    def __init__(self, transport='auto', path=None, pg_channel='thopasichai_channels', **kwargs):
+        super().__init__(**kwargs)
+        self.process_id = uuid.uuid4().hex[:12]
+        self.transport = self._make_transport(transport, path, pg_channel)
+        self._listener = None
+        self._listener_loop = None
+        self._next_clean = 0.0
+
+    @staticmethod
+    def _make_transport(kind, path, pg_channel):
+        database = settings.DATABASES['default']
+        if kind == 'auto':
+            kind = 'postgres' if 'postgresql' in database['ENGINE'] else 'unix'
+        if kind == 'postgres':
+            return PostgresNotifyTransport.from_database(pg_channel, database)
+        if kind == 'unix':
+            return UnixSocketTransport(path or Path(settings.STATE_DIR) / 'channels')
+        raise ImproperlyConfigured(f"Unknown channel layer transport {kind!r} (expected auto, postgres or unix)")
+
+    async def new_channel(self, prefix='specific.'):
+        # The process id tells other workers where to route send()
+        return '%s.%s!%s' % (
+            prefix, self.process_id, ''.join(random.choice(string.ascii_letters) for _ in range(12))
+        )
+
+    def _is_local(self, channel):
+        # Non-specific channels have no owner; treat them as this process's
+        return '!' not in channel or channel.split('!', 1)[0].endswith('.' + self.process_id)
+
+    def _clean_expired(self):
+        now = time.monotonic()
+        if now < self._next_clean:
+            return
+        self._next_clean = now + self.CLEAN_INTERVAL_SECONDS
+        super()._clean_expired()
+
+    def _enqueue(self, channel, message, expires):
+        queue = self.channels.setdefault(channel, asyncio.Queue(maxsize=self.get_capacity(channel)))
+        try:
+            queue.put_nowait((expires, message))
+        except asyncio.QueueFull:
+            return False
+        return True
+
+    def _deliver_group(self, group, message):
+        """Queue `message` (not copied) for this process's members of `group`."""
+        self._clean_expired()
+        expires = time.time() + self.expiry
+        for channel in list(self.groups.get(group, ())):
+            self._enqueue(channel, message, expires)
+
+    def _deliver_channel(self, channel, message):
+        if not self._enqueue(channel, message, time.time() + self.expiry):
+            logger.warning(f"Channel layer: {channel} is full, message dropped")
+
+    def _owner_loop(self):
+        """The consumers' event loop when called from another thread or loop, else None."""
+        loop = self._listener_loop
+        if loop is None or loop.is_closed() or not loop.is_running():
+            return None
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        return None if running is loop else loop
+
+    async def send(self, channel, message):
+        if self._is_local(channel):
+            owner = self._owner_loop()
+            if owner is None:
+                await super().send(channel, message)
+                return
+            assert isinstance(message, dict), "message is not a dict"
+            self.require_valid_channel_name(channel)
+            owner.call_soon_threadsafe(self._deliver_channel, channel, deepcopy(message))
+            return
+        assert isinstance(message, dict), "message is not a dict"
+        self.require_valid_channel_name(channel)
+        await self._broadcast('c', channel, message)
+
+    async def receive(self, channel):
+        self._ensure_listener()
+        return await super().receive(channel)
+
+    async def group_add(self, group, channel):
+        await super().group_add(group, channel)
+        self._ensure_listener()
+
+    async def group_send(self, group, message):
+        assert isinstance(message, dict), "Message is not a dict"
+        self.require_valid_group_name(group)
+        owner = self._owner_loop()
+        if owner is None:
+            self._deliver_group(group, deepcopy(message))
+        else:
+            owner.call_soon_threadsafe(self._deliver_group, group, deepcopy(message))
+        await self._broadcast('g', group, message)
+
+    async def close(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+        self.transport.close()
+
+    async def _broadcast(self, kind, name, message):
+        payload = json.dumps({'o': self.process_id, 'k': kind, 'n': name, 'm': message}).encode()
+        # Publishing may wait on a busy peer or the database; keep it off the event loop
+        await asyncio.get_running_loop().run_in_executor(None, self.transport.publish, payload)
+
+    def _ensure_listener(self):
+        """Start receiving other workers' messages on the running event loop."""
+        loop = asyncio.get_running_loop()
+        if self._listener is not None and self._listener_loop is loop and not self._listener.done():
+            return
+        if self._listener is not None and not self._listener_loop.is_closed():
+            self._listener_loop.call_soon_threadsafe(self._listener.cancel)
+        if isinstance(self.transport, UnixSocketTransport):
+            # Bind now, so a message sent right after group_add() isn't missed
+            self.transport.bind()
+        self._listener_loop = loop
+        self._listener = loop.create_task(self.transport.listen(self._deliver))
+
+    def _deliver(self, payload):
+        try:
+            envelope = json.loads(payload)
+            origin, kind, name, message = envelope['o'], envelope['k'], envelope['n'], envelope['m']
+        except (ValueError, KeyError, TypeError):
+            logger.warning("Channel layer: malformed message ignored")
+            return
+        if origin == self.process_id:
+            return
+        # Freshly decoded, so there is nothing to copy
+        if kind == 'g':
+            self._deliver_group(name, message)
+        elif kind == 'c' and self._is_local(name):
+            self._deliver_channel(name, message)
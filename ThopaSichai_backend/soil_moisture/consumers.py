@@ -0,0 +1,118 @@
+"""
+WebSocket live feed: ws://<host>/ws/live/
+
+Replaces polling status/ and stats/dashboard/ with pushed events (published
+by live.py from the ingest and motor-update paths):
+
+    {"type": "reading",   "nodeid": "001", "value": 45.5, "timestamp": "...", "cursor": ...}
+    {"type": "motor",     "nodeid": "001", "name": "Pump 1", "state": "ON", "cursor": ...}
+    {"type": "threshold", "nodeid": "001", "threshold": 50.0}
+    {"type": "mode",      "mode": "AUTOMATIC"}
+
+Subscribe to some sensors with ?nodeid=001,002 on connect or by sending
+{"action": "subscribe", "nodeids": ["001", "002"]}; "nodeids": null (or no
+filter) means every sensor. Mode changes always reach every client.
+
+Events are delivered in frames {"type": "events", "events": [...]} at most
+every LIVE_FEED_FLUSH_MS. Between frames events are coalesced - only the
+newest reading, motor state or threshold of each sensor is kept - so a slow
+client gets fewer, fresher frames instead of an ever-growing backlog.
+"""
+import asyncio
+import json
+from urllib.parse import parse_qs
+
+from channels.generic.websocket import AsyncWebsocketConsumer
+from django.conf import settings
+
+from .live import ALL_GROUP, SYSTEM_GROUP, sensor_group
+
+
+class LiveFeedConsumer(AsyncWebsocketConsumer):
+
+    async def connect(self):
+        self.nodeids = None  # None = every sensor
+        self.groups_joined = set()
+        self.pending = {}
+        self.wakeup = asyncio.Event()
+        self.flush_ms = getattr(settings, 'LIVE_FEED_FLUSH_MS', 250)
+
+        query = parse_qs(self.scope.get('query_string', b'').decode())
+        nodeids = [nodeid for value in query.get('nodeid', []) for nodeid in value.split(',') if nodeid]
+
+        await self.accept()
+        await self._join({SYSTEM_GROUP})
+        await self._subscribe(nodeids or None)
+        self.flusher = asyncio.create_task(self._flush_loop())
+
+    async def disconnect(self, code):
+        flusher = getattr(self, 'flusher', None)
+        if flusher is not None:
+            flusher.cancel()
+        for group in getattr(self, 'groups_joined', ()):
+            await self.channel_layer.group_discard(group, self.channel_name)
+
+    async def receive(self, text_data=None, bytes_data=None):
+        try:
+            message = json.loads(text_data or '')
+        except ValueError:
+            await self._error('Invalid JSON')
+            return
+        if not isinstance(message, dict) or message.get('action') != 'subscribe':
+            await self._error('Expected {"action": "subscribe", "nodeids": [...] or null}')
+            return
+        nodeids = message.get('nodeids')
+        if nodeids is not None and (
+            not isinstance(nodeids, list) or not all(isinstance(nodeid, str) for nodeid in nodeids)
+        ):
+            await self._error('nodeids must be a list of strings or null')
+            return
+        await self._subscribe(nodeids or None)
+
+    async def _error(self, detail):
+        await self.send(text_data=json.dumps({'type': 'error', 'detail': detail}))
+
+    async def _join(self, groups):
+        for group in groups - self.groups_joined:
+            await self.channel_layer.group_add(group, self.channel_name)
+        self.groups_joined |= groups
+
+    async def _subscribe(self, nodeids):
+        wanted = {SYSTEM_GROUP}
+        if nodeids is None:
+            wanted.add(ALL_GROUP)
+        else:
+            wanted.update(sensor_group(nodeid) for nodeid in nodeids)
+        for group in self.groups_joined - wanted:
+            await self.channel_layer.group_discard(group, self.channel_name)
+        self.groups_joined &= wanted
+        await self._join(wanted)
+        self.nodeids = None if nodeids is None else set(nodeids)
+        # Drop queued events of sensors no longer subscribed
+        self.pending = {key: event for key, event in self.pending.items() if self._wants(event)}
+        await self.send(text_data=json.dumps({
+            'type': 'subscribed',
+            'nodeids': None if nodeids is None else sorted(self.nodeids),
+        }))
+
+    def _wants(self, event):
+        nodeid = event.get('nodeid')
+        return nodeid is None or self.nodeids is None or nodeid in self.nodeids
+
+    async def live_events(self, message):
+        """Channel-layer handler for 'live.events': queue, coalescing per (type, nodeid)."""
+        for event in message['events']:
+            # Sanitised group names can collide, so filter again here
+            if self._wants(event):
+                self.pending[(event['type'], event.get('nodeid'))] = event
+        if self.pending:
+            self.wakeup.set()
+
+    async def _flush_loop(self):
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            events, self.pending = list(self.pending.values()), {}
+            await self.send(text_data=json.dumps({'type': 'events', 'events': events}))
+            # Whatever arrives meanwhile is coalesced into the next frame
+            await asyncio.sleep(self.flush_ms / 1000)
@@ -0,0 +1,86 @@
+"""
+Reading counters (SensorReadingCount): total readings, readings per sensor
+and sensors with readings, without a COUNT(*) over SoilMoisture.
+
+Counts change in the same transaction as the readings they count:
+- ingestion adds each batch with one upsert (ingest.readings_stored());
+- deletions go through ingest.delete_readings(), which subtracts what it
+  removes (the admin and retention use it). A plain queryset .delete() on
+  SoilMoisture bypasses the counters.
+
+There is one row per sensor rather than one global row, so concurrent
+ingests for different sensors don't queue on the same row lock; totals add
+up those rows, a query over the sensors table's size, not the readings'.
+
+`manage.py recount` recounts from SoilMoisture to repair drift (e.g. a
+concurrent retry that lost its insert after being counted).
+"""
+from collections import Counter
+
+from django.db import connection, transaction
+from django.db.models import Count, Q, Sum
+
+from .models import SensorReadingCount, SoilMoisture
+
+
+def _upsert_sql():
+    quote = connection.ops.quote_name
+    table = quote(SensorReadingCount._meta.db_table)
+    sensor, count = quote('sensor_id'), quote('count')
+    return (
+        f"INSERT INTO {table} ({sensor}, {count}) VALUES (%s, %s) "
+        f"ON CONFLICT ({sensor}) DO UPDATE SET {count} = {table}.{count} + excluded.{count}"
+    )
+
+
+def add_readings(records):
+    """Count newly stored SoilMoisture records. Call inside the inserting transaction."""
+    counts = Counter(record.sensor_id for record in records)
+    if counts:
+        with connection.cursor() as cursor:
+            cursor.executemany(_upsert_sql(), sorted(counts.items()))
+
+
+def subtract(counts):
+    """Remove {nodeid: n} deleted readings from the counters."""
+    quote = connection.ops.quote_name
+    table = quote(SensorReadingCount._meta.db_table)
+    count = quote('count')
+    params = [(n, nodeid) for nodeid, n in sorted(counts.items()) if n]
+    if params:
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"UPDATE {table} SET {count} = {count} - %s WHERE {quote('sensor_id')} = %s", params
+            )
+
+
+def totals():
+    """(total readings, sensors with readings) in one query."""
+    result = SensorReadingCount.objects.aggregate(
+        total=Sum('count'), active=Count('sensor', filter=Q(count__gt=0))
+    )
+    return result['total'] or 0, result['active']
+
+
+def total(sensor_ids=None):
+    """Stored readings, of the given sensors only when sensor_ids is set."""
+    queryset = SensorReadingCount.objects.all()
+    if sensor_ids is not None:
+        queryset = queryset.filter(sensor_id__in=sensor_ids)
+    return queryset.aggregate(total=Sum('count'))['total'] or 0
+
+
+def recount_sensor(nodeid):
+    """
+    Recount one sensor's readings. Returns (counted, previously recorded).
+
+    The counter row is locked first, so on PostgreSQL ingests of this sensor
+    wait for the recount instead of being overwritten by it.
+    """
+    with transaction.atomic():
+        SensorReadingCount.objects.get_or_create(sensor_id=nodeid)
+        row = SensorReadingCount.objects.select_for_update().get(sensor_id=nodeid)
+        counted = SoilMoisture.objects.filter(sensor_id=nodeid).count()
+        if counted != row.count:
+            SensorReadingCount.objects.filter(sensor_id=nodeid).update(count=counted)
+    return counted, row.count
@@ -0,0 +1,444 @@
+"""
+Ingestion services for soil moisture readings.
+Shared by the single-reading, batch and streaming endpoints so sensor
+auto-creation and AUTOMATIC motor control behave the same no matter how a
+reading arrives.
+"""
+import json
+import logging
+from collections import Counter
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from . import counters, latest, live, rollups
+from .models import SoilMoisture, Motor, SystemMode, Sensor
+from .motor_logic import motor_guard, timing_columns
+from .payload_cache import payload_cache
+from .sampling import sampling_advice
+from .serializers import ReadingInputSerializer
+from .snapshot import decision_snapshot
+
+logger = logging.getLogger('soil_moisture')
+
+
+def resolve_sensors(nodeids):
+    """
+    Make sure every nodeid has a Sensor, auto-creating unknown ones with one
+    bulk INSERT. Known sensors come from the decision snapshot, so the steady
+    state costs no queries.
+
+    Returns:
+        Tuple of ({nodeid: SensorState}, set of auto-created nodeids)
+    """
+    nodeids = set(nodeids)
+    states = decision_snapshot.sensor_states(nodeids)
+    created = nodeids - states.keys()
+
+    if created:
+        # ignore_conflicts covers a concurrent request creating the same nodeid
+        Sensor.objects.bulk_create(
+            [Sensor(nodeid=nodeid, name=f'Auto-created: {nodeid}') for nodeid in sorted(created)],
+            ignore_conflicts=True
+        )
+        # Only cache them once they're really in the database
+        transaction.on_commit(lambda: decision_snapshot.add_sensors(created))
+        logger.info(f"Auto-created {len(created)} new sensor(s): {', '.join(sorted(created))}")
+
+    return states, created
+
+
+def apply_automatic_control(latest_values):
+    """
+    Run the AUTOMATIC mode motor decision once per sensor.
+
+    Mode, motor and threshold come from the decision snapshot; the only
+    query in the steady state is the UPDATE when a motor actually flips.
+    All sensors are decided in one motor_guard.decide_batch() pass (NumPy
+    band decision, then dwell times and pump cooldown), so a noisy sensor
+    near the threshold doesn't flip its motor.
+
+    Args:
+        latest_values: {nodeid: moisture value} - newest reading per sensor,
+            or None for a sensor without a recent reading: its motor is
+            stopped if it runs (and left alone if it doesn't)
+
+    Returns:
+        Tuple of (current system mode, {nodeid: motor update dict}).
+        Sensors without a motor, and silent sensors whose motor is OFF, are
+        absent from the updates dict.
+    """
+    current_mode = decision_snapshot.mode()
+    if current_mode != SystemMode.Mode.AUTOMATIC or not latest_values:
+        return current_mode, {}
+
+    states = decision_snapshot.sensor_states(latest_values.keys())
+    rows = [
+        (nodeid, value, states[nodeid]) for nodeid, value in latest_values.items()
+        if nodeid in states and states[nodeid].motor_id is not None
+        and (value is not None or states[nodeid].motor_state == Motor.State.ON)
+    ]
+    if not rows:
+        return current_mode, {}
+
+    decisions, overrides = motor_guard.decide_batch(
+        [state.motor_id for _, _, state in rows],
+        [nodeid for nodeid, _, _ in rows],
+        [value for _, value, _ in rows],
+        [state.motor_state for _, _, state in rows],
+        [state.threshold for _, _, state in rows],
+        timings=[state.motor_timing for _, _, state in rows],
+        silent=[value is None for _, value, _ in rows],
+    )
+
+    updates = {}
+    for i, (nodeid, _, state) in enumerate(rows):
+        desired_state = decisions.state(i)
+        if state.motor_state != desired_state:
+            # Single UPDATE without re-fetching the motor; the guard's timing
+            # goes on the row so every worker process holds the motor alike
+            motor = Motor(
+                id=state.motor_id, sensor_id=nodeid, name=state.motor_name, state=desired_state,
+                **timing_columns(decisions.timings[i])
+            )
+            motor.save(update_fields=['state', 'switched_to', 'switched_at', 'cooldown_until', 'updated_at'])
+            logger.info(f"AUTOMATIC mode: Motor '{state.motor_name}' (sensor={nodeid}) changed to {desired_state}")
+
+        reason, held = overrides.get(i, (None, False))
+        updates[nodeid] = {
+            'motor_name': state.motor_name,
+            'sensor_nodeid': nodeid,
+            'previous_state': state.motor_state,
+            'state': desired_state,
+            'changed': state.motor_state != desired_state,
+            'reason': reason or decisions.reason(i),
+            'held': held,
+            'threshold': state.threshold,
+        }
+
+    return current_mode, updates
+
+
+def dedupe_key(reading):
+    """
+    Natural key of a reading for idempotent ingestion: ('seq', n) when the
+    device numbered it, ('timestamp', t) when the device stamped it, None
+    when the server stamped it (no way to recognise a retry).
+    """
+    if reading.get('seq') is not None:
+        return ('seq', reading['seq'])
+    if reading.get('timestamp'):
+        return ('timestamp', reading['timestamp'])
+    return None
+
+
+def drop_duplicates(readings):
+    """
+    Remove readings already stored, or repeated within the same batch, by
+    their (nodeid, dedupe_key). Costs at most one indexed SELECT per key kind
+    and none at all for readings without a natural key.
+
+    Returns:
+        Tuple of (fresh readings, number of duplicates skipped)
+    """
+    seen = set()
+    fresh = []
+    for reading in readings:
+        key = dedupe_key(reading)
+        if key is not None:
+            if (reading['nodeid'], key) in seen:
+                continue
+            seen.add((reading['nodeid'], key))
+        fresh.append(reading)
+
+    if seen:
+        existing = set()
+        seqs = {(nodeid, value) for nodeid, (kind, value) in seen if kind == 'seq'}
+        stamps = {(nodeid, value) for nodeid, (kind, value) in seen if kind == 'timestamp'}
+        if seqs:
+            rows = SoilMoisture.objects.filter(
+                sensor_id__in={nodeid for nodeid, _ in seqs},
+                seq__in={seq for _, seq in seqs}
+            ).values_list('sensor_id', 'seq')
+            existing.update((nodeid, ('seq', seq)) for nodeid, seq in rows)
+        if stamps:
+            rows = SoilMoisture.objects.filter(
+                sensor_id__in={nodeid for nodeid, _ in stamps},
+                timestamp__in={stamp for _, stamp in stamps},
+                seq__isnull=True,
+                device_timestamped=True
+            ).values_list('sensor_id', 'timestamp')
+            existing.update((nodeid, ('timestamp', stamp)) for nodeid, stamp in rows)
+        if existing:
+            fresh = [
+                reading for reading in fresh
+                if (reading['nodeid'], dedupe_key(reading)) not in existing
+            ]
+
+    return fresh, len(readings) - len(fresh)
+
+
+def inserted_records(records):
+    """
+    The records a bulk_create(ignore_conflicts=True) really stored. A
+    concurrent request may have stored the same (nodeid, natural key) after
+    drop_duplicates() looked, and then its row is kept and ours dropped.
+    Only readings with a natural key can conflict (ids are generated here),
+    so that's at most one SELECT by primary key.
+    """
+    keyed = [record.id for record in records if record.seq is not None or record.device_timestamped]
+    if not keyed:
+        return records
+    stored = set(SoilMoisture.objects.filter(id__in=keyed).values_list('id', flat=True))
+    return [
+        record for record in records
+        if record.id in stored or (record.seq is None and not record.device_timestamped)
+    ]
+
+
+def readings_stored(records):
+    """
+    Bookkeeping for newly inserted readings, run inside the inserting
+    transaction: count them, add them to the rollups and the sensors' latest
+    readings, and once committed announce them on the live feed and patch
+    the cached dashboard payloads.
+    """
+    counters.add_readings(records)
+    rollups.add_readings(records)
+    latest.record_readings(records)
+    live.publish_readings(records)
+    transaction.on_commit(lambda: payload_cache.readings_added(records))
+
+
+def delete_readings(queryset):
+    """
+    Delete the readings of `queryset` with the matching bookkeeping in one
+    transaction: subtract them from the counters and refresh the affected
+    sensors' latest readings (rollups keep summarising them). Returns the
+    number of readings deleted.
+
+    Meant for bounded querysets (admin selections, retention chunks): the
+    ids are fetched first so exactly what's deleted gets subtracted.
+    """
+    with transaction.atomic():
+        ids = list(queryset.order_by().values_list('id', 'sensor_id'))
+        if not ids:
+            return 0
+        deleted, _ = SoilMoisture.objects.filter(id__in=[record_id for record_id, _ in ids]).delete()
+        removed = Counter(sensor_id for _, sensor_id in ids)
+        counters.subtract(removed)
+        latest.refresh(removed)
+        transaction.on_commit(payload_cache.invalidate)
+    return deleted
+
+
+def newest_by_sensor(records, newest=None):
+    """Return {nodeid: record} holding the newest record of each sensor."""
+    newest = {} if newest is None else newest
+    for record in records:
+        current = newest.get(record.sensor_id)
+        if current is None or record.timestamp >= current.timestamp:
+            newest[record.sensor_id] = record
+    return newest
+
+
+def _control_motors(newest):
+    """
+    Run the motor decision for {nodeid: newest record}, never raising.
+
+    Sensors whose newest reading is older than MOTOR_DECISION_MAX_AGE_SECONDS
+    are left alone: a gateway draining its outage buffer must not switch
+    motors on conditions from an hour ago.
+    """
+    max_age = getattr(settings, 'MOTOR_DECISION_MAX_AGE_SECONDS', None)
+    if max_age:
+        cutoff = timezone.now() - timedelta(seconds=max_age)
+        stale = [nodeid for nodeid, record in newest.items() if record.timestamp < cutoff]
+        if stale:
+            logger.info(f"Skipping motor decision for {len(stale)} sensor(s) with only stale readings")
+            newest = {nodeid: record for nodeid, record in newest.items() if nodeid not in stale}
+    try:
+        return apply_automatic_control(
+            {nodeid: record.value for nodeid, record in newest.items()}
+        )
+    except Exception as e:
+        # Readings are already stored - don't fail the ingest, just log the error
+        logger.error(f"Error in automatic motor control: {str(e)}", exc_info=True)
+        return None, {}
+
+
+def ingest_readings(readings, ip_address=None, control_motors=True):
+    """
+    Store a batch of validated readings and run motor control once per sensor.
+
+    Sensors are resolved in one query, readings are written with a single
+    bulk_create inside one transaction, and the AUTOMATIC mode decision uses
+    the newest reading of each affected sensor.
+
+    Ingestion is idempotent: readings whose (nodeid, seq) - or device
+    timestamp when there is no seq - is already stored are skipped, so a
+    gateway can safely resend a batch after a timeout. Skipped readings -
+    including ones a concurrent request stored first - don't reach the
+    bookkeeping or the motor decision.
+
+    Args:
+        readings: List of dicts with 'nodeid', 'value' and optional
+                  'seq' / 'timestamp' / 'received_at' / 'ip_address'
+                  (already validated). 'received_at' is a server-side
+                  stamp used when the device sent no timestamp.
+        ip_address: Fallback IP address for readings that don't carry one
+        control_motors: Skip the motor decision when False (callers that
+                        ingest in several chunks run it once at the end)
+
+    Returns:
+        Dict with 'records' (stored readings), 'duplicates' (count skipped),
+        'sensors_created', 'mode', 'motor_updates' and 'sampling'
+        ({nodeid: sampling advice}, empty when control_motors is False)
+    """
+    if not readings:
+        return {
+            'records': [], 'duplicates': 0, 'sensors_created': set(),
+            'mode': None, 'motor_updates': {}, 'sampling': {},
+        }
+
+    now = timezone.now()
+
+    with transaction.atomic():
+        _, sensors_created = resolve_sensors(reading['nodeid'] for reading in readings)
+        fresh, duplicates = drop_duplicates(readings)
+        records = [
+            SoilMoisture(
+                sensor_id=reading['nodeid'],
+                value=reading['value'],
+                timestamp=reading.get('timestamp') or reading.get('received_at') or now,
+                ip_address=reading.get('ip_address') or ip_address,
+                seq=reading.get('seq'),
+                device_timestamped=bool(reading.get('timestamp')),
+            )
+            for reading in fresh
+        ]
+        # ignore_conflicts covers a concurrent request storing the same reading;
+        # only what was really inserted gets the bookkeeping and motor decision
+        SoilMoisture.objects.bulk_create(records, ignore_conflicts=True)
+        stored = inserted_records(records)
+        duplicates += len(records) - len(stored)
+        records = stored
+        readings_stored(records)
+
+    if duplicates:
+        logger.info(f"Skipped {duplicates} duplicate reading(s)")
+
+    mode, motor_updates, sampling = None, {}, {}
+    if control_motors:
+        newest = newest_by_sensor(records)
+        mode, motor_updates = _control_motors(newest)
+        sampling = sampling_advice(
+            {nodeid: record.value for nodeid, record in newest.items()}, motor_updates
+        )
+
+    return {
+        'records': records,
+        'duplicates': duplicates,
+        'sensors_created': sensors_created,
+        'mode': mode,
+        'motor_updates': motor_updates,
+        'sampling': sampling,
+    }
+
+
+def ingest_ndjson_stream(stream, chunk_size, ip_address=None, max_line_bytes=4096):
+    """
+    Ingest newline-delimited JSON readings from a file-like request body.
+
+    Lines are read one at a time and written in fixed-size chunks, so memory
+    use is bounded by chunk_size no matter how large the upload is. The motor
+    decision runs once at the end with the newest reading of each sensor, so
+    a backfill of old data doesn't flap motors chunk by chunk.
+
+    Args:
+        stream: Binary file-like object supporting readline(size)
+        chunk_size: Number of valid readings written per bulk INSERT
+        ip_address: Fallback IP address for readings that don't carry one
+        max_line_bytes: Lines longer than this are rejected without parsing
+
+    Returns:
+        Dict with 'lines', 'accepted', 'duplicates', 'chunks', 'rejected_lines',
+        'rejected' (first errors), 'sensors_created', 'mode' and 'motor_updates'
+    """
+    summary = {
+        'lines': 0,
+        'accepted': 0,
+        'duplicates': 0,
+        'chunks': [],
+        'rejected_lines': [],
+        'rejected': [],
+        'sensors_created': set(),
+    }
+    newest = {}
+    pending = []
+    pending_rejected = 0
+
+    def reject(line_no, errors):
+        summary['rejected_lines'].append(line_no)
+        # Keep the response bounded - line numbers are enough past this point
+        if len(summary['rejected']) < 100:
+            summary['rejected'].append({'line': line_no, 'errors': errors})
+
+    def flush():
+        nonlocal pending, pending_rejected
+        if pending or pending_rejected:
+            result = ingest_readings(pending, ip_address=ip_address, control_motors=False)
+            newest_by_sensor(result['records'], newest)
+            summary['sensors_created'] |= result['sensors_created']
+            summary['accepted'] += len(result['records'])
+            summary['duplicates'] += result['duplicates']
+            summary['chunks'].append({
+                'chunk': len(summary['chunks']) + 1,
+                'accepted': len(result['records']),
+                'duplicates': result['duplicates'],
+                'rejected': pending_rejected,
+            })
+        pending, pending_rejected = [], 0
+
+    line_no = 0
+    while True:
+        raw = stream.readline(max_line_bytes + 1)
+        if not raw:
+            break
+        line_no += 1
+
+        if len(raw) > max_line_bytes and not raw.endswith(b'\n'):
+            # Drain the rest of the oversized line without keeping it
+            while raw and not raw.endswith(b'\n'):
+                raw = stream.readline(max_line_bytes + 1)
+            reject(line_no, {'line': f'Line exceeds {max_line_bytes} bytes'})
+            pending_rejected += 1
+            continue
+
+        raw = raw.strip()
+        if not raw:
+            continue
+
+        try:
+            item = json.loads(raw)
+        except ValueError as e:
+            reject(line_no, {'line': f'Invalid JSON: {e}'})
+            pending_rejected += 1
+            continue
+
+        serializer = ReadingInputSerializer(data=item)
+        if serializer.is_valid():
+            pending.append(serializer.validated_data)
+            if len(pending) >= chunk_size:
+                flush()
+        else:
+            reject(line_no, serializer.errors)
+            pending_rejected += 1
+
+    flush()
+    summary['lines'] = line_no
+
+    summary['mode'], summary['motor_updates'] = (
+        _control_motors(newest) if newest else (None, {})
+    )
+    return summary
@@ -0,0 +1,222 @@
+"""
+Write-behind ingestion queue.
+
+When INGEST_QUEUE_ENABLED is set, receive_soil_moisture only validates a
+reading and appends it to a bounded in-process queue, then answers 202. A
+background writer thread drains the queue every INGEST_QUEUE_FLUSH_INTERVAL_MS
+or as soon as INGEST_QUEUE_FLUSH_BATCH_SIZE readings are waiting, writing each
+batch with ingest_readings() (one bulk INSERT + one motor decision per sensor).
+
+Request latency is then bounded by the deque append rather than the SQLite
+write lock. Readings still queued when the process dies are lost, so this is
+opt-in; a full queue rejects new readings (counted as dropped) so the gateway
+can retry instead of the server silently losing them.
+
+Queued readings were already acknowledged, so a failed write doesn't lose
+them: on an OperationalError (typically "database is locked" during a burst)
+the batch goes back to the head of the queue and the writer retries with
+exponential backoff up to INGEST_QUEUE_RETRY_MAX_MS. Any other error is
+permanent for some reading of the batch; the batch is then written reading
+by reading and only the readings that still fail are dropped (and counted).
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.db import OperationalError, close_old_connections
+
+from .ingest import ingest_readings
+
+logger = logging.getLogger('soil_moisture')
+
+
+class IngestQueue:
+    """Bounded in-process queue of validated readings with a background writer."""
+
+    def __init__(self, maxsize=10000, flush_interval_ms=200, flush_batch_size=500, retry_max_ms=5000):
+        self.maxsize = maxsize
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.flush_batch_size = flush_batch_size
+        self.retry_max = retry_max_ms / 1000.0
+        # Seconds before the next flush after a transient error, None when healthy
+        self._retry_delay = None
+
+        self._items = deque()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+
+        self._enqueued = 0
+        self._dropped = 0
+        self._flushed = 0
+        self._flushes = 0
+        self._flush_errors = 0
+        self._last_flush_ms = None
+        self._max_flush_ms = 0.0
+        self._last_flush_at = None
+
+    @property
+    def depth(self):
+        return len(self._items)
+
+    def put(self, reading):
+        """
+        Append a validated reading. Returns False (and counts a drop)
+        when the queue is full.
+        """
+        with self._lock:
+            if len(self._items) >= self.maxsize:
+                self._dropped += 1
+                return False
+            self._items.append(reading)
+            self._enqueued += 1
+            depth = len(self._items)
+
+        if depth >= self.flush_batch_size:
+            self._wakeup.set()
+        return True
+
+    def _take_batch(self):
+        with self._lock:
+            count = min(len(self._items), self.flush_batch_size)
+            return [self._items.popleft() for _ in range(count)]
+
+    def _requeue(self, readings, error):
+        """Put readings back at the head of the queue (even past maxsize) and back off."""
+        with self._lock:
+            self._items.extendleft(reversed(readings))
+        self._retry_delay = min(self.retry_max, self._retry_delay * 2 if self._retry_delay else self.flush_interval)
+        logger.warning(
+            f"Ingest queue flush failed, {len(readings)} reading(s) requeued, "
+            f"retrying in {self._retry_delay:.1f}s: {str(error)}"
+        )
+
+    def _write_one_by_one(self, batch):
+        """
+        Write a batch that failed permanently reading by reading, dropping
+        the readings that fail again. Returns (written, not yet tried) - the
+        rest after a transient error, to be requeued.
+        """
+        written = 0
+        for i, reading in enumerate(batch):
+            try:
+                ingest_readings([reading])
+            except OperationalError:
+                return written, batch[i:]
+            except Exception as e:
+                self._dropped += 1
+                logger.error(f"Ingest queue dropped a reading from nodeid {reading.get('nodeid')}: {str(e)}", exc_info=True)
+            else:
+                written += 1
+        return written, []
+
+    def flush(self):
+        """
+        Write everything currently queued, stopping at a transient error
+        (the rest stays queued). Returns the number of readings written.
+        """
+        written = 0
+        with self._flush_lock:
+            while True:
+                batch = self._take_batch()
+                if not batch:
+                    break
+
+                started = time.perf_counter()
+                try:
+                    ingest_readings(batch)
+                    stored, rest = len(batch), []
+                except OperationalError as e:
+                    self._flush_errors += 1
+                    self._requeue(batch, e)
+                    break
+                except Exception as e:
+                    self._flush_errors += 1
+                    logger.error(f"Ingest queue flush failed, writing {len(batch)} reading(s) one by one: {str(e)}")
+                    stored, rest = self._write_one_by_one(batch)
+
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                written += stored
+                self._flushed += stored
+                self._flushes += 1
+                self._last_flush_ms = round(elapsed_ms, 2)
+                self._max_flush_ms = max(self._max_flush_ms, elapsed_ms)
+                self._last_flush_at = time.time()
+                if rest:
+                    self._requeue(rest, 'database error while writing one by one')
+                    break
+                self._retry_delay = None
+        return written
+
+    def _run(self):
+        while not self._stopping.is_set():
+            if self._retry_delay:
+                # Backing off: a full batch doesn't cut the wait short
+                self._stopping.wait(self._retry_delay)
+            else:
+                self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            close_old_connections()
+            self.flush()
+
+    def start(self):
+        """Start the background writer thread (idempotent)."""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='soil-moisture-ingest-writer', daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+
+    def stop(self):
+        """Stop the writer and flush whatever is left."""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.flush()
+
+    def stats(self):
+        """Counters for monitoring queue health."""
+        return {
+            'depth': self.depth,
+            'maxsize': self.maxsize,
+            'enqueued': self._enqueued,
+            'dropped': self._dropped,
+            'flushed': self._flushed,
+            'flushes': self._flushes,
+            'flush_errors': self._flush_errors,
+            'retry_delay_ms': None if self._retry_delay is None else round(self._retry_delay * 1000),
+            'last_flush_ms': self._last_flush_ms,
+            'max_flush_ms': round(self._max_flush_ms, 2),
+            'last_flush_at': self._last_flush_at,
+            'writer_running': self._thread is not None and self._thread.is_alive(),
+        }
+
+
+_default_queue = None
+_default_queue_lock = threading.Lock()
+
+
+def is_enabled():
+    return getattr(settings, 'INGEST_QUEUE_ENABLED', False)
+
+
+def get_ingest_queue():
+    """Return the process-wide queue, creating and starting it on first use."""
+    global _default_queue
+    if _default_queue is None:
+        with _default_queue_lock:
+            if _default_queue is None:
+                queue = IngestQueue(
+                    maxsize=getattr(settings, 'INGEST_QUEUE_MAXSIZE', 10000),
+                    flush_interval_ms=getattr(settings, 'INGEST_QUEUE_FLUSH_INTERVAL_MS', 200),
+                    flush_batch_size=getattr(settings, 'INGEST_QUEUE_FLUSH_BATCH_SIZE', 500),
+                    retry_max_ms=getattr(settings, 'INGEST_QUEUE_RETRY_MAX_MS', 5000),
+                )
+                queue.start()
+                _default_queue = queue
+    return _default_queue
@@ -0,0 +1,78 @@
+"""
+Each sensor's newest reading (LatestReading), kept current at ingest time.
+
+"Latest reading" lookups used to sort the whole readings table. Ingestion now
+upserts one LatestReading row per sensor in the inserting transaction: the
+reading columns are replaced only when the new reading is at least as new
+(by timestamp), so a backfill of buffered readings doesn't replace a newer
+one, while last_received_at always moves forward. Deleting readings through
+ingest.delete_readings() refreshes the affected sensors from the
+(sensor, -timestamp) index.
+"""
+from django.db import connection
+
+from .models import LatestReading, SoilMoisture
+
+_READING_COLUMNS = ('reading_id', 'value', 'timestamp', 'ip_address', 'seq', 'device_timestamped', 'created_at')
+
+
+def _upsert_sql():
+    quote = connection.ops.quote_name
+    table = quote(LatestReading._meta.db_table)
+    greatest = 'MAX' if connection.vendor == 'sqlite' else 'GREATEST'
+    columns = ('sensor_id', *_READING_COLUMNS, 'last_received_at')
+    newer = f"excluded.{quote('timestamp')} >= {table}.{quote('timestamp')}"
+    assignments = [
+        f"{quote(column)} = CASE WHEN {newer} THEN excluded.{quote(column)} ELSE {table}.{quote(column)} END"
+        for column in _READING_COLUMNS
+    ]
+    received = quote('last_received_at')
+    assignments.append(f"{received} = {greatest}({table}.{received}, excluded.{received})")
+    return (
+        f"INSERT INTO {table} ({', '.join(quote(column) for column in columns)}) "
+        f"VALUES ({', '.join(['%s'] * len(columns))}) "
+        f"ON CONFLICT ({quote('sensor_id')}) DO UPDATE SET {', '.join(assignments)}"
+    )
+
+
+def record_readings(records):
+    """
+    Upsert the newest of `records` for each sensor. Call inside the
+    inserting transaction.
+    """
+    newest, received = {}, {}
+    for record in records:
+        current = newest.get(record.sensor_id)
+        if current is None or record.timestamp >= current.timestamp:
+            newest[record.sensor_id] = record
+        received[record.sensor_id] = max(received.get(record.sensor_id, record.created_at), record.created_at)
+    if not newest:
+        return
+
+    fields = [LatestReading._meta.get_field(column) for column in _READING_COLUMNS + ('last_received_at',)]
+    params = []
+    for nodeid, record in sorted(newest.items()):
+        values = [getattr(record, 'id' if column == 'reading_id' else column) for column in _READING_COLUMNS]
+        values.append(received[nodeid])
+        params.append([nodeid] + [field.get_db_prep_save(value, connection) for field, value in zip(fields, values)])
+    with connection.cursor() as cursor:
+        cursor.executemany(_upsert_sql(), params)
+
+
+def refresh(sensor_ids):
+    """
+    Re-read the newest stored reading of each sensor after deletions, one
+    indexed lookup per sensor; sensors left without readings lose their row.
+    """
+    sensor_ids = set(sensor_ids)
+    if not sensor_ids:
+        return
+    for nodeid in sensor_ids:
+        record = SoilMoisture.objects.filter(sensor_id=nodeid).order_by('-timestamp', '-id').first()
+        if record is None:
+            LatestReading.objects.filter(sensor_id=nodeid).delete()
+            continue
+        LatestReading.objects.filter(sensor_id=nodeid).update(
+            reading_id=record.id, value=record.value, timestamp=record.timestamp, ip_address=record.ip_address,
+            seq=record.seq, device_timestamped=record.device_timestamped, created_at=record.created_at,
+        )
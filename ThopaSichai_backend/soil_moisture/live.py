@@ -0,0 +1,105 @@
+"""
+Live event fan-out to WebSocket clients (see consumers.py).
+
+The ingest and motor-update paths call the publish_* functions after their
+transaction commits; events go out through the channel layer to groups:
+
+    live.system         mode changes - every client
+    live.all            readings, motor and threshold changes of every sensor
+    live.sensor.<id>    the same, for one sensor (filtered subscriptions)
+
+A batch of readings becomes one message per group, not one per reading.
+Reading and motor events carry a `cursor` (write time in microseconds) that
+the SSE stream (stream.py) uses as its event id.
+Publishing never raises: a failed fan-out is logged and ingestion goes on.
+"""
+import logging
+import re
+from datetime import datetime, timedelta, timezone
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+
+logger = logging.getLogger('soil_moisture')
+
+SYSTEM_GROUP = 'live.system'
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+ALL_GROUP = 'live.all'
+
+
+def sensor_group(nodeid):
+    """Channel-layer group of one sensor (group names allow only [A-Za-z0-9_.-])."""
+    return 'live.sensor.' + re.sub(r'[^A-Za-z0-9_.-]', '_', nodeid)[:80]
+
+
+def cursor_of(moment):
+    """Event cursor: microseconds since the epoch of when the row was written."""
+    return (moment - EPOCH) // timedelta(microseconds=1)
+
+
+def reading_event(record):
+    return {
+        'type': 'reading',
+        'nodeid': record.sensor_id,
+        'value': record.value,
+        'timestamp': record.timestamp.isoformat(),
+        'cursor': cursor_of(record.created_at),
+    }
+
+
+def motor_event(motor):
+    return {
+        'type': 'motor',
+        'nodeid': motor.sensor_id,
+        'name': motor.name,
+        'state': motor.state,
+        'cursor': cursor_of(motor.updated_at),
+    }
+
+
+def _send(messages):
+    """messages: list of (group, events). Sends one 'live.events' message per group."""
+    layer = get_channel_layer()
+    if layer is None:
+        return
+    try:
+        send = async_to_sync(layer.group_send)
+        for group, events in messages:
+            send(group, {'type': 'live.events', 'events': events})
+    except Exception as e:
+        logger.error(f"Live event fan-out failed: {str(e)}", exc_info=True)
+
+
+def _publish(messages):
+    # After commit, so clients never hear about rows that get rolled back
+    transaction.on_commit(lambda: _send(messages))
+
+
+def publish_readings(records):
+    """New SoilMoisture rows (saved or bulk-created)."""
+    if not records:
+        return
+    by_sensor = {}
+    events = []
+    for record in records:
+        event = reading_event(record)
+        events.append(event)
+        by_sensor.setdefault(record.sensor_id, []).append(event)
+    _publish([(ALL_GROUP, events)] + [
+        (sensor_group(nodeid), sensor_events) for nodeid, sensor_events in by_sensor.items()
+    ])
+
+
+def publish_motor(motor):
+    event = motor_event(motor)
+    _publish([(ALL_GROUP, [event]), (sensor_group(motor.sensor_id), [event])])
+
+
+def publish_threshold(config):
+    event = {'type': 'threshold', 'nodeid': config.sensor_id, 'threshold': config.threshold}
+    _publish([(ALL_GROUP, [event]), (sensor_group(config.sensor_id), [event])])
+
+
+def publish_mode(mode):
+    _publish([(SYSTEM_GROUP, [{'type': 'mode', 'mode': mode}])])
@@ -0,0 +1,138 @@
+"""
+Re-evaluate every zone's motor, or replay stored readings through the decision engine.
+
+    python manage.py evaluate_motors                 # apply, e.g. from cron every minute
+    python manage.py evaluate_motors --dry-run       # only report what would change
+    python manage.py evaluate_motors --replay 1440   # motor flips over the last day
+    python manage.py evaluate_motors --replay 1440 --hysteresis 0
+
+Re-evaluation runs each sensor's newest reading through the same
+apply_automatic_control() path as ingestion (one decide_batch() pass for all
+zones), so dwell times and cooldown apply and MANUAL mode is respected.
+A sensor whose newest reading is older than MOTOR_DECISION_MAX_AGE_SECONDS, or
+that has none, doesn't drive its motor; if that motor is running it is stopped
+and cools down (MOTOR_COOLDOWN_SECONDS), so a pump can't keep running on a
+sensor that went silent. Reason strings are only built for motors that change.
+
+Replay feeds the stored readings of the window through decide_motor_states()
+in rounds - the k-th reading of every sensor in one NumPy call - starting from
+OFF, and counts the transitions each sensor's motor would have made with the
+given hysteresis band. Dwell times aren't simulated. Nothing is written.
+"""
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import OuterRef, Q, Subquery
+from django.utils import timezone
+
+from soil_moisture.ingest import apply_automatic_control
+from soil_moisture.models import Motor, SoilMoisture, ThresholdConfig
+from soil_moisture.motor_logic import DEFAULT_HYSTERESIS, DEFAULT_THRESHOLD, decide_motor_states
+
+
+class Command(BaseCommand):
+    help = "Re-evaluate every motor from its sensor's newest reading, or replay readings"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report changes without saving them')
+        parser.add_argument('--replay', type=int, metavar='MINUTES',
+                            help='Replay the readings of the last MINUTES and count motor flips')
+        parser.add_argument('--hysteresis', type=float,
+                            help='Band half-width for --replay/--dry-run (default: MOTOR_HYSTERESIS)')
+
+    def handle(self, *args, **options):
+        hysteresis = options['hysteresis']
+        if hysteresis is None:
+            hysteresis = getattr(settings, 'MOTOR_HYSTERESIS', DEFAULT_HYSTERESIS)
+        if options['replay']:
+            self.replay(options['replay'], hysteresis)
+        else:
+            self.evaluate(options['dry_run'], hysteresis)
+
+    def thresholds(self, nodeids):
+        thresholds = dict(
+            ThresholdConfig.objects.filter(sensor_id__in=nodeids).values_list('sensor_id', 'threshold')
+        )
+        return [thresholds.get(nodeid, DEFAULT_THRESHOLD) for nodeid in nodeids]
+
+    def evaluate(self, dry_run, hysteresis):
+        newest = SoilMoisture.objects.filter(sensor_id=OuterRef('sensor_id')).order_by('-timestamp')
+        motors = Motor.objects.annotate(
+            latest_value=Subquery(newest.values('value')[:1]),
+            latest_at=Subquery(newest.values('timestamp')[:1]),
+        ).filter(Q(latest_value__isnull=False) | Q(state=Motor.State.ON))
+
+        max_age = getattr(settings, 'MOTOR_DECISION_MAX_AGE_SECONDS', None)
+        cutoff = timezone.now() - timedelta(seconds=max_age) if max_age else None
+        rows, silent = [], []
+        for nodeid, value, latest_at, state in motors.values_list('sensor_id', 'latest_value', 'latest_at', 'state'):
+            if value is None or (cutoff and latest_at < cutoff):
+                if state == Motor.State.ON:
+                    silent.append(nodeid)
+            else:
+                rows.append((nodeid, value, state))
+        if not rows and not silent:
+            self.stdout.write('No motor has a recent reading')
+            return
+
+        if dry_run:
+            nodeids = [nodeid for nodeid, _, _ in rows]
+            decisions = decide_motor_states(
+                nodeids, [value for _, value, _ in rows], [state for _, _, state in rows],
+                self.thresholds(nodeids), hysteresis=hysteresis
+            )
+            changed = decisions.changed_indices()
+            for i in changed:
+                self.stdout.write(f"{nodeids[i]}: {decisions.current_state(i)} -> {decisions.state(i)} ({decisions.reason(i)})")
+            for nodeid in silent:
+                self.stdout.write(f"{nodeid}: ON -> OFF (no recent moisture reading)")
+            self.stdout.write(f"{len(rows) + len(silent)} motor(s) evaluated, {len(changed) + len(silent)} would change")
+            return
+
+        latest_values = {nodeid: value for nodeid, value, _ in rows}
+        latest_values.update(dict.fromkeys(silent))
+        mode, updates = apply_automatic_control(latest_values)
+        changed = [update for update in updates.values() if update['changed']]
+        for update in changed:
+            self.stdout.write(f"{update['sensor_nodeid']}: {update['previous_state']} -> {update['state']} ({update['reason']})")
+        self.stdout.write(f"{mode} mode: {len(rows) + len(silent)} motor(s) evaluated, {len(changed)} changed")
+
+    def replay(self, minutes, hysteresis):
+        since = timezone.now() - timedelta(minutes=minutes)
+        per_sensor = {}
+        readings = SoilMoisture.objects.filter(
+            timestamp__gte=since, sensor__motor__isnull=False
+        ).order_by('timestamp').values_list('sensor_id', 'value')
+        for nodeid, value in readings.iterator():
+            per_sensor.setdefault(nodeid, []).append(value)
+        if not per_sensor:
+            self.stdout.write('No readings for sensors with a motor in the window')
+            return
+
+        nodeids = sorted(per_sensor)
+        thresholds = np.asarray(self.thresholds(nodeids), dtype=float)
+        # Pad to a rectangle; NaN rows (sensor out of readings) keep their state
+        rounds = max(len(values) for values in per_sensor.values())
+        matrix = np.full((len(nodeids), rounds), np.nan)
+        for row, nodeid in enumerate(nodeids):
+            matrix[row, :len(per_sensor[nodeid])] = per_sensor[nodeid]
+
+        on = np.zeros(len(nodeids), dtype=bool)
+        flips = np.zeros(len(nodeids), dtype=int)
+        for k in range(rounds):
+            column = matrix[:, k]
+            present = ~np.isnan(column)
+            desired = decide_motor_states(nodeids, np.nan_to_num(column), on, thresholds, hysteresis).desired_on
+            desired = np.where(present, desired, on)
+            flips += desired != on
+            on = desired
+
+        self.stdout.write(f"{'nodeid':<12} {'readings':>9} {'flips':>6}")
+        for row, nodeid in enumerate(nodeids):
+            self.stdout.write(f"{nodeid:<12} {len(per_sensor[nodeid]):>9} {flips[row]:>6}")
+        self.stdout.write(
+            f"{int(flips.sum())} flip(s) over {sum(len(v) for v in per_sensor.values())} reading(s), "
+            f"hysteresis {hysteresis:g}"
+        )
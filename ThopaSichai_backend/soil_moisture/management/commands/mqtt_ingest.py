@@ -0,0 +1,113 @@
+"""
+Subscribe to the field devices' MQTT topics and store sensor readings.
+
+    python manage.py mqtt_ingest
+    python manage.py mqtt_ingest --host 192.168.1.100 --batch-size 500
+
+Try it against a local broker:
+
+    mosquitto -v
+    python manage.py mqtt_ingest
+    mosquitto_pub -t irrigation/smartkisan_test/sensors -m '{"soil_moisture": [45, 52, 48, 50]}'
+"""
+import logging
+import signal
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from soil_moisture.mqtt_bridge import MqttIngestBridge
+
+logger = logging.getLogger('soil_moisture')
+
+
+class Command(BaseCommand):
+    help = 'Bridge MQTT sensor messages (irrigation/#) into SoilMoisture with AUTOMATIC motor control'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default=getattr(settings, 'MQTT_BROKER_HOST', 'localhost'))
+        parser.add_argument('--port', type=int, default=getattr(settings, 'MQTT_BROKER_PORT', 1883))
+        parser.add_argument('--topic', default=getattr(settings, 'MQTT_INGEST_TOPIC', 'irrigation/#'))
+        parser.add_argument('--client-id', default='thopasichai-ingest',
+                            help='Fixed id so the broker keeps the session (and queued messages) across restarts')
+        parser.add_argument('--username', default=getattr(settings, 'MQTT_USERNAME', None))
+        parser.add_argument('--password', default=getattr(settings, 'MQTT_PASSWORD', None))
+        parser.add_argument('--qos', type=int, choices=[0, 1], default=1)
+        parser.add_argument('--batch-size', type=int, default=getattr(settings, 'MQTT_INGEST_BATCH_SIZE', 200))
+        parser.add_argument('--flush-ms', type=int, default=getattr(settings, 'MQTT_INGEST_FLUSH_INTERVAL_MS', 500))
+        parser.add_argument('--queue-size', type=int, default=getattr(settings, 'MQTT_INGEST_QUEUE_SIZE', 5000))
+        parser.add_argument('--stats-every', type=int, default=60, help='Log counters every N seconds (0 = never)')
+
+    def handle(self, *args, **options):
+        try:
+            import paho.mqtt.client as mqtt
+        except ImportError:
+            raise CommandError('paho-mqtt is not installed - pip install paho-mqtt')
+
+        bridge = MqttIngestBridge(
+            queue_size=options['queue_size'],
+            batch_size=options['batch_size'],
+            flush_interval_ms=options['flush_ms'],
+        )
+        topic, qos = options['topic'], options['qos']
+        stopping = threading.Event()
+
+        def on_connect(client, userdata, flags, reason_code, *extra):
+            if reason_code != 0:
+                logger.error(f"MQTT connect refused: {reason_code}")
+                return
+            # Re-subscribe on every (re)connect; a persistent session keeps QoS 1 backlog
+            client.subscribe(topic, qos=qos)
+            self.stdout.write(f"Connected to {options['host']}:{options['port']}, subscribed to {topic}")
+
+        def on_disconnect(client, userdata, *args):
+            if not stopping.is_set():
+                logger.warning("MQTT connection lost, reconnecting...")
+
+        def on_message(client, userdata, msg):
+            bridge.handle_message(msg.topic, msg.payload)
+
+        client = _make_client(mqtt, options['client_id'])
+        client.on_connect = on_connect
+        client.on_disconnect = on_disconnect
+        client.on_message = on_message
+        if options['username']:
+            client.username_pw_set(options['username'], options['password'])
+        # loop_start() reconnects on its own, backing off from 1s to 60s
+        client.reconnect_delay_set(min_delay=1, max_delay=60)
+
+        try:
+            client.connect(options['host'], options['port'], keepalive=60)
+        except OSError as e:
+            raise CommandError(f"Cannot reach MQTT broker at {options['host']}:{options['port']}: {e}")
+
+        def stop(signum, frame):
+            stopping.set()
+
+        signal.signal(signal.SIGINT, stop)
+        signal.signal(signal.SIGTERM, stop)
+
+        client.loop_start()
+        last_stats = time.monotonic()
+        try:
+            while not stopping.is_set():
+                bridge.write_batch(bridge.next_batch(timeout=1.0))
+                if options['stats_every'] and time.monotonic() - last_stats >= options['stats_every']:
+                    logger.info(f"MQTT ingest stats: {bridge.stats()}")
+                    last_stats = time.monotonic()
+        finally:
+            client.disconnect()
+            # Drain before loop_stop: the network thread may be blocked on a full queue
+            bridge.drain()
+            client.loop_stop()
+            bridge.drain()
+            self.stdout.write(f"Stopped. {bridge.stats()}")
+
+
+def _make_client(mqtt, client_id):
+    """paho-mqtt 2.x needs an explicit callback API version; 1.x doesn't know it."""
+    if hasattr(mqtt, 'CallbackAPIVersion'):
+        return mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=client_id, clean_session=False)
+    return mqtt.Client(client_id=client_id, clean_session=False)
@@ -0,0 +1,67 @@
+"""
+Enforce the reading retention policy (READING_RETENTION_DAYS).
+
+    python manage.py prune_readings                 # roll up, purge, vacuum
+    python manage.py prune_readings --dry-run       # only report what's expired
+    python manage.py prune_readings --no-vacuum
+    python manage.py prune_readings --enable-incremental-vacuum   # once, SQLite
+
+Meant to run daily from cron. Raw readings are rolled up before they're
+deleted, and everything is deleted in chunks of RETENTION_CHUNK_SIZE rows,
+one short transaction each, so ingestion keeps going meanwhile (see
+soil_moisture/retention.py).
+
+On SQLite, deleted rows only become free pages inside the file; the
+incremental vacuum at the end gives them back to the OS. That needs the
+database in auto_vacuum=INCREMENTAL mode, which --enable-incremental-vacuum
+switches on with a one-off full VACUUM (stop the server first).
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from soil_moisture import retention
+
+
+class Command(BaseCommand):
+    help = "Roll up and delete readings and rollups past their retention"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Report what's expired without deleting it")
+        parser.add_argument('--chunk-size', type=int, help='Rows deleted per transaction (default: RETENTION_CHUNK_SIZE)')
+        parser.add_argument('--no-vacuum', action='store_true', help='Skip the SQLite incremental vacuum')
+        parser.add_argument(
+            '--enable-incremental-vacuum', action='store_true',
+            help='Switch SQLite to auto_vacuum=INCREMENTAL (full VACUUM) and exit',
+        )
+
+    def handle(self, *args, **options):
+        if options['enable_incremental_vacuum']:
+            if retention.enable_incremental_vacuum():
+                self.stdout.write(self.style.SUCCESS("SQLite auto_vacuum set to INCREMENTAL"))
+            else:
+                self.stdout.write("Not an SQLite database, nothing to do")
+            return
+
+        limits = retention.horizons()
+        for level in retention.LEVELS:
+            kept = 'forever' if limits[level] is None else f'since {limits[level]:%Y-%m-%d} UTC'
+            self.stdout.write(f"{level}: kept {kept}")
+
+        if options['dry_run']:
+            querysets = retention.expired(limits)
+            for level in retention.LEVELS:
+                if level in querysets:
+                    self.stdout.write(f"{level}: {querysets[level].count()} row(s) expired")
+            return
+
+        result = retention.prune(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Purged {result['raw']} reading(s) from {result['days']} day(s), "
+            f"{result['minute']} minute, {result['hour']} hour and {result['day']} day rollup(s)"
+        ))
+
+        if options['no_vacuum'] or not getattr(settings, 'RETENTION_SQLITE_VACUUM', True):
+            return
+        freed = retention.incremental_vacuum()
+        if freed is not None:
+            self.stdout.write(f"Incremental vacuum freed {freed} page(s)")
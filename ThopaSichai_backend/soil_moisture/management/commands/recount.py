@@ -0,0 +1,43 @@
+"""
+Recount stored readings per sensor and repair the reading counters.
+
+    python manage.py recount             # fix and report drift
+    python manage.py recount --dry-run   # only report
+    python manage.py recount --sensor 001
+
+The counters (soil_moisture/counters.py) are maintained by ingestion and
+deletions; this reconciles them with SoilMoisture after anything that went
+around them, e.g. a raw queryset .delete(). Each sensor is recounted in its
+own short transaction with its counter row locked.
+"""
+from django.core.management.base import BaseCommand
+
+from soil_moisture.counters import recount_sensor
+from soil_moisture.models import Sensor, SensorReadingCount, SoilMoisture
+
+
+class Command(BaseCommand):
+    help = "Recount readings per sensor and repair the reading counters"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report drift without fixing it')
+        parser.add_argument('--sensor', action='append', metavar='NODEID', help='Only this sensor (repeatable)')
+
+    def handle(self, *args, **options):
+        nodeids = options['sensor'] or list(Sensor.objects.order_by('nodeid').values_list('nodeid', flat=True))
+        drifted = total = 0
+        for nodeid in nodeids:
+            if options['dry_run']:
+                counted = SoilMoisture.objects.filter(sensor_id=nodeid).count()
+                recorded = SensorReadingCount.objects.filter(sensor_id=nodeid).values_list('count', flat=True).first() or 0
+            else:
+                counted, recorded = recount_sensor(nodeid)
+            total += counted
+            if counted != recorded:
+                drifted += 1
+                self.stdout.write(f"{nodeid}: counter {recorded}, actual {counted} ({counted - recorded:+d})")
+
+        action = 'found' if options['dry_run'] else 'fixed'
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(nodeids)} sensor(s), {total} reading(s); {action} drift on {drifted} sensor(s)"
+        ))
@@ -0,0 +1,54 @@
+"""
+Rebuild the minute/hour/day reading rollups from the raw readings.
+
+    python manage.py rollup_readings              # today and yesterday (UTC)
+    python manage.py rollup_readings --days 30
+    python manage.py rollup_readings --all        # backfill after upgrading
+
+Ingestion keeps the rollups current on its own (see soil_moisture/rollups.py);
+this is the catch-up path for readings stored before the rollups existed and
+for repairing drift. Each UTC day is recomputed in its own short transaction,
+so the dashboard keeps answering while a long backfill runs. Days whose raw
+readings are past retention (soil_moisture/retention.py) are left alone -
+their rollups are all that's left.
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
+
+from soil_moisture.models import SoilMoisture
+from soil_moisture.retention import horizons, kept_resolutions
+from soil_moisture.rollups import UTC, bucket_start, rebuild_day
+
+
+class Command(BaseCommand):
+    help = "Rebuild reading rollups from the raw readings"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=2, help='Rebuild the last DAYS UTC days (default: 2)')
+        parser.add_argument('--all', action='store_true', help='Rebuild every day since the oldest reading')
+
+    def handle(self, *args, **options):
+        today = bucket_start(timezone.now(), 86400)
+        if options['all']:
+            oldest = SoilMoisture.objects.aggregate(oldest=Min('timestamp'))['oldest']
+            if oldest is None:
+                self.stdout.write("No readings to roll up")
+                return
+            first = bucket_start(oldest.astimezone(UTC), 86400)
+        else:
+            first = today - timedelta(days=max(options['days'], 1) - 1)
+        limits = horizons()
+        if limits['raw'] is not None:
+            first = max(first, limits['raw'])
+
+        day, days, readings = first, 0, 0
+        while day <= today:
+            with transaction.atomic():
+                readings += rebuild_day(day, kept_resolutions(day, limits))
+            day += timedelta(days=1)
+            days += 1
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt rollups for {days} day(s), {readings} reading(s)"))
@@ -0,0 +1,97 @@
+"""
+Packet loss and forward latency per sensor, from what actually reached the database.
+
+    python manage.py uplink_report --prefix L --minutes 15
+
+Loss comes from gaps in each sensor's device sequence numbers (the high 16
+bits are the node's boot epoch, the low 16 count readings). Latency is
+created_at minus the device/gateway timestamp, so it has the frames'
+one-second resolution; the gateway's own "Stats:" line reports the
+receive -> upload latency in milliseconds.
+
+Measuring the gateway under load:
+    1. Flash EspCodes/loadgen.py on one or two spare ESP32s (24 virtual
+       nodes each, one frame per second per node).
+    2. Run it for DURATION_S against the gateway under test.
+    3. python manage.py uplink_report --prefix L --minutes <run length>
+    4. Repeat with the previous gateway (git show <rev>:EspCodes/Gateway.py)
+       for the before/after comparison.
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from soil_moisture.models import SoilMoisture
+
+
+def seq_stats(seqs):
+    """Return (received, expected) for a sensor's sequence numbers."""
+    epochs = {}
+    for seq in set(seqs):
+        low, high = epochs.get(seq >> 16, (seq & 0xFFFF, seq & 0xFFFF))
+        epochs[seq >> 16] = (min(low, seq & 0xFFFF), max(high, seq & 0xFFFF))
+    expected = sum(high - low + 1 for low, high in epochs.values())
+    return len(set(seqs)), expected
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class Command(BaseCommand):
+    help = 'Report per-sensor packet loss (sequence gaps) and forward latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prefix', default='', help='Only sensors whose nodeid starts with this')
+        parser.add_argument('--minutes', type=int, default=15, help='Window of received readings to analyse')
+
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(minutes=options['minutes'])
+        rows = SoilMoisture.objects.filter(
+            sensor__nodeid__startswith=options['prefix'],
+            created_at__gte=since,
+            seq__isnull=False
+        ).values_list('sensor_id', 'seq', 'timestamp', 'created_at', 'device_timestamped')
+
+        per_sensor = {}
+        for nodeid, seq, stamp, created_at, device_timestamped in rows.iterator():
+            seqs, latencies = per_sensor.setdefault(nodeid, ([], []))
+            seqs.append(seq)
+            if device_timestamped:
+                latencies.append((created_at - stamp).total_seconds())
+
+        if not per_sensor:
+            self.stdout.write('No sequenced readings in the window')
+            return
+
+        self.stdout.write(f"{'sensor':<12}{'received':>10}{'expected':>10}{'lost':>8}{'loss %':>9}{'p50 s':>8}{'p95 s':>8}{'max s':>8}")
+        total_received = total_expected = 0
+        all_latencies = []
+        for nodeid in sorted(per_sensor):
+            seqs, latencies = per_sensor[nodeid]
+            received, expected = seq_stats(seqs)
+            total_received += received
+            total_expected += expected
+            all_latencies.extend(latencies)
+            self.stdout.write(self._row(nodeid, received, expected, latencies))
+
+        self.stdout.write('-' * 73)
+        self.stdout.write(self._row(f'{len(per_sensor)} sensors', total_received, total_expected, all_latencies))
+
+    @staticmethod
+    def _row(label, received, expected, latencies):
+        lost = expected - received
+        loss = 100.0 * lost / expected if expected else 0.0
+
+        def fmt(value):
+            return f'{value:8.1f}' if value is not None else f"{'-':>8}"
+
+        return (
+            f'{label:<12}{received:>10}{expected:>10}{lost:>8}{loss:>8.2f}%'
+            f'{fmt(percentile(latencies, 0.5))}{fmt(percentile(latencies, 0.95))}'
+            f'{fmt(max(latencies) if latencies else None)}'
+        )
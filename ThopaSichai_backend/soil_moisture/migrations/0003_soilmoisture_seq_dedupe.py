@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-16 20:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('soil_moisture', '0002_remove_thresholdconfig_high_threshold_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='soilmoisture',
+            name='device_timestamped',
+            field=models.BooleanField(default=False, help_text='True when the timestamp came from the device rather than the server'),
+        ),
+        migrations.AddField(
+            model_name='soilmoisture',
+            name='seq',
+            field=models.PositiveBigIntegerField(blank=True, help_text='Device sequence number - retried readings with the same seq are ignored', null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='soilmoisture',
+            constraint=models.UniqueConstraint(condition=models.Q(('seq__isnull', False)), fields=('sensor', 'seq'), name='unique_reading_seq_per_sensor'),
+        ),
+        migrations.AddConstraint(
+            model_name='soilmoisture',
+            constraint=models.UniqueConstraint(condition=models.Q(('device_timestamped', True), ('seq__isnull', True)), fields=('sensor', 'timestamp'), name='unique_reading_device_timestamp_per_sensor'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('soil_moisture', '0003_soilmoisture_seq_dedupe'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='soilmoisture',
+            index=models.Index(fields=['sensor', '-timestamp'], name='SoilMoistur_sensor__3ea9a3_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('soil_moisture', '0004_soilmoisture_sensor_timestamp_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReadingRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.CharField(choices=[('minute', 'Minute'), ('hour', 'Hour'), ('day', 'Day')], help_text='Bucket width', max_length=6)),
+                ('bucket', models.DateTimeField(help_text='Start of the bucket (UTC)')),
+                ('count', models.PositiveIntegerField(default=0, help_text='Number of readings')),
+                ('value_sum', models.FloatField(default=0.0, help_text='Sum of the values')),
+                ('value_sum_squares', models.FloatField(default=0.0, help_text='Sum of the squared values')),
+                ('value_min', models.FloatField(help_text='Lowest value')),
+                ('value_max', models.FloatField(help_text='Highest value')),
+                ('sensor', models.ForeignKey(help_text='Sensor whose readings are summarised', on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='soil_moisture.sensor')),
+            ],
+            options={
+                'verbose_name': 'Reading Rollup',
+                'verbose_name_plural': 'Reading Rollups',
+                'db_table': 'ReadingRollup',
+                'indexes': [models.Index(fields=['resolution', 'bucket'], name='ReadingRoll_resolut_a54815_idx')],
+                'constraints': [models.UniqueConstraint(fields=('sensor', 'resolution', 'bucket'), name='unique_rollup_bucket_per_sensor')],
+            },
+        ),
+    ]
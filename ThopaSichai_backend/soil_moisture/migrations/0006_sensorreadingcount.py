@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def count_existing_readings(apps, schema_editor):
+    SoilMoisture = apps.get_model('soil_moisture', 'SoilMoisture')
+    SensorReadingCount = apps.get_model('soil_moisture', 'SensorReadingCount')
+    counts = (
+        SoilMoisture.objects.order_by().values('sensor_id')
+        .annotate(count=models.Count('id')).values_list('sensor_id', 'count')
+    )
+    SensorReadingCount.objects.bulk_create(
+        [SensorReadingCount(sensor_id=sensor_id, count=count) for sensor_id, count in counts],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('soil_moisture', '0005_readingrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SensorReadingCount',
+            fields=[
+                ('sensor', models.OneToOneField(help_text='Sensor whose readings are counted', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='reading_count', serialize=False, to='soil_moisture.sensor')),
+                ('count', models.BigIntegerField(default=0, help_text='Stored readings')),
+            ],
+            options={
+                'verbose_name': 'Sensor Reading Count',
+                'verbose_name_plural': 'Sensor Reading Counts',
+                'db_table': 'SensorReadingCount',
+            },
+        ),
+        migrations.RunPython(count_existing_readings, migrations.RunPython.noop),
+    ]
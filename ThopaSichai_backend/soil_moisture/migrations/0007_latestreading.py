@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def copy_latest_readings(apps, schema_editor):
+    Sensor = apps.get_model('soil_moisture', 'Sensor')
+    SoilMoisture = apps.get_model('soil_moisture', 'SoilMoisture')
+    LatestReading = apps.get_model('soil_moisture', 'LatestReading')
+    rows = []
+    for nodeid in Sensor.objects.values_list('nodeid', flat=True):
+        readings = SoilMoisture.objects.filter(sensor_id=nodeid)
+        record = readings.order_by('-timestamp', '-id').first()
+        if record is None:
+            continue
+        rows.append(LatestReading(
+            sensor_id=nodeid, reading_id=record.id, value=record.value, timestamp=record.timestamp,
+            ip_address=record.ip_address, seq=record.seq, device_timestamped=record.device_timestamped,
+            created_at=record.created_at,
+            last_received_at=readings.aggregate(last=models.Max('created_at'))['last'],
+        ))
+    LatestReading.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('soil_moisture', '0006_sensorreadingcount'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LatestReading',
+            fields=[
+                ('sensor', models.OneToOneField(help_text='Sensor this is the newest reading of', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='latest_reading', serialize=False, to='soil_moisture.sensor')),
+                ('reading_id', models.UUIDField(help_text='SoilMoisture id of the reading')),
+                ('value', models.FloatField(help_text='Moisture value')),
+                ('timestamp', models.DateTimeField(help_text='When the reading was taken')),
+                ('ip_address', models.CharField(blank=True, max_length=45, null=True)),
+                ('seq', models.PositiveBigIntegerField(blank=True, null=True)),
+                ('device_timestamped', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(help_text='When the reading was stored')),
+                ('last_received_at', models.DateTimeField(db_index=True, help_text='When any reading of this sensor was last stored (backfills included)')),
+            ],
+            options={
+                'verbose_name': 'Latest Reading',
+                'verbose_name_plural': 'Latest Readings',
+                'db_table': 'LatestReading',
+            },
+        ),
+        migrations.RunPython(copy_latest_readings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('soil_moisture', '0007_latestreading'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='soilmoisture',
+            index=models.Index(fields=['-created_at'], name='SoilMoistur_created_a0f66c_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('soil_moisture', '0008_soilmoisture_created_at_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='motor',
+            name='cooldown_until',
+            field=models.DateTimeField(blank=True, help_text='The pump rests until then after a forced stop', null=True),
+        ),
+        migrations.AddField(
+            model_name='motor',
+            name='switched_at',
+            field=models.DateTimeField(blank=True, help_text='When the automatic control last switched the motor', null=True),
+        ),
+        migrations.AddField(
+            model_name='motor',
+            name='switched_to',
+            field=models.CharField(blank=True, choices=[('ON', 'On'), ('OFF', 'Off')], help_text='State the automatic control last switched the motor to', max_length=3, null=True),
+        ),
+    ]
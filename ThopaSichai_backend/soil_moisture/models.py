@@ -84,6 +84,24 @@ class Motor(TimeStampedModel):
         default=State.OFF,
         help_text="Current state of the motor (ON/OFF)"
     )
+    # Last automatic transition, read by MotorGuard in every worker process
+    switched_to = models.CharField(
+        max_length=3,
+        choices=State.choices,
+        null=True,
+        blank=True,
+        help_text="State the automatic control last switched the motor to"
+    )
+    switched_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="When the automatic control last switched the motor"
+    )
+    cooldown_until = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="The pump rests until then after a forced stop"
+    )
     
     class Meta:
         db_table = 'Motor'
@@ -228,6 +246,15 @@ class SoilMoisture(TimeStampedModel):
         blank=True,
         help_text="IP address of the device sending data"
     )
+    seq = models.PositiveBigIntegerField(
+        null=True,
+        blank=True,
+        help_text="Device sequence number - retried readings with the same seq are ignored"
+    )
+    device_timestamped = models.BooleanField(
+        default=False,
+        help_text="True when the timestamp came from the device rather than the server"
+    )
     
     class Meta:
         db_table = 'SoilMoisture'
@@ -235,7 +262,25 @@ class SoilMoisture(TimeStampedModel):
         indexes = [
             models.Index(fields=['-timestamp']),
             models.Index(fields=['sensor']),
+            # Per-sensor history pages (keyset pagination by nodeid)
+            models.Index(fields=['sensor', '-timestamp']),
             models.Index(fields=['ip_address']),
+            # Stream replay (stream.replay_from_db): newest written after a cursor
+            models.Index(fields=['-created_at']),
+        ]
+        constraints = [
+            # Natural keys for idempotent ingestion: (sensor, seq) when the device
+            # numbers its readings, else (sensor, timestamp) when it stamps them
+            models.UniqueConstraint(
+                fields=['sensor', 'seq'],
+                condition=models.Q(seq__isnull=False),
+                name='unique_reading_seq_per_sensor'
+            ),
+            models.UniqueConstraint(
+                fields=['sensor', 'timestamp'],
+                condition=models.Q(seq__isnull=True, device_timestamped=True),
+                name='unique_reading_device_timestamp_per_sensor'
+            ),
         ]
         verbose_name = 'Soil Moisture Reading'
         verbose_name_plural = 'Soil Moisture Readings'
@@ -267,19 +312,13 @@ class SoilMoisture(TimeStampedModel):
     
     @classmethod
     def get_average_value(cls, sensor=None, hours=24):
-        """Get average moisture value for last N hours."""
-        from django.db.models import Avg
+        """Get average moisture value for last N hours (from rollups, see rollups.py)."""
         from datetime import timedelta
+        from .rollups import summarize
         
-        queryset = cls.objects.filter(
-            timestamp__gte=timezone.now() - timedelta(hours=hours)
-        )
-        
-        if sensor:
-            queryset = queryset.filter(sensor=sensor)
-        
-        result = queryset.aggregate(avg=Avg('value'))
-        return result['avg'] or 0.0
+        now = timezone.now()
+        summary = summarize(now - timedelta(hours=hours), now, [sensor.pk] if sensor else None)
+        return summary.mean or 0.0
 
 
 # ==========================================
@@ -344,3 +383,135 @@ class ThresholdConfig(models.Model):
         instance.save()
         return instance
 
+
+# ==========================================
+# Reading Rollup Model
+# ==========================================
+
+class ReadingRollup(models.Model):
+    """
+    Per-sensor summary of the readings in one minute, hour or day (UTC),
+    kept up to date at ingest time (see rollups.py). Averages, ranges and
+    standard deviations over any window combine these instead of scanning
+    SoilMoisture.
+    """
+    
+    class Resolution(models.TextChoices):
+        MINUTE = 'minute', 'Minute'
+        HOUR = 'hour', 'Hour'
+        DAY = 'day', 'Day'
+    
+    sensor = models.ForeignKey(
+        Sensor,
+        on_delete=models.CASCADE,
+        related_name='rollups',
+        help_text="Sensor whose readings are summarised"
+    )
+    resolution = models.CharField(
+        max_length=6,
+        choices=Resolution.choices,
+        help_text="Bucket width"
+    )
+    bucket = models.DateTimeField(help_text="Start of the bucket (UTC)")
+    count = models.PositiveIntegerField(default=0, help_text="Number of readings")
+    value_sum = models.FloatField(default=0.0, help_text="Sum of the values")
+    value_sum_squares = models.FloatField(default=0.0, help_text="Sum of the squared values")
+    value_min = models.FloatField(help_text="Lowest value")
+    value_max = models.FloatField(help_text="Highest value")
+    
+    class Meta:
+        db_table = 'ReadingRollup'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['sensor', 'resolution', 'bucket'],
+                name='unique_rollup_bucket_per_sensor'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['resolution', 'bucket']),
+        ]
+        verbose_name = 'Reading Rollup'
+        verbose_name_plural = 'Reading Rollups'
+    
+    def __str__(self):
+        return f"{self.sensor_id} {self.resolution} {self.bucket:%Y-%m-%d %H:%M}: {self.count} reading(s)"
+    
+    @property
+    def mean(self):
+        return self.value_sum / self.count if self.count else None
+
+
+# ==========================================
+# Reading Count Model
+# ==========================================
+
+class SensorReadingCount(models.Model):
+    """
+    Number of stored readings of one sensor, kept in step with SoilMoisture
+    by the ingest path and by ingest.delete_readings() (see counters.py),
+    so totals never need a COUNT(*) over the readings table.
+    """
+    
+    sensor = models.OneToOneField(
+        Sensor,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='reading_count',
+        help_text="Sensor whose readings are counted"
+    )
+    count = models.BigIntegerField(default=0, help_text="Stored readings")
+    
+    class Meta:
+        db_table = 'SensorReadingCount'
+        verbose_name = 'Sensor Reading Count'
+        verbose_name_plural = 'Sensor Reading Counts'
+    
+    def __str__(self):
+        return f"{self.sensor_id}: {self.count} reading(s)"
+
+
+# ==========================================
+# Latest Reading Model
+# ==========================================
+
+class LatestReading(models.Model):
+    """
+    Copy of each sensor's newest reading (by timestamp), upserted at ingest
+    time (see latest.py), so "latest" lookups read one small row per sensor
+    instead of sorting SoilMoisture.
+    """
+    
+    sensor = models.OneToOneField(
+        Sensor,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='latest_reading',
+        help_text="Sensor this is the newest reading of"
+    )
+    reading_id = models.UUIDField(help_text="SoilMoisture id of the reading")
+    value = models.FloatField(help_text="Moisture value")
+    timestamp = models.DateTimeField(help_text="When the reading was taken")
+    ip_address = models.CharField(max_length=45, null=True, blank=True)
+    seq = models.PositiveBigIntegerField(null=True, blank=True)
+    device_timestamped = models.BooleanField(default=False)
+    created_at = models.DateTimeField(help_text="When the reading was stored")
+    last_received_at = models.DateTimeField(
+        db_index=True,
+        help_text="When any reading of this sensor was last stored (backfills included)"
+    )
+    
+    class Meta:
+        db_table = 'LatestReading'
+        verbose_name = 'Latest Reading'
+        verbose_name_plural = 'Latest Readings'
+    
+    def __str__(self):
+        return f"{self.sensor_id}: {self.value}% at {self.timestamp}"
+    
+    def as_reading(self):
+        """The reading as an (unsaved) SoilMoisture, e.g. for SoilMoistureSerializer."""
+        return SoilMoisture(
+            id=self.reading_id, sensor_id=self.sensor_id, value=self.value, timestamp=self.timestamp,
+            ip_address=self.ip_address, seq=self.seq, device_timestamped=self.device_timestamped,
+            created_at=self.created_at, updated_at=self.created_at,
+        )
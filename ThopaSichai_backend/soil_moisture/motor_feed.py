@@ -0,0 +1,102 @@
+"""
+Versioned motor-state feed behind /api/motorsinfo/.
+
+Actuators poll motorsinfo to learn which motors to switch. Instead of a
+Motor query per poll:
+- every Motor save/delete (see signals.py) bumps a shared VersionStamp, so the
+  version changes and is the same in every worker process;
+- the {nodeid: state} body is cached per version, so polls cost one os.stat();
+- the version is the ETag: a poll with a matching If-None-Match gets 304;
+- with ?wait=N a matching poll is held until the version changes (or N
+  seconds pass), so actuators hear about a decision almost immediately
+  instead of on their next poll. The wait is awaited on the event loop, so
+  a held poll costs a coroutine rather than one of the few threads sync
+  views run on.
+
+A bump in this process wakes waiting requests at once; bumps from other
+processes are noticed within POLL_INTERVAL_SECONDS.
+"""
+import asyncio
+import threading
+
+from .models import Motor
+from .versioning import VersionStamp
+
+POLL_INTERVAL_SECONDS = 0.05
+
+
+class MotorStateFeed:
+    """Motor states by sensor nodeid, cached per motor-state version."""
+
+    def __init__(self, stamp_name='motor-state'):
+        self.stamp = VersionStamp(stamp_name)
+        self._lock = threading.Lock()
+        # (loop, asyncio.Event) of the requests waiting in this process
+        self._waiters = set()
+        self._version = None
+        self._states = None
+
+    def version(self):
+        return self.stamp.current()
+
+    @staticmethod
+    def etag(version):
+        return '"%x-%x"' % version
+
+    def bump(self):
+        """Record a motor change and wake requests waiting in this process."""
+        self.stamp.bump()
+        with self._lock:
+            waiters = list(self._waiters)
+        for loop, changed in waiters:
+            try:
+                loop.call_soon_threadsafe(changed.set)
+            except RuntimeError:
+                pass  # loop already closed
+
+    def clear(self):
+        """Drop the cached body in this process."""
+        with self._lock:
+            self._version = None
+            self._states = None
+
+    def states(self):
+        """Return (version, {nodeid: state}); queries only after a change."""
+        version = self.version()
+        with self._lock:
+            if version == self._version:
+                return version, self._states
+        states = dict(Motor.objects.values_list('sensor_id', 'state'))
+        with self._lock:
+            self._version, self._states = version, states
+        return version, states
+
+    async def wait_for_change(self, version, timeout):
+        """
+        Wait until the version differs from `version` or timeout seconds pass.
+        Returns the current version.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        waiter = (loop, asyncio.Event())
+        with self._lock:
+            self._waiters.add(waiter)
+        try:
+            current = self.version()
+            while current == version:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(waiter[1].wait(), min(remaining, POLL_INTERVAL_SECONDS))
+                except asyncio.TimeoutError:
+                    pass
+                waiter[1].clear()
+                current = self.version()
+            return current
+        finally:
+            with self._lock:
+                self._waiters.discard(waiter)
+
+
+motor_feed = MotorStateFeed()
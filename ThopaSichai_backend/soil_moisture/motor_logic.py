@@ -3,42 +3,68 @@ Motor control logic for soil moisture system.
 This module contains the business logic for determining motor state based on sensor readings.
 """
 import logging
-from typing import Dict, Literal
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timezone as dt_timezone
+from typing import Dict, Literal, Optional
+
+import numpy as np
+from django.conf import settings
 
 logger = logging.getLogger('soil_moisture')
 
 # Default threshold - motor turns ON when moisture exceeds this value
 DEFAULT_THRESHOLD = 50.0
 
+# Defaults for the AUTOMATIC path (overridable in settings, see MotorGuard)
+DEFAULT_HYSTERESIS = 2.0
+DEFAULT_MIN_ON_SECONDS = 60
+DEFAULT_MIN_OFF_SECONDS = 60
+DEFAULT_MAX_ON_SECONDS = 3600  # MAX_IRRIGATION_DURATION in the firmware config
+DEFAULT_COOLDOWN_SECONDS = 300  # PUMP_COOLDOWN_TIME in the firmware config
+
 
 class MotorController:
     """
     Controller class to determine motor state based on soil moisture readings.
-    Motor turns ON when moisture value exceeds threshold.
+    Motor turns ON when moisture value exceeds high_threshold and OFF when it
+    falls to low_threshold or below; in between the current state is kept.
+    Both default to threshold, which gives a plain ON-above-threshold rule.
     """
     
-    def __init__(self, threshold: float = DEFAULT_THRESHOLD):
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD,
+                 low_threshold: Optional[float] = None, high_threshold: Optional[float] = None):
         """
         Initialize motor controller with threshold.
         
         Args:
             threshold: Motor turns ON when moisture value exceeds this
+            low_threshold: Lower edge of the hysteresis band (default: threshold)
+            high_threshold: Upper edge of the hysteresis band (default: threshold)
         """
         if not 0 <= threshold <= 100:
             raise ValueError("threshold must be between 0 and 100")
+        low_threshold = threshold if low_threshold is None else low_threshold
+        high_threshold = threshold if high_threshold is None else high_threshold
+        if not 0 <= low_threshold <= high_threshold <= 100:
+            raise ValueError("thresholds must satisfy 0 <= low_threshold <= high_threshold <= 100")
         
         self.threshold = threshold
-        logger.info(f"MotorController initialized with threshold: {threshold}%")
+        self.low_threshold = low_threshold
+        self.high_threshold = high_threshold
+        logger.debug(f"MotorController initialized with band {low_threshold}-{high_threshold}%")
     
     def determine_motor_state(self, current_moisture: float, 
                              current_motor_state: Literal['ON', 'OFF'] = 'OFF') -> Dict:
         """
         Determine if motor should be ON or OFF based on current moisture level.
-        Motor turns ON when moisture > threshold, OFF otherwise.
+        Motor turns ON when moisture > high_threshold, OFF when moisture <=
+        low_threshold, and keeps current_motor_state inside the band.
         
         Args:
             current_moisture: Current soil moisture percentage
-            current_motor_state: Current state of the motor (ignored in this logic)
+            current_motor_state: Current state of the motor (kept inside the band)
         
         Returns:
             Dict with motor state decision and reason:
@@ -55,13 +81,18 @@ class MotorController:
         if not isinstance(current_moisture, (int, float)):
             raise ValueError("current_moisture must be a number")
         
-        # Simple logic: motor ON if moisture > threshold
-        if current_moisture > self.threshold:
+        if current_moisture > self.high_threshold:
             desired_state = 'ON'
-            reason = f"Moisture level {current_moisture}% exceeds threshold {self.threshold}%"
-        else:
+            reason = f"Moisture level {current_moisture}% exceeds threshold {self.high_threshold}%"
+        elif current_moisture <= self.low_threshold:
             desired_state = 'OFF'
-            reason = f"Moisture level {current_moisture}% is below or equal to threshold {self.threshold}%"
+            reason = f"Moisture level {current_moisture}% is below or equal to threshold {self.low_threshold}%"
+        else:
+            desired_state = current_motor_state
+            reason = (
+                f"Moisture level {current_moisture}% is inside the hysteresis band "
+                f"{self.low_threshold}-{self.high_threshold}%, keeping {current_motor_state}"
+            )
         
         result = {
             'desired_state': desired_state,
@@ -70,24 +101,277 @@ class MotorController:
             'threshold': self.threshold
         }
         
-        logger.info(f"Motor decision: {desired_state} - {reason}")
+        logger.debug(f"Motor decision: {desired_state} - {reason}")
         return result
 
 
 def get_motor_state(moisture_value: float, 
                    current_state: Literal['ON', 'OFF'] = 'OFF',
-                   threshold: float = DEFAULT_THRESHOLD) -> Dict:
+                   threshold: float = DEFAULT_THRESHOLD,
+                   low_threshold: Optional[float] = None,
+                   high_threshold: Optional[float] = None) -> Dict:
     """
     Convenience function to determine motor state without creating a controller instance.
     
     Args:
         moisture_value: Current soil moisture percentage
-        current_state: Current motor state (ignored in single threshold logic)
+        current_state: Current motor state (kept inside the hysteresis band)
         threshold: Motor turns ON when moisture value exceeds this
+        low_threshold: Lower edge of the hysteresis band (default: threshold)
+        high_threshold: Upper edge of the hysteresis band (default: threshold)
     
     Returns:
         Dict with motor state decision and reason
     """
-    controller = MotorController(threshold)
+    controller = MotorController(threshold, low_threshold, high_threshold)
     return controller.determine_motor_state(moisture_value, current_state)
 
+
+class MotorDecisions:
+    """
+    Result of decide_motor_states(): parallel NumPy arrays, one row per
+    sensor. Reason strings are only built when reason(i) is called.
+    """
+
+    def __init__(self, nodeids, moisture, current_on, desired_on, low, high):
+        self.nodeids = nodeids
+        self.moisture = moisture
+        self.current_on = current_on
+        self.desired_on = desired_on
+        self.low = low
+        self.high = high
+        # {row index: MotorTiming} for the transitions MotorGuard recorded
+        self.timings = {}
+
+    def __len__(self):
+        return len(self.desired_on)
+
+    @property
+    def changed(self):
+        return self.desired_on != self.current_on
+
+    def changed_indices(self):
+        return np.flatnonzero(self.changed)
+
+    def state(self, i):
+        return 'ON' if self.desired_on[i] else 'OFF'
+
+    def current_state(self, i):
+        return 'ON' if self.current_on[i] else 'OFF'
+
+    def reason(self, i):
+        """Same wording as MotorController.determine_motor_state()."""
+        moisture, low, high = float(self.moisture[i]), float(self.low[i]), float(self.high[i])
+        if moisture > high:
+            return f"Moisture level {moisture}% exceeds threshold {high}%"
+        if moisture <= low:
+            return f"Moisture level {moisture}% is below or equal to threshold {low}%"
+        return (
+            f"Moisture level {moisture}% is inside the hysteresis band "
+            f"{low}-{high}%, keeping {self.current_state(i)}"
+        )
+
+
+def _as_on_array(states):
+    """'ON'/'OFF' strings (or booleans) -> bool array."""
+    states = np.asarray(states)
+    if states.dtype == bool:
+        return states
+    return states == 'ON'
+
+
+def decide_motor_states(nodeids, moisture, current_states, thresholds, hysteresis=0.0):
+    """
+    Decide many motors in one NumPy pass.
+
+    Same rule as MotorController with a band of threshold +/- hysteresis:
+    ON above the band, OFF at or below it, unchanged inside.
+
+    Args:
+        nodeids: Sequence of sensor ids (carried through for callers)
+        moisture: Sequence of moisture values
+        current_states: Sequence of 'ON'/'OFF' (or a bool array, True = ON)
+        thresholds: Sequence of thresholds, or one threshold for all
+        hysteresis: Half-width of the band, scalar or per sensor
+
+    Returns:
+        MotorDecisions
+    """
+    moisture = np.asarray(moisture, dtype=float)
+    current_on = _as_on_array(current_states)
+    thresholds = np.broadcast_to(np.asarray(thresholds, dtype=float), moisture.shape)
+    low = np.clip(thresholds - hysteresis, 0.0, 100.0)
+    high = np.clip(thresholds + hysteresis, 0.0, 100.0)
+    desired_on = np.where(moisture > high, True, np.where(moisture <= low, False, current_on))
+    logger.debug(f"Motor decisions: {len(moisture)} sensor(s), {int(np.count_nonzero(desired_on != current_on))} change(s)")
+    return MotorDecisions(nodeids, moisture, current_on, desired_on, low, high)
+
+
+# Last state the guard switched a motor to, when, and until when it must rest
+# after a forced stop (epoch seconds)
+MotorTiming = namedtuple('MotorTiming', ['state', 'since', 'cooldown_until'])
+
+
+def timing_from_columns(switched_to, switched_at, cooldown_until):
+    """MotorTiming from a Motor row's guard columns; None if the guard never switched it."""
+    if not switched_to or switched_at is None:
+        return None
+    return MotorTiming(
+        switched_to, switched_at.timestamp(), cooldown_until.timestamp() if cooldown_until else None
+    )
+
+
+def timing_columns(timing):
+    """Motor guard columns (switched_to, switched_at, cooldown_until) for a MotorTiming."""
+    def as_datetime(seconds):
+        return None if seconds is None else datetime.fromtimestamp(seconds, tz=dt_timezone.utc)
+
+    return {
+        'switched_to': timing.state,
+        'switched_at': as_datetime(timing.since),
+        'cooldown_until': as_datetime(timing.cooldown_until),
+    }
+
+
+class MotorGuard:
+    """
+    Anti-flapping layer for the AUTOMATIC path (no queries of its own).
+
+    On top of a MOTOR_HYSTERESIS band around the threshold it enforces:
+    - MOTOR_MIN_ON_SECONDS / MOTOR_MIN_OFF_SECONDS: a motor the guard
+      switched stays in its new state at least this long,
+    - MOTOR_MAX_ON_SECONDS: a motor running this long is stopped whatever the
+      moisture says (MAX_IRRIGATION_DURATION),
+    - MOTOR_COOLDOWN_SECONDS: after such a forced stop the pump rests this
+      long before it may start again (PUMP_COOLDOWN_TIME),
+    - a running motor whose sensor went silent is stopped the same way.
+
+    Timing only exists for transitions made by the guard. A motor switched
+    elsewhere (manual control) since is free to change on the next reading.
+
+    The ingest path passes each motor's timing from its Motor row (switched_to,
+    switched_at, cooldown_until, via the decision snapshot) and stores the
+    timings of the transitions it makes back on the row with the state, so
+    every worker process enforces the same dwell times; the snapshot reloads
+    in every process on the version bump that write causes. Two workers
+    deciding the same motor within that bump can still both act once.
+    Callers that pass no timings get a per-process table instead.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._timings = {}
+
+    def clear(self):
+        with self._lock:
+            self._timings = {}
+
+    def forget(self, motor_id):
+        with self._lock:
+            self._timings.pop(motor_id, None)
+
+    def decide_batch(self, motor_ids, nodeids, moisture, current_states, thresholds, timings=None,
+                     silent=None, now=None):
+        """
+        Band decision for many motors (decide_motor_states with
+        MOTOR_HYSTERESIS), then dwell times, maximum run time and cooldown.
+
+        `timings` gives each row's MotorTiming (or None) from a shared store;
+        without it this guard's own per-process table is used and updated.
+        `silent` flags rows without a recent reading (their moisture is
+        ignored): a running motor among them is stopped and cools down.
+        `now` is epoch seconds, comparable between processes.
+
+        Only rows that want to change, or whose motor is running, are looked
+        at individually; steady OFF motors cost nothing past the NumPy pass.
+
+        Returns:
+            Tuple of (MotorDecisions with desired_on adjusted and .timings
+            holding the new MotorTiming of each switched row, {row index:
+            (reason, held)}) for the rows the guard overrode. held is False
+            for a forced stop, True when a change was blocked.
+        """
+        if now is None:
+            now = time.time()
+        if silent is not None:
+            silent = np.asarray(silent, dtype=bool)
+            # NaN is neither above nor below the band: the state is kept
+            moisture = np.where(silent, np.nan, np.asarray(moisture, dtype=float))
+        decisions = decide_motor_states(
+            nodeids, moisture, current_states, thresholds,
+            hysteresis=getattr(settings, 'MOTOR_HYSTERESIS', DEFAULT_HYSTERESIS)
+        )
+        overrides = {}
+        candidates = np.flatnonzero(decisions.changed | decisions.current_on)
+        if not len(candidates):
+            return decisions, overrides
+
+        min_on = getattr(settings, 'MOTOR_MIN_ON_SECONDS', DEFAULT_MIN_ON_SECONDS)
+        min_off = getattr(settings, 'MOTOR_MIN_OFF_SECONDS', DEFAULT_MIN_OFF_SECONDS)
+        max_on = getattr(settings, 'MOTOR_MAX_ON_SECONDS', DEFAULT_MAX_ON_SECONDS)
+        cooldown = getattr(settings, 'MOTOR_COOLDOWN_SECONDS', DEFAULT_COOLDOWN_SECONDS)
+
+        with self._lock:
+            for i in candidates:
+                motor_id = motor_ids[i]
+                current = decisions.current_state(i)
+                timing = self._timings.get(motor_id) if timings is None else timings[i]
+                if timing is not None and timing.state != current:
+                    # Switched outside this guard - its decision wins
+                    timing = None
+                elapsed = now - timing.since if timing is not None else None
+
+                if current == 'ON' and elapsed is not None and max_on and elapsed >= max_on:
+                    decisions.desired_on[i] = False
+                    overrides[i] = (f"Maximum run time {max_on}s reached, cooling down for {cooldown}s", False)
+                    decisions.timings[i] = MotorTiming('OFF', now, now + cooldown)
+                    continue
+
+                if current == 'ON' and silent is not None and silent[i]:
+                    decisions.desired_on[i] = False
+                    overrides[i] = (f"No recent moisture reading, cooling down for {cooldown}s", False)
+                    decisions.timings[i] = MotorTiming('OFF', now, now + cooldown)
+                    continue
+
+                if not decisions.changed[i]:
+                    continue
+
+                why = None
+                if elapsed is not None:
+                    if current == 'OFF' and timing.cooldown_until and now < timing.cooldown_until:
+                        why = f"Pump cooling down for another {timing.cooldown_until - now:.0f}s"
+                    elif elapsed < (min_on if current == 'ON' else min_off):
+                        why = f"Minimum {current} time {min_on if current == 'ON' else min_off}s not reached"
+                if why is not None:
+                    overrides[i] = (f"{why} - keeping {current} ({decisions.reason(i)})", True)
+                    decisions.desired_on[i] = decisions.current_on[i]
+                else:
+                    decisions.timings[i] = MotorTiming(decisions.state(i), now, None)
+
+            if timings is None:
+                for i, timing in decisions.timings.items():
+                    self._timings[motor_ids[i]] = timing
+        return decisions, overrides
+
+    def decide(self, motor_id, moisture_value: float, current_state: Literal['ON', 'OFF'],
+               threshold: float, now: Optional[float] = None) -> Dict:
+        """
+        Decide the motor state for one reading (decide_batch with one row).
+
+        Returns a get_motor_state()-style dict plus 'held': True when the
+        band asked for a change that a dwell time or the cooldown blocked.
+        """
+        decisions, overrides = self.decide_batch(
+            [motor_id], [None], [moisture_value], [current_state], [threshold], now=now
+        )
+        reason, held = overrides.get(0, (None, False))
+        return {
+            'desired_state': decisions.state(0),
+            'reason': reason or decisions.reason(0),
+            'moisture_level': moisture_value,
+            'threshold': threshold,
+            'held': held,
+        }
+
+
+motor_guard = MotorGuard()
@@ -0,0 +1,199 @@
+"""
+MQTT -> SoilMoisture ingestion bridge (used by `manage.py mqtt_ingest`).
+
+Field devices publish to irrigation/<device>/<kind>. The bridge decodes
+sensor payloads into reading dicts, pushes them onto a bounded queue from the
+MQTT network thread, and a writer loop stores them in micro-batches through
+ingest_readings() - the same sensor auto-create, duplicate skipping and
+AUTOMATIC motor decision as the HTTP endpoints.
+
+Backpressure: when the queue is full, put() blocks the MQTT network thread,
+so the client stops reading its socket and the broker holds (QoS 1,
+persistent session) or throttles further messages instead of the bridge
+dropping them.
+
+This module has no paho dependency; the management command owns the client.
+"""
+import json
+import logging
+import queue
+import time
+
+from django.db import close_old_connections
+
+from .ingest import ingest_readings
+from .serializers import ReadingInputSerializer
+from .wire import FRAME_VERSION, FrameError, decode_frames
+
+logger = logging.getLogger('soil_moisture')
+
+TOPIC_PREFIX = 'irrigation'
+# Topics that carry sensor values; status/heartbeat/commands are ignored
+SENSOR_KINDS = ('sensors', 'telemetry')
+
+
+def zone_nodeid(device_id, zone):
+    """Nodeid of one zone of a multi-zone device (zones are numbered from 1)."""
+    return f'{device_id}_zone{zone}'
+
+
+def decode_message(topic, payload):
+    """
+    Turn one MQTT message into a list of validated reading dicts.
+
+    Accepted payloads on irrigation/<device>/sensors|telemetry:
+      - binary sensor frames (see wire.py), concatenated
+      - {"nodeid": "001", "value": 45.5, ...} - one reading
+      - {"readings": [{...}, ...]} - several readings
+      - {"soil_moisture": [45, 52, ...]} or telemetry's
+        {"sensors": {"soil_moisture": [...]}} - one value per zone,
+        stored as nodeid <device>_zone<n>
+
+    Returns:
+        Tuple of (readings, number of rejected readings). Messages on other
+        topics decode to ([], 0).
+
+    Raises:
+        ValueError: payload is neither valid JSON nor valid frames
+    """
+    parts = topic.split('/')
+    if len(parts) != 3 or parts[0] != TOPIC_PREFIX or parts[2] not in SENSOR_KINDS:
+        return [], 0
+    device_id = parts[1]
+
+    if payload[:1] == bytes([FRAME_VERSION]):
+        try:
+            readings, rejected = decode_frames(payload)
+        except FrameError as e:
+            raise ValueError(f'Invalid frames: {e}')
+        return readings, len(rejected)
+
+    data = json.loads(payload)
+    if not isinstance(data, dict):
+        raise ValueError('Expected a JSON object')
+
+    if 'readings' in data:
+        items = data['readings'] if isinstance(data['readings'], list) else []
+    elif 'nodeid' in data:
+        items = [data]
+    else:
+        sensors = data.get('sensors', data)
+        zones = sensors.get('soil_moisture') if isinstance(sensors, dict) else None
+        if isinstance(zones, (int, float)):
+            zones = [zones]
+        if not isinstance(zones, list):
+            return [], 0
+        # Device clocks aren't NTP-synced, so zone values are server-stamped
+        items = [
+            {'nodeid': zone_nodeid(device_id, zone), 'value': value}
+            for zone, value in enumerate(zones, start=1)
+        ]
+
+    readings = []
+    rejected = 0
+    for item in items:
+        serializer = ReadingInputSerializer(data=item)
+        if serializer.is_valid():
+            readings.append(serializer.validated_data)
+        else:
+            rejected += 1
+            logger.warning(f"MQTT reading rejected on {topic}: {serializer.errors}")
+    return readings, rejected
+
+
+class MqttIngestBridge:
+    """Bounded reading queue between the MQTT callback thread and the DB writer."""
+
+    def __init__(self, queue_size=5000, batch_size=200, flush_interval_ms=500, put_timeout=None):
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000.0
+        # None blocks the MQTT thread until there is room (backpressure)
+        self.put_timeout = put_timeout
+
+        self.messages = 0
+        self.received = 0
+        self.rejected = 0
+        self.dropped = 0
+        self.stored = 0
+        self.duplicates = 0
+        self.batches = 0
+        self.errors = 0
+
+    def handle_message(self, topic, payload):
+        """MQTT on_message body: decode and enqueue, blocking when the queue is full."""
+        self.messages += 1
+        try:
+            readings, rejected = decode_message(topic, payload)
+        except (ValueError, UnicodeDecodeError) as e:
+            self.rejected += 1
+            logger.warning(f"Undecodable MQTT payload on {topic}: {str(e)}")
+            return
+
+        self.rejected += rejected
+        for reading in readings:
+            try:
+                self.queue.put(reading, timeout=self.put_timeout)
+                self.received += 1
+            except queue.Full:
+                self.dropped += 1
+        if self.dropped and self.dropped % 100 == 1:
+            logger.warning(f"MQTT ingest queue full, {self.dropped} reading(s) dropped so far")
+
+    def next_batch(self, timeout):
+        """
+        Wait up to timeout for a first reading, then collect more until
+        batch_size is reached or flush_interval has passed since the first.
+        """
+        try:
+            batch = [self.queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                # Past the deadline only take what is already queued
+                batch.append(self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def write_batch(self, batch):
+        """Store one micro-batch. Returns the number of readings stored."""
+        if not batch:
+            return 0
+        close_old_connections()
+        try:
+            result = ingest_readings(batch, ip_address='mqtt')
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"MQTT batch of {len(batch)} reading(s) failed: {str(e)}", exc_info=True)
+            return 0
+
+        self.batches += 1
+        self.stored += len(result['records'])
+        self.duplicates += result['duplicates']
+        for update in result['motor_updates'].values():
+            if update['changed']:
+                logger.info(f"MQTT: motor '{update['motor_name']}' -> {update['state']} ({update['reason']})")
+        return len(result['records'])
+
+    def drain(self):
+        """Write everything still queued (used on shutdown)."""
+        while not self.queue.empty():
+            self.write_batch(self.next_batch(timeout=0))
+
+    def stats(self):
+        return {
+            'messages': self.messages,
+            'received': self.received,
+            'rejected': self.rejected,
+            'dropped': self.dropped,
+            'stored': self.stored,
+            'duplicates': self.duplicates,
+            'batches': self.batches,
+            'errors': self.errors,
+            'queue_depth': self.queue.qsize(),
+        }
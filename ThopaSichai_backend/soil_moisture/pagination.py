@@ -0,0 +1,119 @@
+"""
+Keyset (cursor) pagination for the readings lists.
+
+Readings are listed newest first by (timestamp, id). Instead of OFFSET - which
+makes the database walk and discard every earlier row - a page ends with an
+opaque cursor naming its last (or first) row, and the next query starts right
+there on the timestamp index:
+
+    next:  timestamp <= t AND NOT (timestamp = t AND id >= i)  ORDER BY -timestamp, -id
+    prev:  timestamp >= t AND NOT (timestamp = t AND id <= i)  ORDER BY  timestamp,  id
+
+so page 10,000 costs the same as page 1. Counting is separate (see
+count_readings()): totals the reading counters can answer are free, any
+other exact COUNT(*) is as slow as a deep OFFSET and only runs on request.
+"""
+import base64
+import binascii
+import uuid
+
+from django.db import connection
+from django.utils.dateparse import parse_datetime
+
+NEXT = 'n'
+PREV = 'p'
+
+COUNT_MODES = ('none', 'estimate', 'exact')
+
+
+class CursorError(ValueError):
+    pass
+
+
+def encode_cursor(direction, record):
+    raw = f'{direction}|{record.timestamp.isoformat()}|{record.id.hex}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Return (direction, timestamp, id); raises CursorError for anything else."""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+        direction, timestamp, record_id = raw.split('|')
+        timestamp = parse_datetime(timestamp)
+        record_id = uuid.UUID(hex=record_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise CursorError('Invalid cursor')
+    if direction not in (NEXT, PREV) or timestamp is None:
+        raise CursorError('Invalid cursor')
+    return direction, timestamp, record_id
+
+
+def paginate_readings(queryset, page_size, cursor=None):
+    """
+    One page of `queryset`, newest first. Returns (records, pagination) where
+    pagination holds page_size, has_next/has_prev and next_cursor/prev_cursor.
+    """
+    if cursor is None:
+        direction = NEXT
+        rows = list(queryset.order_by('-timestamp', '-id')[:page_size + 1])
+        has_more, came_from_other_side = len(rows) > page_size, False
+    else:
+        direction, timestamp, record_id = decode_cursor(cursor)
+        if direction == NEXT:
+            page = queryset.filter(timestamp__lte=timestamp).exclude(timestamp=timestamp, id__gte=record_id)
+            rows = list(page.order_by('-timestamp', '-id')[:page_size + 1])
+        else:
+            page = queryset.filter(timestamp__gte=timestamp).exclude(timestamp=timestamp, id__lte=record_id)
+            rows = list(page.order_by('timestamp', 'id')[:page_size + 1])
+        has_more, came_from_other_side = len(rows) > page_size, True
+
+    rows = rows[:page_size]
+    if direction == PREV:
+        rows.reverse()
+        has_next, has_prev = came_from_other_side, has_more
+    else:
+        has_next, has_prev = has_more, came_from_other_side
+
+    return rows, {
+        'page_size': page_size,
+        'has_next': has_next,
+        'has_prev': has_prev,
+        'next_cursor': encode_cursor(NEXT, rows[-1]) if rows and has_next else None,
+        'prev_cursor': encode_cursor(PREV, rows[0]) if rows and has_prev else None,
+    }
+
+
+def estimate_row_count(model):
+    """
+    Cheap approximate row count of a whole table, or None: the planner's
+    estimate on PostgreSQL, the highest rowid on SQLite.
+    """
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+        elif connection.vendor == 'sqlite':
+            cursor.execute(f'SELECT MAX(_rowid_) FROM {connection.ops.quote_name(table)}')
+        else:
+            return None
+        row = cursor.fetchone()
+    if not row or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+def count_readings(queryset, mode, filtered, counted=None):
+    """
+    (total_count, is_estimate) for ?count=none|estimate|exact. `counted` is
+    the exact total from the reading counters (counters.py) when the filter
+    allows one; it answers both estimate and exact. Otherwise estimates only
+    exist for the unfiltered table; a filtered estimate is (None, True).
+    """
+    if mode != 'none' and counted is not None:
+        return counted, False
+    if mode == 'exact':
+        return queryset.count(), False
+    if mode == 'estimate':
+        return (None if filtered else estimate_row_count(queryset.model)), True
+    return None, False
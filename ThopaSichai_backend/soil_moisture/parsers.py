@@ -0,0 +1,27 @@
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+from .wire import MEDIA_TYPE, FrameError, decode_frames
+
+
+class FrameBatch(list):
+    """Decoded readings from a binary upload; frames that failed validation are in .rejected."""
+
+    def __init__(self, readings, rejected):
+        super().__init__(readings)
+        self.rejected = rejected
+
+
+class SensorFrameParser(BaseParser):
+    """
+    Parses a body of concatenated binary sensor frames (see wire.py)
+    straight into reading dicts, skipping JSON entirely.
+    """
+    media_type = MEDIA_TYPE
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            readings, rejected = decode_frames(stream.read())
+        except FrameError as e:
+            raise ParseError(f'Binary frame parse error - {e}')
+        return FrameBatch(readings, rejected)
@@ -0,0 +1,132 @@
+"""
+Short-lived cache of composite API payloads (dashboard stats, system status).
+
+Those endpoints run several queries to build one response that hundreds of
+app clients poll. The built payload is kept in Django's cache (CACHES alias
+PAYLOAD_CACHE_ALIAS) for PAYLOAD_CACHE_TTL_SECONDS, keyed by endpoint, query
+parameters and the configuration version:
+
+- Motor, Sensor, SystemMode and ThresholdConfig writes bump the
+  'payload-config' VersionStamp on commit (see signals.py). The version is
+  part of every key, so all processes stop using older entries at once.
+- New readings bump the 'payload-readings' stamp on commit. Each entry records
+  the readings version it was built at and is rebuilt when that's not the
+  current one - except that the writing process first patches the entries it
+  can reach (registered patchers fold the new readings in) and moves them to
+  the new version. Entries are only patched when nobody else bumped in
+  between, so concurrent writers fall back to rebuilding.
+
+With the per-process locmem cache a writer only reaches its own entries and
+the other workers rebuild theirs; with a shared backend (file-based on one
+box) the patched entries serve every worker. Either way no worker serves a
+payload that misses a committed change for longer than it takes to notice a
+new version. Fields that can't be patched exactly, such as window averages,
+stay as built until the TTL expires.
+"""
+import hashlib
+import json
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .versioning import VersionStamp
+
+logger = logging.getLogger('soil_moisture')
+
+# Parameter variants per endpoint whose keys are remembered for patching
+MAX_TRACKED_KEYS = 32
+
+
+class PayloadCache:
+    """Cached endpoint payloads, invalidated by config writes, patched by readings."""
+
+    def __init__(self, config_stamp='payload-config', readings_stamp='payload-readings'):
+        self.config = VersionStamp(config_stamp)
+        self.readings = VersionStamp(readings_stamp)
+        self._patchers = {}
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, 'PAYLOAD_CACHE_ALIAS', 'default')]
+
+    @staticmethod
+    def ttl():
+        return getattr(settings, 'PAYLOAD_CACHE_TTL_SECONDS', 10)
+
+    def _prefix(self, endpoint):
+        return 'payload:%s:%x-%x' % (endpoint, *self.config.current())
+
+    def _key(self, endpoint, params):
+        digest = hashlib.sha1(json.dumps(sorted(params.items())).encode()).hexdigest()[:16]
+        return f'{self._prefix(endpoint)}:{digest}'
+
+    def patcher(self, endpoint):
+        """Decorator registering fn(payload, records) -> payload for `endpoint`."""
+        def register(fn):
+            self._patchers[endpoint] = fn
+            return fn
+        return register
+
+    def get(self, endpoint, params, build):
+        """
+        Cached payload of `endpoint` for `params` (a dict of query parameters),
+        calling build() on a miss.
+        """
+        ttl = self.ttl()
+        if ttl <= 0:
+            return build()
+        key = self._key(endpoint, params)
+        # Read before building: a reading committed meanwhile forces a rebuild
+        readings = self.readings.current()
+        entry = self.cache.get(key)
+        if entry is not None and entry['readings'] == readings:
+            return entry['payload']
+
+        payload = build()
+        self.cache.set(key, {'payload': payload, 'readings': readings, 'expires': time.time() + ttl}, ttl)
+        self._track(endpoint, key, ttl)
+        return payload
+
+    def _track(self, endpoint, key, ttl):
+        if endpoint not in self._patchers:
+            return
+        index = f'{self._prefix(endpoint)}:keys'
+        keys = self.cache.get(index, [])
+        if key not in keys:
+            self.cache.set(index, (keys + [key])[-MAX_TRACKED_KEYS:], ttl)
+
+    def invalidate(self):
+        """Drop every cached payload in every process."""
+        self.config.bump()
+
+    def readings_added(self, records):
+        """
+        Note committed readings: patch the reachable entries, leave the rest
+        to be rebuilt. Never raises - the readings are already stored.
+        """
+        if not records:
+            return
+        try:
+            previous, current = self.readings.bump()
+            if previous[0] != current[0] or previous[1] + 1 != current[1]:
+                return
+            now = time.time()
+            for endpoint, patch in self._patchers.items():
+                keys = self.cache.get(f'{self._prefix(endpoint)}:keys', [])
+                for key, entry in self.cache.get_many(keys).items():
+                    if entry['readings'] != previous or entry['expires'] <= now:
+                        continue
+                    entry['payload'] = patch(entry['payload'], records)
+                    entry['readings'] = current
+                    self.cache.set(key, entry, max(entry['expires'] - now, 1))
+        except Exception as e:
+            logger.error(f"Error patching cached payloads: {str(e)}", exc_info=True)
+
+    def clear(self):
+        """Empty the payload cache (tests)."""
+        self.cache.clear()
+
+
+payload_cache = PayloadCache()
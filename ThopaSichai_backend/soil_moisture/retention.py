@@ -0,0 +1,191 @@
+"""
+Retention of readings and rollups (READING_RETENTION_DAYS).
+
+Each level - raw readings and minute, hour and day rollups - is kept for a
+number of days, or forever when set to None, e.g. raw readings for 30 days,
+hourly rollups for two years and daily rollups forever. A finer level can't
+be kept longer than a coarser one.
+
+A level's horizon is the start of the UTC day that many days ago: older
+data is purged, newer data is kept. `manage.py prune_readings` enforces the
+policy, oldest day first:
+
+1. the day's rollups are rebuilt from its raw readings where they miss
+   some (only the resolutions still kept for that day), so nothing is
+   deleted before it is summarised;
+2. the day's raw readings are deleted through ingest.delete_readings() in
+   chunks of RETENTION_CHUNK_SIZE, one short transaction per chunk, so an
+   ingest never waits for more than one chunk;
+3. expired minute, hour and day rollups are deleted in chunks too;
+4. on SQLite, free pages are returned to the OS with an incremental vacuum.
+
+rollups.summarize() reads the same horizons, so summaries keep working
+across the boundary: older stretches of a window are answered from the
+finest level still stored.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, transaction
+from django.db.models import Min, Sum
+from django.utils import timezone
+
+from .ingest import delete_readings
+from .models import ReadingRollup, SoilMoisture
+from .rollups import RESOLUTIONS, bucket_start, rebuild_day
+
+# Finest first
+LEVELS = ('raw', 'minute', 'hour', 'day')
+
+
+def policy():
+    """{level: days kept, None for forever} from READING_RETENTION_DAYS."""
+    configured = getattr(settings, 'READING_RETENTION_DAYS', None) or {}
+    unknown = set(configured) - set(LEVELS)
+    if unknown:
+        raise ImproperlyConfigured(f"READING_RETENTION_DAYS: unknown level(s) {', '.join(sorted(unknown))}")
+    days = {level: configured.get(level) for level in LEVELS}
+    for level, kept in days.items():
+        if kept is not None and (not isinstance(kept, int) or kept < 1):
+            raise ImproperlyConfigured(f"READING_RETENTION_DAYS['{level}'] must be a positive number of days or None")
+    for finer, coarser in zip(LEVELS, LEVELS[1:]):
+        if days[coarser] is not None and (days[finer] is None or days[finer] > days[coarser]):
+            raise ImproperlyConfigured(
+                f"READING_RETENTION_DAYS: '{finer}' can't be kept longer than '{coarser}'"
+            )
+    return days
+
+
+def horizons(now=None):
+    """{level: oldest moment still kept, None when kept forever}."""
+    today = bucket_start(now or timezone.now(), 86400)
+    return {
+        level: None if days is None else today - timedelta(days=days)
+        for level, days in policy().items()
+    }
+
+
+def kept_resolutions(day, limits):
+    """Rollup resolutions still kept for the UTC day starting at `day`."""
+    return [
+        resolution for resolution, _ in RESOLUTIONS
+        if limits[str(resolution)] is None or day >= limits[str(resolution)]
+    ]
+
+
+def expired(limits):
+    """{level: queryset of what's past its horizon} for the levels that expire."""
+    querysets = {}
+    if limits['raw'] is not None:
+        querysets['raw'] = SoilMoisture.objects.filter(timestamp__lt=limits['raw'])
+    for resolution, _ in RESOLUTIONS:
+        if limits[str(resolution)] is not None:
+            querysets[str(resolution)] = ReadingRollup.objects.filter(
+                resolution=resolution, bucket__lt=limits[str(resolution)]
+            )
+    return querysets
+
+
+def _roll_up(day, resolutions):
+    """
+    Rebuild the day's kept rollups before its readings go, when they
+    summarise fewer readings than are stored (e.g. readings from before the
+    rollups existed). A day that an interrupted run already partly purged
+    has fewer readings than its rollups and is left as it is.
+    """
+    if not resolutions:
+        return
+    end = day + timedelta(days=1)
+    with transaction.atomic():
+        stored = SoilMoisture.objects.filter(timestamp__gte=day, timestamp__lt=end).count()
+        summarised = ReadingRollup.objects.filter(
+            resolution=resolutions[0], bucket__gte=day, bucket__lt=end
+        ).aggregate(count=Sum('count'))['count'] or 0
+        if stored > summarised:
+            rebuild_day(day, resolutions)
+
+
+def _delete_rollups(queryset):
+    with transaction.atomic():
+        deleted, _ = queryset.delete()
+    return deleted
+
+
+def _purge(queryset, chunk_size, delete):
+    """Delete `queryset` chunk by chunk, each with delete(chunk queryset)."""
+    model = queryset.model
+    deleted = 0
+    while True:
+        ids = list(queryset.order_by().values_list('pk', flat=True)[:chunk_size])
+        if not ids:
+            return deleted
+        deleted += delete(model.objects.filter(pk__in=ids))
+
+
+def prune(now=None, chunk_size=None):
+    """
+    Enforce the retention policy.
+
+    Returns:
+        Dict with 'days' (days of raw readings rolled up and purged) and
+        the number of rows deleted per level ('raw', 'minute', 'hour', 'day')
+    """
+    limits = horizons(now)
+    chunk_size = chunk_size or getattr(settings, 'RETENTION_CHUNK_SIZE', 5000)
+    result = dict.fromkeys(LEVELS, 0)
+    result['days'] = 0
+    querysets = expired(limits)
+
+    if 'raw' in querysets:
+        while True:
+            oldest = querysets['raw'].aggregate(oldest=Min('timestamp'))['oldest']
+            if oldest is None:
+                break
+            day = bucket_start(oldest, 86400)
+            _roll_up(day, kept_resolutions(day, limits))
+            result['raw'] += _purge(
+                SoilMoisture.objects.filter(timestamp__gte=day, timestamp__lt=day + timedelta(days=1)),
+                chunk_size, delete_readings,
+            )
+            result['days'] += 1
+
+    for level in ('minute', 'hour', 'day'):
+        if level in querysets:
+            result[level] = _purge(querysets[level], chunk_size, _delete_rollups)
+    return result
+
+
+def incremental_vacuum():
+    """
+    Return the SQLite file's free pages to the OS. Returns the number of
+    pages freed, or None when the database isn't SQLite or isn't in
+    auto_vacuum=INCREMENTAL mode (see enable_incremental_vacuum()).
+    """
+    if connection.vendor != 'sqlite':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA auto_vacuum')
+        if cursor.fetchone()[0] != 2:
+            return None
+        cursor.execute('PRAGMA freelist_count')
+        free = cursor.fetchone()[0]
+        # Each step of the pragma frees one page and execute() only takes
+        # one step; executescript() runs it to the end
+        connection.connection.executescript('PRAGMA incremental_vacuum;')
+        cursor.execute('PRAGMA freelist_count')
+        return free - cursor.fetchone()[0]
+
+
+def enable_incremental_vacuum():
+    """
+    Switch the SQLite database to auto_vacuum=INCREMENTAL. Takes a full
+    VACUUM - a one-off rewrite of the file that locks it meanwhile.
+    Returns False when the database isn't SQLite.
+    """
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        cursor.execute('VACUUM')
+    return True
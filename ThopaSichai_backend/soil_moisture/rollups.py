@@ -0,0 +1,320 @@
+"""
+Minute, hour and day rollups of the readings (ReadingRollup).
+
+Every stored reading is added to its sensor's minute, hour and day bucket at
+ingest time - one upsert statement per batch, in the inserting transaction -
+so each bucket holds the count, sum, sum of squares, min and max of its
+readings. Buckets are aligned to UTC (Nepal's +5:45 offset would leave local
+hours straddling two UTC ones).
+
+summarize() answers a window [start, end) by covering it with the widest
+whole buckets that fit - days in the middle, hours and minutes towards the
+edges - and reads raw readings only for the partial minutes at either end:
+
+    start                                                              end
+      |raw|  minutes  |  hours  |        days        |  hours  |minutes|raw|
+
+That is one query over at most five bucket ranges plus one indexed query over
+less than two minutes of readings, whatever the window or table size.
+
+`manage.py rollup_readings` rebuilds buckets from the raw readings, for
+backfills and to repair drift (e.g. a concurrent retry that lost its insert
+after being counted).
+
+Past the retention horizons (retention.py) the raw readings and then the
+minute and hour buckets are gone; summarize() answers those stretches from
+the finest level still stored, rounding the window's edges there to whole
+buckets of that level.
+"""
+import math
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import connection
+from django.db.models import Count, F, Max, Min, Q, Sum
+from django.db.models.functions import Trunc
+
+from .models import ReadingRollup, SoilMoisture
+
+UTC = dt_timezone.utc
+
+# Widest first
+RESOLUTIONS = (
+    (ReadingRollup.Resolution.DAY, 86400),
+    (ReadingRollup.Resolution.HOUR, 3600),
+    (ReadingRollup.Resolution.MINUTE, 60),
+)
+
+_COLUMNS = ('sensor_id', 'resolution', 'bucket', 'count', 'value_sum', 'value_sum_squares', 'value_min', 'value_max')
+
+
+def bucket_start(moment, seconds):
+    """Start of the `seconds`-wide UTC bucket containing `moment`."""
+    epoch_seconds = math.floor(moment.timestamp())
+    return datetime.fromtimestamp(epoch_seconds - epoch_seconds % seconds, tz=UTC)
+
+
+def _bucket_end(moment, seconds):
+    start = bucket_start(moment, seconds)
+    return start if start == moment else start + timedelta(seconds=seconds)
+
+
+class Summary:
+    """Count, mean, min, max and standard deviation of a set of readings."""
+
+    __slots__ = ('count', 'total', 'total_squares', 'minimum', 'maximum')
+
+    def __init__(self, count=0, total=0.0, total_squares=0.0, minimum=None, maximum=None):
+        self.count = count
+        self.total = total
+        self.total_squares = total_squares
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def add(self, count, total, total_squares, minimum, maximum):
+        if not count:
+            return self
+        self.count += count
+        self.total += total
+        self.total_squares += total_squares
+        self.minimum = minimum if self.minimum is None else min(self.minimum, minimum)
+        self.maximum = maximum if self.maximum is None else max(self.maximum, maximum)
+        return self
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    @property
+    def stddev(self):
+        """Population standard deviation."""
+        if not self.count:
+            return None
+        mean = self.total / self.count
+        return math.sqrt(max(self.total_squares / self.count - mean * mean, 0.0))
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'mean': self.mean,
+            'min': self.minimum,
+            'max': self.maximum,
+            'stddev': self.stddev,
+        }
+
+    def __repr__(self):
+        return f'Summary(count={self.count}, mean={self.mean}, min={self.minimum}, max={self.maximum})'
+
+
+# ==========================================
+# Writing
+# ==========================================
+
+def bucket_rows(readings):
+    """
+    Fold (nodeid, timestamp, value) triples into rollup rows:
+    {(nodeid, resolution, bucket): [count, sum, sum of squares, min, max]}.
+    """
+    rows = {}
+    for nodeid, moment, value in readings:
+        value = float(value)
+        for resolution, seconds in RESOLUTIONS:
+            key = (nodeid, resolution, bucket_start(moment, seconds))
+            row = rows.get(key)
+            if row is None:
+                rows[key] = [1, value, value * value, value, value]
+            else:
+                row[0] += 1
+                row[1] += value
+                row[2] += value * value
+                row[3] = min(row[3], value)
+                row[4] = max(row[4], value)
+    return rows
+
+
+def _upsert_sql():
+    quote = connection.ops.quote_name
+    table = quote(ReadingRollup._meta.db_table)
+    least, greatest = ('MIN', 'MAX') if connection.vendor == 'sqlite' else ('LEAST', 'GREATEST')
+    count, value_sum, squares, value_min, value_max = (quote(column) for column in _COLUMNS[3:])
+    return (
+        f"INSERT INTO {table} ({', '.join(quote(column) for column in _COLUMNS)}) "
+        f"VALUES ({', '.join(['%s'] * len(_COLUMNS))}) "
+        f"ON CONFLICT ({quote('sensor_id')}, {quote('resolution')}, {quote('bucket')}) DO UPDATE SET "
+        f"{count} = {table}.{count} + excluded.{count}, "
+        f"{value_sum} = {table}.{value_sum} + excluded.{value_sum}, "
+        f"{squares} = {table}.{squares} + excluded.{squares}, "
+        f"{value_min} = {least}({table}.{value_min}, excluded.{value_min}), "
+        f"{value_max} = {greatest}({table}.{value_max}, excluded.{value_max})"
+    )
+
+
+def add_readings(records):
+    """
+    Add newly stored SoilMoisture records to their rollups with a single
+    upsert. Call inside the transaction that inserted them.
+    """
+    rows = bucket_rows((record.sensor_id, record.timestamp, record.value) for record in records)
+    if not rows:
+        return
+    adapt = connection.ops.adapt_datetimefield_value
+    params = [
+        (nodeid, str(resolution), adapt(bucket), *values)
+        for (nodeid, resolution, bucket), values in rows.items()
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(_upsert_sql(), params)
+
+
+# ==========================================
+# Reading
+# ==========================================
+
+def split_window(start, end, horizons=None):
+    """
+    Cover [start, end) with whole buckets, widest first.
+
+    `horizons` ({'raw'/'minute'/'hour'/'day': oldest moment still stored,
+    None when kept forever}, see retention.horizons()) limits each level to
+    where it still exists. Where the finest stored level is a rollup, the
+    window's partial edges are rounded to whole buckets of that level: a
+    bucket counts when it starts inside the window.
+
+    Returns:
+        Tuple of ([(resolution, first bucket, end bucket), ...],
+                  [(raw start, raw end), ...]) - the bucket ranges are
+        half-open on bucket start, the raw ranges cover what's left.
+    """
+    horizons = horizons or {}
+    levels = [str(resolution) for resolution, _ in RESOLUTIONS] + ['raw']
+    bucket_ranges, raw_ranges = [], []
+
+    def finest_at(moment):
+        for level in range(len(levels) - 1, -1, -1):
+            horizon = horizons.get(levels[level])
+            if horizon is None or moment >= horizon:
+                return level
+        return None
+
+    def cover(lo, hi, level, finest):
+        if lo >= hi:
+            return
+        if level == len(RESOLUTIONS):
+            raw_ranges.append((lo, hi))
+            return
+        resolution, seconds = RESOLUTIONS[level]
+        if level == finest:
+            first, last = _bucket_end(lo, seconds), _bucket_end(hi, seconds)
+            if first < last:
+                bucket_ranges.append((resolution, first, last))
+            return
+        first, last = _bucket_end(lo, seconds), bucket_start(hi, seconds)
+        if first >= last:
+            cover(lo, hi, level + 1, finest)
+            return
+        bucket_ranges.append((resolution, first, last))
+        cover(lo, first, level + 1, finest)
+        cover(last, hi, level + 1, finest)
+
+    # Older stretches of the window have coarser data; cover each on its own
+    cuts = sorted({horizon for horizon in horizons.values() if horizon is not None and start < horizon < end})
+    for lo, hi in zip([start] + cuts, cuts + [end]):
+        finest = finest_at(lo)
+        if finest is not None:
+            cover(lo, hi, 0, finest)
+    return bucket_ranges, raw_ranges
+
+
+def summarize(start, end, sensor_ids=None, by_sensor=False):
+    """
+    Summary of the readings with start <= timestamp < end.
+
+    Args:
+        start, end: Aware datetimes
+        sensor_ids: Only these sensors (all when None)
+        by_sensor: Return {nodeid: Summary} instead of one Summary
+
+    Returns:
+        Summary, or {nodeid: Summary} for sensors with readings in the window
+    """
+    from .retention import horizons
+
+    bucket_ranges, raw_ranges = split_window(start, end, horizons())
+    results = {}
+
+    def collect(queryset, fields):
+        if sensor_ids is not None:
+            queryset = queryset.filter(sensor_id__in=sensor_ids)
+        aggregates = dict(zip(('count', 'total', 'total_squares', 'minimum', 'maximum'), fields))
+        if by_sensor:
+            rows = queryset.order_by().values('sensor_id').annotate(**aggregates)
+        else:
+            rows = [queryset.aggregate(**aggregates)]
+        for row in rows:
+            summary = results.setdefault(row.get('sensor_id'), Summary())
+            summary.add(row['count'], row['total'], row['total_squares'], row['minimum'], row['maximum'])
+
+    if bucket_ranges:
+        condition = Q()
+        for resolution, first, last in bucket_ranges:
+            condition |= Q(resolution=resolution, bucket__gte=first, bucket__lt=last)
+        collect(ReadingRollup.objects.filter(condition), (
+            Sum('count'), Sum('value_sum'), Sum('value_sum_squares'), Min('value_min'), Max('value_max'),
+        ))
+    if raw_ranges:
+        condition = Q()
+        for lo, hi in raw_ranges:
+            condition |= Q(timestamp__gte=lo, timestamp__lt=hi)
+        collect(SoilMoisture.objects.filter(condition), (
+            Count('id'), Sum('value'), Sum(F('value') * F('value')), Min('value'), Max('value'),
+        ))
+
+    if by_sensor:
+        return {nodeid: summary for nodeid, summary in results.items() if summary.count}
+    return results.get(None, Summary())
+
+
+# ==========================================
+# Rebuilding
+# ==========================================
+
+def rebuild_day(day, resolutions=None):
+    """
+    Recompute the rollups of the UTC day starting at `day` from the raw
+    readings - every resolution, or only `resolutions`. Returns the number
+    of readings summarised. Run inside a transaction.
+    """
+    wanted = [(resolution, seconds) for resolution, seconds in RESOLUTIONS
+              if resolutions is None or resolution in resolutions]
+    end = day + timedelta(days=1)
+    minutes = (
+        SoilMoisture.objects.filter(timestamp__gte=day, timestamp__lt=end)
+        .annotate(minute=Trunc('timestamp', 'minute', tzinfo=UTC))
+        .order_by()
+        .values('sensor_id', 'minute')
+        .annotate(
+            count=Count('id'), total=Sum('value'), total_squares=Sum(F('value') * F('value')),
+            minimum=Min('value'), maximum=Max('value'),
+        )
+    )
+
+    rows = {}
+    readings = 0
+    for minute in minutes:
+        readings += minute['count']
+        for resolution, seconds in wanted:
+            key = (minute['sensor_id'], resolution, bucket_start(minute['minute'], seconds))
+            summary = rows.setdefault(key, Summary())
+            summary.add(minute['count'], minute['total'], minute['total_squares'], minute['minimum'], minute['maximum'])
+
+    ReadingRollup.objects.filter(
+        resolution__in=[resolution for resolution, _ in wanted], bucket__gte=day, bucket__lt=end,
+    ).delete()
+    ReadingRollup.objects.bulk_create([
+        ReadingRollup(
+            sensor_id=nodeid, resolution=resolution, bucket=bucket, count=summary.count,
+            value_sum=summary.total, value_sum_squares=summary.total_squares,
+            value_min=summary.minimum, value_max=summary.maximum,
+        )
+        for (nodeid, resolution, bucket), summary in rows.items()
+    ], batch_size=1000)
+    return readings
@@ -0,0 +1,91 @@
+"""
+Server-driven sampling interval for sensor nodes.
+
+The server knows what a node doesn't: the sensor's ThresholdConfig.threshold
+and whether its motor is running. Every ingest response therefore carries a
+recommended next sample interval, and the gateway relays it to the node as a
+compact config frame (wire.encode_config). Nodes sample fast when a decision
+could be about to change and slowly when nothing interesting can happen:
+
+- motor ON, or value within SAMPLING_NEAR_BAND of the threshold:
+  SAMPLING_MIN_INTERVAL_MS
+- value SAMPLING_FAR_BAND or more away from the threshold, or a sensor with
+  no motor (no decision depends on it): SAMPLING_MAX_INTERVAL_MS
+- in between: linear in the distance to the threshold
+"""
+from django.conf import settings
+
+from .motor_logic import DEFAULT_HYSTERESIS
+from .snapshot import decision_snapshot
+
+
+DEFAULT_MIN_INTERVAL_MS = 1000
+DEFAULT_MAX_INTERVAL_MS = 60000
+DEFAULT_NEAR_BAND = 5.0
+DEFAULT_FAR_BAND = 25.0
+
+
+def recommend_interval_ms(value, threshold, motor_state):
+    """
+    Recommended next sample interval for one sensor.
+
+    Args:
+        value: Newest moisture reading
+        threshold: The sensor's motor threshold (None when it has no motor)
+        motor_state: 'ON', 'OFF' or None when the sensor has no motor
+    """
+    shortest = getattr(settings, 'SAMPLING_MIN_INTERVAL_MS', DEFAULT_MIN_INTERVAL_MS)
+    longest = getattr(settings, 'SAMPLING_MAX_INTERVAL_MS', DEFAULT_MAX_INTERVAL_MS)
+    near = getattr(settings, 'SAMPLING_NEAR_BAND', DEFAULT_NEAR_BAND)
+    far = getattr(settings, 'SAMPLING_FAR_BAND', DEFAULT_FAR_BAND)
+
+    if threshold is None:
+        return longest
+    if motor_state == 'ON':
+        return shortest
+
+    distance = abs(value - threshold)
+    if distance <= near:
+        return shortest
+    if distance >= far:
+        return longest
+    return int(shortest + (longest - shortest) * (distance - near) / (far - near))
+
+
+def sampling_advice(latest_values, motor_updates=None):
+    """
+    Recommended interval for each sensor from its newest value.
+
+    Thresholds and motor states come from the decision snapshot, so this
+    costs no queries in the steady state. A motor state just decided by
+    apply_automatic_control (motor_updates) takes precedence over the
+    cached one.
+
+    Args:
+        latest_values: {nodeid: moisture value}
+        motor_updates: {nodeid: motor update dict} from apply_automatic_control
+
+    Returns:
+        {nodeid: {'next_interval_ms': int, 'threshold': float or None,
+        'hysteresis': float or None}} - what the gateway packs into a node
+        config frame; the motor switches at threshold +/- hysteresis, so
+        nodes report crossings of those edges
+    """
+    motor_updates = motor_updates or {}
+    states = decision_snapshot.sensor_states(latest_values.keys())
+    hysteresis = getattr(settings, 'MOTOR_HYSTERESIS', DEFAULT_HYSTERESIS)
+
+    advice = {}
+    for nodeid, value in latest_values.items():
+        state = states.get(nodeid)
+        threshold = state.threshold if state is not None else None
+        motor_state = state.motor_state if state is not None else None
+        update = motor_updates.get(nodeid)
+        if update is not None:
+            motor_state = update['state']
+        advice[nodeid] = {
+            'next_interval_ms': recommend_interval_ms(value, threshold, motor_state),
+            'threshold': threshold,
+            'hysteresis': hysteresis if threshold is not None else None,
+        }
+    return advice
@@ -0,0 +1,26 @@
+"""
+drf-spectacular hooks (SPECTACULAR_SETTINGS['PREPROCESSING_HOOKS']).
+
+The endpoint enumerator only sees DRF views, and DRF views can't await, so
+async Django views are missing from the schema. ASYNC_ENDPOINTS names, for
+each such URL, the DRF view whose schema describes it - the one that builds
+its reply.
+"""
+from django.urls import reverse
+
+# (URL name, HTTP method, name of the documenting DRF view in views.py)
+ASYNC_ENDPOINTS = [
+    ('soil_moisture:motors-info', 'GET', 'motors_state'),
+]
+
+
+def add_async_endpoints(endpoints):
+    """Add the ASYNC_ENDPOINTS to the enumerated (path, path_regex, method, callback) list."""
+    from . import views
+
+    known = {(path, method) for path, _, method, _ in endpoints}
+    for url_name, method, view_name in ASYNC_ENDPOINTS:
+        path = reverse(url_name)
+        if (path, method) not in known:
+            endpoints.append((path, path.lstrip('/'), method, getattr(views, view_name)))
+    return endpoints
@@ -129,7 +129,7 @@ class SoilMoistureSerializer(serializers.ModelSerializer):
     value = serializers.FloatField(
         validators=[
             MinValueValidator(0.0, message="Moisture value cannot be negative"),
-            MaxValueValidator(100.0, message="Moisture value cannot exceed 100%")
+            MaxValueValidator(100.0, message="Moisture value cannot exceed 100%%")
         ],
         help_text="Soil moisture percentage (0-100)"
     )
@@ -141,18 +141,19 @@ class SoilMoistureSerializer(serializers.ModelSerializer):
         help_text="Timestamp of the reading"
     )
     
-    # Nodeid comes from sensor relationship (read-only)
-    nodeid = serializers.CharField(source='sensor.nodeid', read_only=True)
+    # Nodeid is the sensor's primary key - read the FK column, no join per row
+    nodeid = serializers.CharField(source='sensor_id', read_only=True)
     
     class Meta:
         model = SoilMoisture
         fields = [
             'id', 'nodeid', 'value', 'timestamp', 
-            'ip_address', 'created_at', 'updated_at'
+            'ip_address', 'seq', 'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'nodeid', 'created_at', 'updated_at']
         extra_kwargs = {
             'ip_address': {'required': False, 'allow_blank': True},
+            'seq': {'required': False},
         }
     
     def validate_timestamp(self, value):
@@ -191,6 +192,40 @@ class SoilMoistureSerializer(serializers.ModelSerializer):
             return 'SATURATED'
 
 
+class ReadingInputSerializer(serializers.Serializer):
+    """
+    Input-only serializer for a single reading inside a batch upload.
+    Carries the nodeid itself since one batch may span many sensors.
+    """
+    nodeid = serializers.CharField(max_length=100, help_text="Sensor node identifier")
+    value = serializers.FloatField(
+        validators=[
+            MinValueValidator(0.0, message="Moisture value cannot be negative"),
+            MaxValueValidator(100.0, message="Moisture value cannot exceed 100%%")
+        ],
+        help_text="Soil moisture percentage (0-100)"
+    )
+    timestamp = serializers.DateTimeField(
+        required=False,
+        allow_null=True,
+        help_text="Timestamp of the reading (defaults to server time)"
+    )
+    seq = serializers.IntegerField(
+        required=False,
+        allow_null=True,
+        min_value=0,
+        max_value=2 ** 63 - 1,  # SoilMoisture.seq is a PositiveBigIntegerField
+        help_text="Device sequence number - resending the same seq is ignored"
+    )
+    ip_address = serializers.CharField(max_length=45, required=False, allow_blank=True)
+
+    def validate_timestamp(self, value):
+        """Auto-convert naive datetimes, same as SoilMoistureSerializer."""
+        if value and not timezone.is_aware(value):
+            value = timezone.make_aware(value)
+        return value
+
+
 # ==========================================
 # Convenience Serializers
 # ==========================================
@@ -244,6 +279,11 @@ class ThresholdConfigSerializer(serializers.ModelSerializer):
         read_only_fields = ['nodeid', 'updated_at']
 
 
+class BatchReadingsSerializer(serializers.Serializer):
+    """Schema for the batch ingest endpoint - documents the request body."""
+    readings = ReadingInputSerializer(many=True, help_text="List of readings, possibly from many nodeids")
+
+
 class BulkMotorControlSerializer(serializers.Serializer):
     """Serializer for bulk motor control."""
     motors = serializers.ListField(
@@ -0,0 +1,75 @@
+"""
+Signal handlers keeping in-memory caches and cached payloads coherent with
+the database and announcing motor, threshold and mode changes on the live
+feed (live.py).
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import live
+from .models import Motor, Sensor, SystemMode, ThresholdConfig
+from .motor_feed import motor_feed
+from .motor_logic import timing_from_columns
+from .payload_cache import payload_cache
+from .snapshot import decision_snapshot
+
+# update_fields used by the AUTOMATIC decision path when it flips a motor
+MOTOR_STATE_FIELDS = frozenset({'state', 'switched_to', 'switched_at', 'cooldown_until', 'updated_at'})
+
+
+# The snapshot version is shared between processes: bump it only after commit,
+# or another worker could reload the old rows under the new version and keep
+# deciding on them until the next bump
+
+@receiver(post_save, sender=Motor)
+def motor_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and frozenset(update_fields) == MOTOR_STATE_FIELDS:
+        nodeid, state = instance.sensor_id, instance.state
+        timing = timing_from_columns(instance.switched_to, instance.switched_at, instance.cooldown_until)
+        transaction.on_commit(lambda: decision_snapshot.set_motor_state(nodeid, state, timing))
+    else:
+        transaction.on_commit(decision_snapshot.invalidate)
+
+
+@receiver(post_save, sender=Sensor)
+@receiver(post_save, sender=ThresholdConfig)
+@receiver(post_save, sender=SystemMode)
+@receiver(post_delete, sender=Sensor)
+@receiver(post_delete, sender=Motor)
+@receiver(post_delete, sender=ThresholdConfig)
+def decision_inputs_changed(sender, **kwargs):
+    transaction.on_commit(decision_snapshot.invalidate)
+
+
+@receiver(post_save, sender=Motor)
+@receiver(post_delete, sender=Motor)
+def motor_feed_changed(sender, **kwargs):
+    # After commit, so a woken poll can't cache the old states under the new version
+    transaction.on_commit(motor_feed.bump)
+
+
+@receiver(post_save, sender=Motor)
+@receiver(post_save, sender=Sensor)
+@receiver(post_save, sender=SystemMode)
+@receiver(post_save, sender=ThresholdConfig)
+@receiver(post_delete, sender=Motor)
+@receiver(post_delete, sender=Sensor)
+@receiver(post_delete, sender=ThresholdConfig)
+def payload_inputs_changed(sender, **kwargs):
+    transaction.on_commit(payload_cache.invalidate)
+
+
+@receiver(post_save, sender=Motor)
+def motor_live_event(sender, instance, **kwargs):
+    live.publish_motor(instance)
+
+
+@receiver(post_save, sender=ThresholdConfig)
+def threshold_live_event(sender, instance, **kwargs):
+    live.publish_threshold(instance)
+
+
+@receiver(post_save, sender=SystemMode)
+def mode_live_event(sender, instance, **kwargs):
+    live.publish_mode(instance.mode)
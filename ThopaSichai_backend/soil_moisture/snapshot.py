@@ -0,0 +1,148 @@
+"""
+Process-wide snapshot of what the AUTOMATIC decision path needs per reading:
+whether the sensor exists, its motor (id, name, state, MotorGuard timing), its
+threshold and the global system mode.
+
+Without it every reading costs Sensor.get_or_create, SystemMode.get_or_create,
+sensor.motor and ThresholdConfig.get_or_create before the decision starts.
+With it the steady-state ingest path is one INSERT plus, only when the motor
+flips, one UPDATE.
+
+Coherence:
+- post_save/post_delete signals on Sensor, Motor, ThresholdConfig and
+  SystemMode (see signals.py) invalidate the snapshot in this process and
+  bump a shared VersionStamp.
+- Every lookup compares the stamp (one os.stat) with the version the snapshot
+  was built from, so other worker processes drop their copy on the next read.
+"""
+import threading
+from collections import namedtuple
+
+from .models import Motor, Sensor, SystemMode, ThresholdConfig
+from .motor_logic import DEFAULT_THRESHOLD, timing_from_columns
+from .versioning import VersionStamp
+
+
+# motor_id/motor_name/motor_state/threshold are None for sensors without a motor;
+# motor_timing is the MotorTiming stored on the Motor row, if any
+SensorState = namedtuple(
+    'SensorState', ['nodeid', 'motor_id', 'motor_name', 'motor_state', 'threshold', 'motor_timing'],
+    defaults=(None,)
+)
+
+
+class DecisionSnapshot:
+    """Cache of sensor/motor/threshold state keyed by nodeid, plus the system mode."""
+
+    def __init__(self, stamp_name='decision-snapshot'):
+        self.stamp = VersionStamp(stamp_name)
+        self._lock = threading.RLock()
+        self._sensors = {}
+        self._mode = None
+        self._version = None
+
+    def _check_version(self):
+        version = self.stamp.current()
+        if version != self._version:
+            self._sensors = {}
+            self._mode = None
+            self._version = version
+
+    def clear(self):
+        """Drop everything cached in this process."""
+        with self._lock:
+            self._sensors = {}
+            self._mode = None
+            self._version = None
+
+    def invalidate(self):
+        """Drop the cache here and tell other processes to drop theirs."""
+        with self._lock:
+            self.stamp.bump()
+            self._sensors = {}
+            self._mode = None
+            self._version = None
+
+    def mode(self):
+        """Current system mode (MANUAL/AUTOMATIC)."""
+        with self._lock:
+            self._check_version()
+            if self._mode is None:
+                self._mode = SystemMode.get_current_mode()
+            return self._mode
+
+    def sensor_states(self, nodeids):
+        """
+        Return {nodeid: SensorState} for the nodeids that exist as sensors.
+        Unknown nodeids are loaded with at most three queries; nodeids that
+        aren't in the database are left out of the result.
+        """
+        with self._lock:
+            self._check_version()
+            missing = [nodeid for nodeid in set(nodeids) if nodeid not in self._sensors]
+            if missing:
+                self._load(missing)
+            return {
+                nodeid: self._sensors[nodeid]
+                for nodeid in nodeids if nodeid in self._sensors
+            }
+
+    def _load(self, nodeids):
+        existing = set(Sensor.objects.filter(nodeid__in=nodeids).values_list('nodeid', flat=True))
+        if not existing:
+            return
+
+        motors = {motor.sensor_id: motor for motor in Motor.objects.filter(sensor_id__in=existing)}
+        thresholds = {}
+        if motors:
+            thresholds = dict(
+                ThresholdConfig.objects.filter(sensor_id__in=motors.keys()).values_list('sensor_id', 'threshold')
+            )
+            # Same default-creation ThresholdConfig.get_threshold() does
+            missing = [nodeid for nodeid in motors if nodeid not in thresholds]
+            if missing:
+                ThresholdConfig.objects.bulk_create(
+                    [ThresholdConfig(sensor_id=nodeid, threshold=DEFAULT_THRESHOLD) for nodeid in missing],
+                    ignore_conflicts=True
+                )
+                thresholds.update((nodeid, DEFAULT_THRESHOLD) for nodeid in missing)
+
+        for nodeid in existing:
+            motor = motors.get(nodeid)
+            if motor is None:
+                self._sensors[nodeid] = SensorState(nodeid, None, None, None, None)
+            else:
+                self._sensors[nodeid] = SensorState(
+                    nodeid, motor.id, motor.name, motor.state, thresholds[nodeid],
+                    timing_from_columns(motor.switched_to, motor.switched_at, motor.cooldown_until)
+                )
+
+    def add_sensors(self, nodeids):
+        """Record freshly auto-created sensors (they have no motor yet)."""
+        with self._lock:
+            self._check_version()
+            for nodeid in nodeids:
+                self._sensors[nodeid] = SensorState(nodeid, None, None, None, None)
+
+    def set_motor_state(self, nodeid, state, timing=None):
+        """
+        Patch a motor state and MotorGuard timing change made by the decision
+        path instead of dropping the whole snapshot. Other processes still see
+        the bump and reload; this process keeps its copy when no one else
+        changed anything.
+        """
+        with self._lock:
+            previous, current = self.stamp.bump()
+            if self._version != previous or current[1] != previous[1] + 1:
+                # Someone else changed state concurrently - start over
+                self._sensors = {}
+                self._mode = None
+                self._version = None
+                return
+            self._version = current
+            cached = self._sensors.get(nodeid)
+            if cached is not None and cached.motor_id is not None:
+                self._sensors[nodeid] = cached._replace(motor_state=state, motor_timing=timing)
+
+
+decision_snapshot = DecisionSnapshot()
@@ -0,0 +1,193 @@
+"""
+Server-Sent Events feed behind /api/data/stream/.
+
+Lightweight clients (browser EventSource, curl, the field laptop) get new
+readings and motor changes without a WebSocket:
+
+    id: 1766658600123456
+    event: reading
+    data: {"type": "reading", "nodeid": "001", "value": 45.5, ...}
+
+Each worker process runs one pump task subscribed to the live feed's channel
+layer group (see live.py), which appends reading and motor events to a
+bounded in-memory buffer. Streams are async and only await the buffer, so an
+idle stream costs a coroutine, not a worker thread.
+
+Event ids are the events' cursors (write time in microseconds). A reconnect
+with Last-Event-ID replays the newer events from the buffer when it reaches
+back that far, and otherwise from the database (SoilMoisture.created_at,
+Motor.updated_at - motor history isn't stored, so that replays each changed
+motor's current state). A client that falls more than the buffer behind is
+caught up the same way.
+"""
+import asyncio
+import json
+import time
+from collections import deque
+from datetime import timedelta
+
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.utils import timezone
+
+from .live import ALL_GROUP, EPOCH, cursor_of, motor_event, reading_event
+from .models import Motor, SoilMoisture
+
+STREAM_EVENT_TYPES = frozenset({'reading', 'motor'})
+
+# Channel layer group membership expires (a day for the in-memory layers)
+REJOIN_SECONDS = 3600
+
+
+class StreamBuffer:
+    """The most recent stream events of this process, in arrival order."""
+
+    def __init__(self, size):
+        self.events = deque(maxlen=size)
+        self.appended = 0
+        # Replays after this cursor are complete in the buffer; nothing is
+        # until the pump has joined the group
+        self.complete_after = float('inf')
+        self._wakeup = asyncio.Event()
+
+    def append(self, event):
+        if len(self.events) == self.events.maxlen:
+            self.complete_after = max(self.complete_after, self.events[0]['cursor'])
+        self.events.append(event)
+        self.appended += 1
+        self._wakeup.set()
+        self._wakeup = asyncio.Event()
+
+    def covers(self, cursor):
+        return cursor >= self.complete_after
+
+    def since(self, cursor):
+        """Buffered events with a cursor after `cursor`."""
+        return [event for event in self.events if event['cursor'] > cursor]
+
+    def read(self, position):
+        """
+        Events appended after `position` (a previous `appended` value).
+        Returns (events, new position, lost) - lost is True when some were
+        already evicted.
+        """
+        missed = self.appended - position
+        lost = missed > len(self.events)
+        events = list(self.events)[-missed:] if missed else []
+        return events, self.appended, lost
+
+    async def wait(self, position, timeout):
+        """Wait until something is appended after `position`; False on timeout."""
+        if self.appended > position:
+            return True
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+
+class EventStream:
+    """Per-process pump from the channel layer into a StreamBuffer."""
+
+    def __init__(self):
+        self.buffer = None
+        self._pump = None
+        self._loop = None
+
+    def ensure_started(self):
+        """Start the pump on the running loop; returns the buffer to read."""
+        loop = asyncio.get_running_loop()
+        if self._pump is not None and self._loop is loop and not self._pump.done():
+            return self.buffer
+        self.buffer = StreamBuffer(getattr(settings, 'STREAM_BUFFER_SIZE', 1000))
+        self._loop = loop
+        self._pump = loop.create_task(self._run(self.buffer))
+        return self.buffer
+
+    @staticmethod
+    async def _run(buffer):
+        layer = get_channel_layer()
+        channel = await layer.new_channel()
+        await layer.group_add(ALL_GROUP, channel)
+        # Every event written from now on reaches the buffer
+        buffer.complete_after = cursor_of(timezone.now())
+        rejoin_at = time.monotonic() + REJOIN_SECONDS
+        while True:
+            message = await layer.receive(channel)
+            for event in message.get('events', ()):
+                if event.get('type') in STREAM_EVENT_TYPES:
+                    buffer.append(event)
+            if time.monotonic() >= rejoin_at:
+                await layer.group_add(ALL_GROUP, channel)
+                rejoin_at = time.monotonic() + REJOIN_SECONDS
+
+
+event_stream = EventStream()
+
+
+async def replay_from_db(after, nodeids=None):
+    """
+    Reading and motor events written after cursor `after`, oldest first.
+    At most STREAM_REPLAY_LIMIT readings - the newest ones.
+    """
+    since = EPOCH + timedelta(microseconds=after)
+    readings = SoilMoisture.objects.filter(created_at__gt=since)
+    motors = Motor.objects.filter(updated_at__gt=since)
+    if nodeids:
+        readings = readings.filter(sensor_id__in=nodeids)
+        motors = motors.filter(sensor_id__in=nodeids)
+    limit = getattr(settings, 'STREAM_REPLAY_LIMIT', 1000)
+    events = [reading_event(record) async for record in readings.order_by('-created_at')[:limit]]
+    events += [motor_event(motor) async for motor in motors]
+    events.sort(key=lambda event: event['cursor'])
+    return events
+
+
+def format_event(event):
+    return f"id: {event['cursor']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+async def stream_events(nodeids=None, last_event_id=None):
+    """Async iterator of SSE-formatted text for one client."""
+    buffer = event_stream.ensure_started()
+    position = buffer.appended
+    heartbeat = getattr(settings, 'STREAM_HEARTBEAT_SECONDS', 15)
+
+    def wanted(event):
+        return not nodeids or event.get('nodeid') in nodeids
+
+    def key(event):
+        return (event['type'], event['nodeid'], event['cursor'])
+
+    yield 'retry: 3000\n\n'
+    # Events of the last replay, which may reach the buffer again afterwards
+    replayed = set()
+    last = last_event_id
+    if last_event_id is not None:
+        if buffer.covers(last_event_id):
+            events = buffer.since(last_event_id)
+        else:
+            events = await replay_from_db(last_event_id, nodeids)
+        replayed = {key(event) for event in events}
+        for event in filter(wanted, events):
+            last = max(last, event['cursor'])
+            yield format_event(event)
+
+    while True:
+        events, position, lost = buffer.read(position)
+        if lost and last is not None:
+            # Fell behind the buffer: catch up from the database
+            events = await replay_from_db(last, nodeids)
+            replayed = {key(event) for event in events}
+            for event in filter(wanted, events):
+                last = max(last, event['cursor'])
+                yield format_event(event)
+            events = []
+        for event in filter(wanted, events):
+            if key(event) in replayed:
+                continue
+            last = event['cursor'] if last is None else max(last, event['cursor'])
+            yield format_event(event)
+        if not await buffer.wait(position, heartbeat):
+            yield ': keepalive\n\n'
@@ -1,3 +1,1479 @@
-from django.test import TestCase
+import asyncio
+import fcntl
+import json
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.db import OperationalError
+from django.db.models import Sum
+from django.test import AsyncClient, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import counters, ingest, ingest_queue, live, retention, rollups
+from .channel_layers import BroadcastChannelLayer, NotifyAssembler, split_notify_payload
+from .consumers import LiveFeedConsumer
+from .ingest import delete_readings, ingest_readings
+from .ingest_queue import IngestQueue
+from .models import (
+    SoilMoisture, Motor, SystemMode, ThresholdConfig, Sensor, ReadingRollup, SensorReadingCount, LatestReading
+)
+from .mqtt_bridge import MqttIngestBridge, decode_message
+from .motor_feed import motor_feed
+from .motor_logic import MotorGuard, decide_motor_states, get_motor_state, motor_guard
+from .payload_cache import payload_cache
+from .sampling import recommend_interval_ms
+from .snapshot import decision_snapshot
+from .stream import event_stream
+from .versioning import VersionStamp
+from .wire import MEDIA_TYPE, FrameError, decode_frames, encode_frame
+
+
+def minutes_ago(minutes):
+    return (timezone.now() - timedelta(minutes=minutes)).isoformat()
+
+
+class IngestTestCase(TestCase):
+    """Base class resetting process-wide caches that outlive test transactions."""
+
+    def setUp(self):
+        decision_snapshot.clear()
+        motor_guard.clear()
+        motor_feed.clear()
+        payload_cache.clear()
+
+
+class ReceiveSoilMoistureTests(IngestTestCase):
+    """Single-reading ESP32 endpoint."""
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.url = reverse('soil_moisture:data-receive')
+
+    def test_auto_creates_sensor_and_turns_motor_on(self):
+        sensor = Sensor.objects.create(nodeid='001')
+        Motor.objects.create(sensor=sensor, name='Pump 1')
+
+        response = self.client.post(self.url, {'nodeid': '001', 'value': 72.0}, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['mode'], 'AUTOMATIC')
+        self.assertEqual(response.data['motor_update']['new_state'], 'ON')
+        self.assertEqual(Motor.objects.get(sensor=sensor).state, 'ON')
+        self.assertTrue(ThresholdConfig.objects.filter(sensor=sensor).exists())
+
+    def test_missing_nodeid_rejected(self):
+        response = self.client.post(self.url, {'value': 10.0}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class ReceiveSoilMoistureFastTests(IngestTestCase):
+    """Minimal non-DRF device endpoint."""
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('soil_moisture:data-receive-fast')
+
+    def post(self, payload):
+        return self.client.post(self.url, payload, content_type='application/json')
+
+    def test_matches_receive_endpoint_behaviour(self):
+        sensor = Sensor.objects.create(nodeid='001')
+        Motor.objects.create(sensor=sensor, name='Pump 1')
+
+        response = self.post({'nodeid': '001', 'value': 72.0})
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json(), {
+            'status': 'ok', 'nodeid': '001', 'mode': 'AUTOMATIC', 'motor': 'ON', 'changed': True,
+            'next_interval_ms': 1000,
+        })
+        self.assertEqual(Motor.objects.get(sensor=sensor).state, 'ON')
+
+        response = self.post({'nodeid': 'new', 'value': '10.5', 'timestamp': '2025-01-01T10:00:00'})
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Sensor.objects.filter(nodeid='new').exists())
+        self.assertTrue(SoilMoisture.objects.get(sensor_id='new').device_timestamped)
+
+    def test_validation_errors(self):
+        response = self.post({'value': 120, 'seq': -1, 'timestamp': 'yesterday'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()['errors']), {'nodeid', 'value', 'seq', 'timestamp'})
+        response = self.post({'nodeid': '001', 'value': 40, 'seq': 2 ** 64})
+        self.assertEqual((response.status_code, set(response.json()['errors'])), (400, {'seq'}))
+        self.assertEqual(self.client.get(self.url).status_code, 405)
+
+    def test_duplicate_seq_ignored(self):
+        self.post({'nodeid': '001', 'value': 40.0, 'seq': 3})
+        response = self.post({'nodeid': '001', 'value': 40.0, 'seq': 3})
+        self.assertEqual(response.json()['status'], 'duplicate')
+        self.assertEqual(SoilMoisture.objects.count(), 1)
+
+
+class ReceiveSoilMoistureBatchTests(IngestTestCase):
+    """Batch ingestion endpoint."""
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.url = reverse('soil_moisture:data-receive-batch')
+
+    def test_batch_stores_readings_and_decides_on_newest(self):
+        sensor = Sensor.objects.create(nodeid='001')
+        motor = Motor.objects.create(sensor=sensor, name='Pump 1')
+
+        payload = {'readings': [
+            {'nodeid': '001', 'value': 80.0, 'timestamp': minutes_ago(2)},
+            {'nodeid': '001', 'value': 20.0, 'timestamp': minutes_ago(1)},
+            {'nodeid': '002', 'value': 55.0},
+        ]}
+        response = self.client.post(self.url, payload, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['data']['accepted'], 3)
+        self.assertEqual(response.data['data']['sensors_created'], ['002'])
+        self.assertEqual(SoilMoisture.objects.count(), 3)
+        # Newest reading (20%) wins, so the motor stays OFF
+        motor.refresh_from_db()
+        self.assertEqual(motor.state, 'OFF')
+
+    def test_batch_uses_constant_query_count(self):
+        for nodeid in ('001', '002', '003'):
+            sensor = Sensor.objects.create(nodeid=nodeid)
+            Motor.objects.create(sensor=sensor, name=f'Pump {nodeid}')
+            ThresholdConfig.objects.create(sensor=sensor, threshold=50.0)
+        SystemMode.get_instance()
+
+        readings = [{'nodeid': nodeid, 'value': 30.0} for nodeid in ('001', '002', '003') for _ in range(10)]
+        # sensors, motors, thresholds, savepoint + insert + 3 bookkeeping upserts + release, mode
+        with self.assertNumQueries(10):
+            response = self.client.post(self.url, readings, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(SoilMoisture.objects.count(), 30)
+
+    def test_stale_backlog_stored_without_motor_decision(self):
+        sensor = Sensor.objects.create(nodeid='001')
+        motor = Motor.objects.create(sensor=sensor, name='Pump 1')
+
+        body = encode_frame('001', 1, 90.0, timestamp=timezone.now().timestamp() - 3600)
+        response = self.client.post(self.url, body, content_type=MEDIA_TYPE)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['data']['accepted'], 1)
+        self.assertEqual(response.data['data']['motor_updates'], [])
+        motor.refresh_from_db()
+        self.assertEqual(motor.state, 'OFF')
+
+    def test_invalid_readings_reported_by_index(self):
+        readings = [
+            {'nodeid': '001', 'value': 40.0},
+            {'nodeid': '001', 'value': 140.0},
+            {'value': 10.0},
+        ]
+        response = self.client.post(self.url, readings, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['data']['accepted'], 1)
+        self.assertEqual([item['index'] for item in response.data['data']['rejected']], [1, 2])
+
+    def test_empty_batch_rejected(self):
+        response = self.client.post(self.url, [], format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class ReceiveSoilMoistureStreamTests(IngestTestCase):
+    """Streaming NDJSON ingestion endpoint."""
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.url = reverse('soil_moisture:data-receive-stream')
+
+    def post_lines(self, lines):
+        body = '\n'.join(lines).encode()
+        return self.client.generic('POST', self.url, body, content_type='application/x-ndjson')
+
+    @override_settings(INGEST_STREAM_CHUNK_SIZE=2)
+    def test_stream_inserts_in_chunks_and_reports_rejected_lines(self):
+        lines = [
+            '{"nodeid": "001", "value": 10.0}',
+            '{"nodeid": "001", "value": 11.0}',
+            'not json',
+            '',
+            '{"nodeid": "002", "value": 500}',
+            '{"nodeid": "002", "value": 12.0}',
+        ]
+        response = self.post_lines(lines)
+
+        self.assertEqual(response.status_code, 201)
+        data = response.data['data']
+        self.assertEqual(data['lines'], 6)
+        self.assertEqual(data['accepted'], 3)
+        self.assertEqual(data['rejected_lines'], [3, 5])
+        self.assertEqual([chunk['accepted'] for chunk in data['chunks']], [2, 1])
+        self.assertEqual(SoilMoisture.objects.count(), 3)
+
+    def test_motor_decided_once_from_newest_reading(self):
+        sensor = Sensor.objects.create(nodeid='001')
+        motor = Motor.objects.create(sensor=sensor, name='Pump 1')
+        lines = [
+            f'{{"nodeid": "001", "value": 90.0, "timestamp": "{minutes_ago(1)}"}}',
+            f'{{"nodeid": "001", "value": 70.0, "timestamp": "{minutes_ago(2)}"}}',
+        ]
+        response = self.post_lines(lines)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data['data']['motor_updates']), 1)
+        motor.refresh_from_db()
+        self.assertEqual(motor.state, 'ON')
+
+
+class BinaryFrameTests(IngestTestCase):
+    """Binary frame wire format and batch upload."""
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.url = reverse('soil_moisture:data-receive-batch')
+
+    def test_round_trip(self):
+        frame = encode_frame('us01', 70000, 45.67, timestamp=1735122600, extras=(12.5,))
+        self.assertEqual(len(frame), 18)
+
+        readings, rejected = decode_frames(frame)
+
+        self.assertEqual(rejected, [])
+        self.assertEqual(readings[0]['nodeid'], 'us01')
+        self.assertEqual(readings[0]['seq'], 70000)
+        self.assertAlmostEqual(readings[0]['value'], 45.67)
+        self.assertEqual(readings[0]['extras'], [12.5])
+        self.assertEqual(readings[0]['timestamp'].timestamp(), 1735122600)
+
+    def test_truncated_buffer_raises(self):
+        with self.assertRaises(FrameError):
+            decode_frames(encode_frame('001', 1, 10.0)[:-1])
+
+    def test_batch_endpoint_accepts_concatenated_frames(self):
+        body = b''.join([
+            encode_frame('001', 1, 40.0),
+            encode_frame('002', 1, 150.0),
+            encode_frame('002', 2, 60.0),
+        ])
+        response = self.client.generic('POST', self.url, body, content_type=MEDIA_TYPE)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['data']['accepted'], 2)
+        self.assertEqual([item['index'] for item in response.data['data']['rejected']], [1])
+        self.assertEqual(SoilMoisture.objects.filter(sensor_id='002').get().value, 60.0)
+
+    def test_malformed_frames_rejected(self):
+        response = self.client.generic('POST', self.url, b'\x07' * 16, content_type=MEDIA_TYPE)
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(SAMPLING_MIN_INTERVAL_MS=1000, SAMPLING_MAX_INTERVAL_MS=60000,
+                   SAMPLING_NEAR_BAND=5.0, SAMPLING_FAR_BAND=25.0)
+class SamplingAdviceTests(IngestTestCase):
+    """Recommended next sample interval in ingest responses."""
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        sensor = Sensor.objects.create(nodeid='001')
+        Motor.objects.create(sensor=sensor, name='Pump 1')
+        ThresholdConfig.objects.create(sensor=sensor, threshold=50.0)
+        SystemMode.get_instance()
+
+    def test_interval_scales_with_distance_to_threshold(self):
+        self.assertEqual(recommend_interval_ms(47.0, 50.0, 'OFF'), 1000)
+        self.assertEqual(recommend_interval_ms(65.0, 50.0, 'OFF'), 30500)
+        self.assertEqual(recommend_interval_ms(10.0, 50.0, 'OFF'), 60000)
+        self.assertEqual(recommend_interval_ms(10.0, 50.0, 'ON'), 1000)
+        self.assertEqual(recommend_interval_ms(10.0, None, None), 60000)
+
+    def test_receive_endpoint_uses_decided_motor_state(self):
+        url = reverse('soil_moisture:data-receive')
+
+        response = self.client.post(url, {'nodeid': '001', 'value': 20.0}, format='json')
+        self.assertEqual(response.data['next_interval_ms'], 60000)
+
+        # Far above the threshold, but the motor just turned ON
+        response = self.client.post(url, {'nodeid': '001', 'value': 90.0}, format='json')
+        self.assertEqual(response.data['next_interval_ms'], 1000)
+
+    def test_batch_reports_sampling_per_sensor(self):
+        url = reverse('soil_moisture:data-receive-batch')
+        payload = {'readings': [{'nodeid': '001', 'value': 48.0}, {'nodeid': '002', 'value': 48.0}]}
+
+        response = self.client.post(url, payload, format='json')
+
+        self.assertEqual(response.data['data']['sampling'], {
+            '001': {'next_interval_ms': 1000, 'threshold': 50.0, 'hysteresis': 2.0},
+            '002': {'next_interval_ms': 60000, 'threshold': None, 'hysteresis': None},
+        })
+
+
+@override_settings(MOTOR_HYSTERESIS=2.0, MOTOR_MIN_ON_SECONDS=60, MOTOR_MIN_OFF_SECONDS=60,
+                   MOTOR_MAX_ON_SECONDS=3600, MOTOR_COOLDOWN_SECONDS=300)
+class MotorGuardTests(IngestTestCase):
+    """Hysteresis band, dwell times and cooldown on the AUTOMATIC path."""
+
+    def test_band_keeps_current_state(self):
+        self.assertEqual(get_motor_state(51.0, 'OFF', 50.0, 48.0, 52.0)['desired_state'], 'OFF')
+        self.assertEqual(get_motor_state(51.0, 'ON', 50.0, 48.0, 52.0)['desired_state'], 'ON')
+        self.assertEqual(get_motor_state(53.0, 'OFF', 50.0, 48.0, 52.0)['desired_state'], 'ON')
+        self.assertEqual(get_motor_state(48.0, 'ON', 50.0, 48.0, 52.0)['desired_state'], 'OFF')
+        with self.assertRaises(ValueError):
+            get_motor_state(50.0, 'OFF', 50.0, 60.0, 40.0)
+
+    def test_dwell_times_and_cooldown(self):
+        guard = MotorGuard()
+        self.assertEqual(guard.decide(1, 60.0, 'OFF', 50.0, now=0)['desired_state'], 'ON')
+        decision = guard.decide(1, 10.0, 'ON', 50.0, now=30)
+        self.assertEqual((decision['desired_state'], decision['held']), ('ON', True))
+        self.assertEqual(guard.decide(1, 10.0, 'ON', 50.0, now=61)['desired_state'], 'OFF')
+        self.assertTrue(guard.decide(1, 60.0, 'OFF', 50.0, now=100)['held'])
+        self.assertEqual(guard.decide(1, 60.0, 'OFF', 50.0, now=130)['desired_state'], 'ON')
+        # Still wet after the maximum run time: forced off, then cooldown
+        self.assertEqual(guard.decide(1, 60.0, 'ON', 50.0, now=130 + 3600)['desired_state'], 'OFF')
+        self.assertTrue(guard.decide(1, 60.0, 'OFF', 50.0, now=130 + 3600 + 200)['held'])
+        self.assertEqual(guard.decide(1, 60.0, 'OFF', 50.0, now=130 + 3600 + 301)['desired_state'], 'ON')
+
+    def test_switch_elsewhere_resets_dwell(self):
+        guard = MotorGuard()
+        guard.decide(1, 60.0, 'OFF', 50.0, now=0)
+        # Manually switched OFF right after: the guard doesn't hold it
+        self.assertEqual(guard.decide(1, 60.0, 'OFF', 50.0, now=5)['desired_state'], 'ON')
+
+    def test_noisy_sensor_flips_motor_once(self):
+        sensor = Sensor.objects.create(nodeid='001')
+        motor = Motor.objects.create(sensor=sensor, name='Pump 1')
+        ThresholdConfig.objects.create(sensor=sensor, threshold=50.0)
+        url = reverse('soil_moisture:data-receive-fast')
+
+        for value in (49.0, 53.0, 49.0, 51.0, 47.0, 53.5, 49.5, 46.0):
+            self.client.post(url, {'nodeid': '001', 'value': value}, content_type='application/json')
+
+        motor.refresh_from_db()
+        self.assertEqual(motor.state, 'ON')
+
+    def test_dwell_is_shared_between_workers(self):
+        sensor = Sensor.objects.create(nodeid='001')
+        motor = Motor.objects.create(sensor=sensor, name='Pump 1')
+        ThresholdConfig.objects.create(sensor=sensor, threshold=50.0)
+        url = reverse('soil_moisture:data-receive-fast')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(url, {'nodeid': '001', 'value': 80.0}, content_type='application/json')
+        motor.refresh_from_db()
+        self.assertEqual((motor.state, motor.switched_to), ('ON', 'ON'))
+        self.assertIsNotNone(motor.switched_at)
+
+        # Next reading handled by another worker process: no in-memory timing
+        motor_guard.clear()
+        decision_snapshot.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, {'nodeid': '001', 'value': 10.0}, content_type='application/json')
+        self.assertEqual((response.json()['motor'], response.json()['changed']), ('ON', False))
+        motor.refresh_from_db()
+        self.assertEqual(motor.state, 'ON')
+
+
+class MotorDecisionEngineTests(IngestTestCase):
+    """Vectorized batch motor decisions and the evaluate_motors command."""
+
+    def test_batch_matches_single_decisions(self):
+        moisture = [10.0, 49.0, 51.0, 90.0, 51.0, 48.0]
+        states = ['ON', 'ON', 'OFF', 'OFF', 'ON', 'ON']
+        thresholds = [50.0, 50.0, 50.0, 50.0, 50.0, 50.0]
+
+        decisions = decide_motor_states(list('abcdef'), moisture, states, thresholds, hysteresis=2.0)
+
+        for i, (m, s, t) in enumerate(zip(moisture, states, thresholds)):
+            expected = get_motor_state(m, s, t, low_threshold=t - 2.0, high_threshold=t + 2.0)
+            self.assertEqual(decisions.state(i), expected['desired_state'])
+            self.assertEqual(decisions.reason(i), expected['reason'])
+        self.assertEqual(list(decisions.changed_indices()), [0, 3, 5])
+
+    def test_evaluate_motors_applies_newest_readings(self):
+        for nodeid, value in (('001', 80.0), ('002', 20.0)):
+            sensor = Sensor.objects.create(nodeid=nodeid)
+            Motor.objects.create(sensor=sensor, name=f'Pump {nodeid}')
+            SoilMoisture.objects.create(sensor=sensor, value=value)
+        SystemMode.get_instance()
+
+        out = StringIO()
+        call_command('evaluate_motors', '--dry-run', stdout=out)
+        self.assertIn('2 motor(s) evaluated, 1 would change', out.getvalue())
+        self.assertEqual(Motor.objects.get(sensor_id='001').state, 'OFF')
+
+        call_command('evaluate_motors', stdout=StringIO())
+        self.assertEqual(Motor.objects.get(sensor_id='001').state, 'ON')
+
+    @override_settings(MOTOR_DECISION_MAX_AGE_SECONDS=900)
+    def test_evaluate_motors_stops_motor_of_silent_sensor(self):
+        sensor = Sensor.objects.create(nodeid='001')
+        Motor.objects.create(sensor=sensor, name='Pump 1', state='ON')
+        SoilMoisture.objects.create(sensor=sensor, value=80.0, timestamp=timezone.now() - timedelta(seconds=1000))
+        SystemMode.get_instance()
+
+        out = StringIO()
+        call_command('evaluate_motors', stdout=out)
+        self.assertIn('001: ON -> OFF (No recent moisture reading', out.getvalue())
+        motor = Motor.objects.get(sensor_id='001')
+        self.assertEqual((motor.state, motor.switched_to), ('OFF', 'OFF'))
+        self.assertIsNotNone(motor.cooldown_until)
+
+    def test_replay_counts_flips(self):
+        sensor = Sensor.objects.create(nodeid='001')
+        Motor.objects.create(sensor=sensor, name='Pump 1')
+        now = timezone.now()
+        SoilMoisture.objects.bulk_create([
+            SoilMoisture(sensor=sensor, value=value, timestamp=now - timedelta(seconds=60 - i))
+            for i, value in enumerate([49.0, 51.0, 49.5, 50.5, 49.0, 53.0])
+        ])
+
+        for hysteresis, flips in (('0', '5'), ('2', '1')):
+            out = StringIO()
+            call_command('evaluate_motors', '--replay', '5', '--hysteresis', hysteresis, stdout=out)
+            self.assertEqual(out.getvalue().splitlines()[1].split(), ['001', '6', flips])
+
+
+class MotorsInfoFeedTests(IngestTestCase):
+    """ETag / long-poll motor state feed for actuators."""
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.url = reverse('soil_moisture:motors-info')
+        sensor = Sensor.objects.create(nodeid='001')
+        self.motor = Motor.objects.create(sensor=sensor, name='Pump 1')
+
+    def test_matching_etag_is_304_without_queries(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.json(), {'001': 'OFF'})
+        etag = response['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.motor.turn_on()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'001': 'ON'})
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_long_poll_returns_on_change_or_timeout(self):
+        etag = self.client.get(self.url)['ETag']
+
+        response = self.client.get(self.url, {'wait': '0.1'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        timer = threading.Timer(0.05, motor_feed.bump)
+        timer.start()
+        self.addCleanup(timer.cancel)
+        response = self.client.get(self.url, {'wait': '5'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_change_right_after_etag_check_ends_the_wait(self):
+        etag = self.client.get(self.url)['ETag']
+        read_version = motor_feed.version
+        reads = []
+
+        def version():
+            current = read_version()
+            if not reads:
+                # A motor changes right after the view's first read
+                motor_feed.bump()
+            reads.append(current)
+            return current
+
+        started = time.monotonic()
+        with mock.patch.object(motor_feed, 'version', version):
+            response = self.client.get(self.url, {'wait': '5'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertLess(time.monotonic() - started, 2)
+
+    def test_invalid_wait_rejected(self):
+        self.assertEqual(self.client.get(self.url, {'wait': 'soon'}).status_code, 400)
+
+    async def test_long_poll_does_not_hold_a_worker_thread(self):
+        client = AsyncClient()
+        etag = (await client.get(self.url))['ETag']
+        polls = [asyncio.ensure_future(client.get(self.url, {'wait': '5'}, headers={'If-None-Match': etag}))
+                 for _ in range(3)]
+        await asyncio.sleep(0.1)
+        # Sync views share one thread here; held polls would block this
+        response = await asyncio.wait_for(client.get(reverse('soil_moisture:health-check')), 2)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(any(poll.done() for poll in polls))
+
+        motor_feed.bump()
+        responses = await asyncio.wait_for(asyncio.gather(*polls), 2)
+        self.assertEqual([response.status_code for response in responses], [200] * 3)
+
+
+class ReadingPaginationTests(TestCase):
+    """Keyset pagination of data/ and data/filtered/."""
+
+    def setUp(self):
+        self.client = APIClient()
+        sensor = Sensor.objects.create(nodeid='001')
+        other = Sensor.objects.create(nodeid='002')
+        now = timezone.now()
+        self.readings = [
+            SoilMoisture.objects.create(sensor=sensor, value=i, timestamp=now - timedelta(minutes=i))
+            for i in range(7)
+        ]
+        # Two readings sharing a timestamp, split by id
+        self.readings += [
+            SoilMoisture.objects.create(sensor=other, value=50.0, timestamp=now - timedelta(minutes=3))
+            for _ in range(2)
+        ]
+        self.expected = [
+            str(record.id) for record in sorted(self.readings, key=lambda r: (r.timestamp, r.id), reverse=True)
+        ]
+        call_command('recount', stdout=StringIO())
+
+    def get(self, url='soil_moisture:data-list', **params):
+        response = self.client.get(reverse(url), params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data['data']
+
+    def test_walk_forward_and_back(self):
+        pages, data = [], self.get(page_size=4)
+        self.assertFalse(data['pagination']['has_prev'])
+        while True:
+            pages.append([record['id'] for record in data['records']])
+            if not data['pagination']['has_next']:
+                break
+            data = self.get(page_size=4, cursor=data['pagination']['next_cursor'])
+        self.assertEqual(sum(pages, []), self.expected)
+
+        backwards = []
+        while data['pagination']['has_prev']:
+            data = self.get(page_size=4, cursor=data['pagination']['prev_cursor'])
+            backwards.insert(0, [record['id'] for record in data['records']])
+        self.assertEqual(backwards, pages[:-1])
+
+    def test_cursor_page_runs_one_query(self):
+        cursor = self.get(page_size=2)['pagination']['next_cursor']
+        # The page plus the reading counter lookup
+        with self.assertNumQueries(2):
+            data = self.get(page_size=2, cursor=cursor)
+        self.assertEqual(data['pagination']['total_pages'], 5)
+        self.assertEqual([record['id'] for record in data['records']], self.expected[2:4])
+
+    def test_counts_come_from_counters_or_are_optional(self):
+        pagination = self.get()['pagination']
+        self.assertEqual((pagination['total_count'], pagination['count_is_estimate']), (9, False))
+        self.assertIsNone(self.get(count='none')['pagination']['total_count'])
+
+        # A date filter has no counter: estimates don't exist and exact runs COUNT(*)
+        since = timezone.localtime(timezone.now() - timedelta(minutes=4, seconds=30)).replace(tzinfo=None).isoformat()
+        url = 'soil_moisture:data-filtered'
+        self.assertIsNone(self.get(url, start_date=since)['pagination']['total_count'])
+        estimate = self.get(url, start_date=since, count='estimate')['pagination']
+        self.assertEqual((estimate['total_count'], estimate['count_is_estimate']), (None, True))
+        self.assertEqual(self.get(url, start_date=since, count='exact')['pagination']['total_count'], 7)
+
+    def test_filtered_by_nodeid(self):
+        data = self.get('soil_moisture:data-filtered', nodeid='002')
+        self.assertEqual(data['pagination']['total_count'], 2)
+        self.assertEqual({record['nodeid'] for record in data['records']}, {'002'})
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('soil_moisture:data-list'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('cursor', response.data['errors'])
+
+
+class ReadingRollupTests(IngestTestCase):
+    """Minute/hour/day rollups maintained at ingest and the summaries built on them."""
+
+    def setUp(self):
+        super().setUp()
+        # 23:58:30 UTC two days ago, so readings cross minute, hour and day boundaries
+        now = timezone.now().astimezone(rollups.UTC)
+        self.origin = (now - timedelta(days=2)).replace(hour=23, minute=58, second=30, microsecond=0)
+        readings = [
+            {'nodeid': '001' if i % 3 else '002', 'value': float(i * 7 % 100),
+             'timestamp': self.origin + timedelta(seconds=17 * i)}
+            for i in range(600)
+        ]
+        ingest_readings(readings, control_motors=False)
+
+    def raw(self, start, end, **filters):
+        rows = SoilMoisture.objects.filter(timestamp__gte=start, timestamp__lt=end, **filters)
+        values = list(rows.values_list('value', flat=True))
+        return len(values), sum(values) / len(values), min(values), max(values)
+
+    def assertMatchesRaw(self, summary, start, end, **filters):
+        count, mean, minimum, maximum = self.raw(start, end, **filters)
+        self.assertEqual(summary.count, count)
+        self.assertAlmostEqual(summary.mean, mean)
+        self.assertEqual((summary.minimum, summary.maximum), (minimum, maximum))
+
+    def test_ingest_fills_every_resolution(self):
+        for resolution in ReadingRollup.Resolution.values:
+            totals = ReadingRollup.objects.filter(resolution=resolution)
+            self.assertEqual(sum(totals.values_list('count', flat=True)), 600)
+        day = rollups.bucket_start(self.origin, 86400)
+        rollup = ReadingRollup.objects.get(sensor_id='002', resolution='day', bucket=day)
+        self.assertMatchesRaw(rollup_summary(rollup), day, day + timedelta(days=1), sensor_id='002')
+
+    def test_single_reading_endpoints_update_rollups(self):
+        client = APIClient()
+        client.post(reverse('soil_moisture:data-receive'), {'nodeid': '003', 'value': 40.0}, format='json')
+        client.post(reverse('soil_moisture:data-receive-fast'), {'nodeid': '003', 'value': 60.0}, format='json')
+        rollup = ReadingRollup.objects.get(sensor_id='003', resolution='day')
+        self.assertEqual((rollup.count, rollup.mean, rollup.value_min, rollup.value_max), (2, 50.0, 40.0, 60.0))
+
+    def test_unaligned_window_matches_raw_readings(self):
+        start = self.origin + timedelta(seconds=95, microseconds=250)
+        end = self.origin + timedelta(hours=2, minutes=11, seconds=13)
+        bucket_ranges, raw_ranges = rollups.split_window(start, end)
+        self.assertEqual(len(raw_ranges), 2)
+        self.assertIn('hour', [resolution for resolution, _, _ in bucket_ranges])
+
+        with self.assertNumQueries(2):
+            summary = rollups.summarize(start, end)
+        self.assertMatchesRaw(summary, start, end)
+
+        per_sensor = rollups.summarize(start, end, by_sensor=True)
+        self.assertEqual(sorted(per_sensor), ['001', '002'])
+        self.assertMatchesRaw(per_sensor['001'], start, end, sensor_id='001')
+        self.assertMatchesRaw(rollups.summarize(start, end, ['002']), start, end, sensor_id='002')
+
+    def test_rebuild_command_restores_rollups(self):
+        expected = sorted(ReadingRollup.objects.values_list(
+            'sensor_id', 'resolution', 'bucket', 'count', 'value_min', 'value_max'
+        ))
+        ReadingRollup.objects.all().delete()
+        ReadingRollup.objects.create(sensor_id='001', resolution='minute', bucket=self.origin, count=99,
+                                     value_min=0, value_max=0)
+        out = StringIO()
+        call_command('rollup_readings', '--all', stdout=out)
+        self.assertIn('600 reading(s)', out.getvalue())
+        rebuilt = sorted(ReadingRollup.objects.values_list(
+            'sensor_id', 'resolution', 'bucket', 'count', 'value_min', 'value_max'
+        ))
+        self.assertEqual(rebuilt, expected)
+
+    def test_summary_endpoint(self):
+        start = self.origin + timedelta(minutes=3, seconds=20)
+        end = self.origin + timedelta(hours=1)
+        response = APIClient().get(reverse('soil_moisture:data-summary'), {
+            'start_date': start.isoformat(), 'end_date': end.isoformat(), 'by_sensor': 'true',
+        })
+        self.assertEqual(response.status_code, 200)
+        data = response.data['data']
+        count, mean, _, _ = self.raw(start, end)
+        self.assertEqual(data['count'], count)
+        self.assertAlmostEqual(data['mean'], mean)
+        self.assertEqual(sorted(data['sensors']), ['001', '002'])
+
+        response = APIClient().get(reverse('soil_moisture:data-summary'), {
+            'start_date': end.isoformat(), 'end_date': start.isoformat(),
+        })
+        self.assertEqual(response.status_code, 400)
+
+
+def rollup_summary(rollup):
+    return rollups.Summary(rollup.count, rollup.value_sum, rollup.value_sum_squares, rollup.value_min, rollup.value_max)
+
+
+class ReadingCounterTests(IngestTestCase):
+    """Reading counters kept by ingestion and deletions, and manage.py recount."""
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        readings = [{'nodeid': nodeid, 'value': 40.0} for nodeid in ('001', '002') for _ in range(3)]
+        ingest_readings(readings, control_motors=False)
+        self.client.post(reverse('soil_moisture:data-receive-fast'), {'nodeid': '003', 'value': 50.0}, format='json')
+
+    def test_ingest_counts_per_sensor(self):
+        self.assertEqual(counters.totals(), (7, 3))
+        self.assertEqual(counters.total(['001']), 3)
+        self.assertEqual(SensorReadingCount.objects.get(sensor_id='003').count, 1)
+
+    def test_dashboard_reads_counters(self):
+        response = self.client.get(reverse('soil_moisture:dashboard-stats'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['data']['total_readings'], 7)
+        self.assertEqual(response.data['data']['unique_nodes'], 3)
+
+    def test_delete_readings_subtracts(self):
+        deleted = delete_readings(SoilMoisture.objects.filter(sensor_id__in=['001', '003']))
+        self.assertEqual(deleted, 4)
+        self.assertEqual(counters.totals(), (3, 1))
+
+    def test_recount_repairs_drift(self):
+        SoilMoisture.objects.filter(sensor_id='002').delete()  # bypasses the counters
+        out = StringIO()
+        call_command('recount', '--dry-run', stdout=out)
+        self.assertIn('002: counter 3, actual 0 (-3)', out.getvalue())
+        self.assertEqual(counters.total(), 7)
+
+        call_command('recount', stdout=StringIO())
+        self.assertEqual(counters.totals(), (4, 2))
+
+
+class LatestReadingTests(IngestTestCase):
+    """Per-sensor latest readings kept at ingest and the endpoints reading them."""
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.now = timezone.now()
+        ingest_readings([
+            {'nodeid': '001', 'value': 10.0, 'timestamp': self.now - timedelta(minutes=2)},
+            {'nodeid': '001', 'value': 11.0, 'timestamp': self.now - timedelta(minutes=1)},
+            {'nodeid': '002', 'value': 20.0, 'timestamp': self.now - timedelta(minutes=1)},
+        ], control_motors=False)
+
+    def test_backfill_does_not_replace_newer_reading(self):
+        before = LatestReading.objects.get(sensor_id='001')
+        ingest_readings([{'nodeid': '001', 'value': 5.0, 'timestamp': self.now - timedelta(hours=1)}],
+                        control_motors=False)
+        latest = LatestReading.objects.get(sensor_id='001')
+        self.assertEqual((latest.value, latest.reading_id), (11.0, before.reading_id))
+        self.assertGreater(latest.last_received_at, before.last_received_at)
+
+        ingest_readings([{'nodeid': '001', 'value': 12.0, 'timestamp': self.now}], control_motors=False)
+        self.assertEqual(LatestReading.objects.get(sensor_id='001').value, 12.0)
+
+    def test_bulk_endpoint_is_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('soil_moisture:data-latest-all'))
+        readings = response.data['data']['readings']
+        self.assertEqual([(r['nodeid'], r['value']) for r in readings], [('001', 11.0), ('002', 20.0)])
+        stored = SoilMoisture.objects.get(sensor_id='002')
+        self.assertEqual(readings[1]['id'], str(stored.id))
+
+        response = self.client.get(reverse('soil_moisture:data-latest-all'), {'nodeid': '002'})
+        self.assertEqual(response.data['data']['count'], 1)
+
+    def test_single_latest_endpoint(self):
+        response = self.client.get(reverse('soil_moisture:data-latest'), {'nodeid': '001', 'check_motor': 'false'})
+        self.assertEqual(response.data['data']['sensor_data']['value'], 11.0)
+        response = self.client.get(reverse('soil_moisture:data-latest'), {'nodeid': '999'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_deletes_refresh_latest(self):
+        delete_readings(SoilMoisture.objects.filter(sensor_id='001', value=11.0))
+        self.assertEqual(LatestReading.objects.get(sensor_id='001').value, 10.0)
+        delete_readings(SoilMoisture.objects.filter(sensor_id='001'))
+        self.assertFalse(LatestReading.objects.filter(sensor_id='001').exists())
+
+
+@override_settings(READING_RETENTION_DAYS={'raw': 30, 'minute': 30, 'hour': 35, 'day': None})
+class ReadingRetentionTests(IngestTestCase):
+    """Retention policy: roll up, purge in chunks, summarise across the horizons."""
+
+    def setUp(self):
+        super().setUp()
+        # 23:50 UTC 40 days ago: old readings cross a UTC midnight
+        today = rollups.bucket_start(timezone.now(), 86400)
+        self.origin = today - timedelta(days=40, minutes=10)
+        ingest_readings([
+            {'nodeid': '001' if i % 2 else '002', 'value': float(i), 'timestamp': self.origin + timedelta(seconds=45 * i)}
+            for i in range(30)
+        ], control_motors=False)
+        ingest_readings([{'nodeid': '001', 'value': 50.0, 'timestamp': timezone.now() - timedelta(hours=1)}],
+                        control_motors=False)
+        # Stored before rollups existed: only the raw reading
+        SoilMoisture.objects.create(sensor_id='002', value=99.0, timestamp=today - timedelta(days=33))
+        call_command('recount', stdout=StringIO())
+
+    def test_prune_rolls_up_then_deletes_in_chunks(self):
+        limits = retention.horizons()
+        old = SoilMoisture.objects.filter(timestamp__lt=limits['raw'])
+        day = rollups.bucket_start(self.origin, 86400)
+        expected = old.filter(timestamp__gte=day, timestamp__lt=day + timedelta(days=1)).count()
+
+        with mock.patch.object(retention, 'delete_readings', wraps=delete_readings) as deleting:
+            result = retention.prune(chunk_size=7)
+        self.assertEqual((result['raw'], result['days']), (31, 3))
+        self.assertEqual(deleting.call_count, 6)  # 14 + 16 + 1 readings in chunks of 7
+        self.assertFalse(old.exists())
+        self.assertEqual(counters.totals(), (1, 1))
+        self.assertEqual(LatestReading.objects.get(sensor_id='001').value, 50.0)
+
+        # The late reading was rolled up before it went; the day buckets hold the rest
+        late = ReadingRollup.objects.get(sensor_id='002', resolution='day', bucket=limits['raw'] - timedelta(days=3))
+        self.assertEqual((late.count, late.value_max), (1, 99.0))
+        self.assertEqual(ReadingRollup.objects.filter(resolution='day', bucket=day).aggregate(n=Sum('count'))['n'],
+                         expected)
+
+    def test_expired_rollups_are_deleted(self):
+        result = retention.prune()
+        limits = retention.horizons()
+        self.assertGreater(result['minute'], 0)
+        self.assertGreater(result['hour'], 0)
+        self.assertFalse(ReadingRollup.objects.filter(resolution='minute', bucket__lt=limits['minute']).exists())
+        self.assertFalse(ReadingRollup.objects.filter(resolution='hour', bucket__lt=limits['hour']).exists())
+        self.assertEqual(ReadingRollup.objects.filter(resolution='day').aggregate(n=Sum('count'))['n'], 32)
+        self.assertEqual(result['day'], 0)
+
+        # Days whose raw readings are gone keep their rollups through a rebuild
+        call_command('rollup_readings', '--days', '60', stdout=StringIO())
+        self.assertEqual(ReadingRollup.objects.filter(resolution='day').aggregate(n=Sum('count'))['n'], 32)
+
+    def test_summary_spans_the_boundary(self):
+        retention.prune()
+        # Past the hour horizon only days are left: the window's edges round to whole days there
+        start = self.origin - timedelta(hours=6)
+        summary = rollups.summarize(start, timezone.now())
+        self.assertEqual((summary.count, summary.maximum), (18, 99.0))
+        summary = rollups.summarize(self.origin - timedelta(days=1), timezone.now())
+        self.assertEqual(summary.count, 32)
+
+        limits = retention.horizons()
+        bucket_ranges, raw_ranges = rollups.split_window(start, timezone.now(), limits)
+        self.assertTrue(all(lo >= limits['raw'] for lo, _ in raw_ranges))
+        self.assertEqual([r for r, first, _ in bucket_ranges if first < limits['hour']], ['day'])
+
+    def test_dry_run_and_command(self):
+        out = StringIO()
+        call_command('prune_readings', '--dry-run', stdout=out)
+        self.assertIn('raw: 31 row(s) expired', out.getvalue())
+        self.assertIn('day: kept forever', out.getvalue())
+        self.assertEqual(SoilMoisture.objects.count(), 32)
+
+        out = StringIO()
+        call_command('prune_readings', stdout=out)
+        self.assertIn('Purged 31 reading(s) from 3 day(s)', out.getvalue())
+        self.assertEqual(SoilMoisture.objects.count(), 1)
+
+    def test_policy_is_validated(self):
+        for policy in ({'raw': None, 'hour': 730}, {'raw': 60, 'minute': 30}, {'raw': 0}, {'weekly': 10}):
+            with self.subTest(policy=policy), override_settings(READING_RETENTION_DAYS=policy):
+                with self.assertRaises(ImproperlyConfigured):
+                    retention.policy()
+        with override_settings(READING_RETENTION_DAYS=None):
+            self.assertEqual(set(retention.horizons().values()), {None})
+
+
+class PayloadCacheTests(IngestTestCase):
+    """Cached composite payloads: invalidated by config writes, patched by new readings."""
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.url = reverse('soil_moisture:system-status')
+        self.sensor = Sensor.objects.create(nodeid='001')
+        Motor.objects.create(sensor=self.sensor, name='Pump 1')
+        ThresholdConfig.objects.create(sensor=self.sensor, threshold=50.0)
+        SystemMode.get_instance()
+        ingest_readings([{'nodeid': '001', 'value': 30.0}], control_motors=False)
+
+    def status(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return response.data['data']
+
+    def test_second_request_is_served_from_cache(self):
+        first = self.status()
+        with self.assertNumQueries(0):
+            second = self.status()
+        self.assertEqual(second, first)
+
+    def test_threshold_change_invalidates(self):
+        self.status()
+        with self.captureOnCommitCallbacks(execute=True):
+            ThresholdConfig.set_threshold(self.sensor, 70.0)
+        self.assertEqual(self.status()['thresholds'][0]['threshold'], 70.0)
+
+    def test_new_readings_patch_the_cached_payload(self):
+        self.status()
+        with self.captureOnCommitCallbacks(execute=True):
+            ingest_readings([{'nodeid': '001', 'value': 61.5}], control_motors=False)
+        with self.assertNumQueries(0):
+            data = self.status()
+        self.assertEqual(data['latest_moisture']['value'], 61.5)
+
+    def test_readings_from_another_process_force_a_rebuild(self):
+        self.status()
+        # Stored by another worker: its commit hook ran there, not here
+        ingest_readings([{'nodeid': '001', 'value': 44.0}], control_motors=False)
+        payload_cache.readings.bump()
+        self.assertEqual(self.status()['latest_moisture']['value'], 44.0)
+
+    @override_settings(PAYLOAD_CACHE_TTL_SECONDS=0)
+    def test_ttl_zero_disables_cache(self):
+        self.status()
+        with self.assertNumQueries(4):
+            self.status()
+
+
+@override_settings(LIVE_FEED_FLUSH_MS=50)
+class LiveFeedTests(IngestTestCase):
+    """WebSocket live feed: subscriptions, coalescing, publishing paths."""
+
+    async def connect(self, query=''):
+        communicator = WebsocketCommunicator(LiveFeedConsumer.as_asgi(), '/ws/live/' + query)
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    async def send_events(self, group, events):
+        await get_channel_layer().group_send(group, {'type': 'live.events', 'events': events})
+
+    def reading(self, nodeid, value):
+        return {'type': 'reading', 'nodeid': nodeid, 'value': value, 'timestamp': 'x'}
+
+    async def test_filtered_subscription_only_gets_its_sensors(self):
+        communicator = await self.connect('?nodeid=001')
+        self.assertEqual(await communicator.receive_json_from(), {'type': 'subscribed', 'nodeids': ['001']})
+        await self.send_events(live.ALL_GROUP, [self.reading('002', 1.0)])
+        await self.send_events(live.sensor_group('001'), [self.reading('001', 2.0)])
+        frame = await communicator.receive_json_from()
+        self.assertEqual(frame['events'], [self.reading('001', 2.0)])
+        await communicator.disconnect()
+
+    async def test_resubscribe_and_mode_reaches_everyone(self):
+        communicator = await self.connect('?nodeid=001')
+        await communicator.receive_json_from()
+        await communicator.send_json_to({'action': 'subscribe', 'nodeids': None})
+        self.assertEqual(await communicator.receive_json_from(), {'type': 'subscribed', 'nodeids': None})
+        await self.send_events(live.SYSTEM_GROUP, [{'type': 'mode', 'mode': 'MANUAL'}])
+        frame = await communicator.receive_json_from()
+        self.assertEqual(frame['events'], [{'type': 'mode', 'mode': 'MANUAL'}])
+        await communicator.send_json_to({'action': 'subscribe', 'nodeids': 'x'})
+        self.assertEqual((await communicator.receive_json_from())['type'], 'error')
+        await communicator.disconnect()
+
+    @override_settings(LIVE_FEED_FLUSH_MS=500)
+    async def test_events_are_coalesced_per_sensor(self):
+        communicator = await self.connect()
+        await communicator.receive_json_from()
+        await self.send_events(live.ALL_GROUP, [self.reading('001', 1.0)])
+        await communicator.receive_json_from()
+        # Sent while the client is between frames: only the newest per sensor survives
+        await self.send_events(live.ALL_GROUP, [self.reading('001', 2.0), self.reading('002', 5.0)])
+        await self.send_events(live.ALL_GROUP, [self.reading('001', 3.0)])
+        frame = await communicator.receive_json_from()
+        self.assertEqual(
+            sorted((event['nodeid'], event['value']) for event in frame['events']),
+            [('001', 3.0), ('002', 5.0)],
+        )
+        await communicator.disconnect()
+
+    def test_ingest_and_motor_change_publish_after_commit(self):
+        sensor = Sensor.objects.create(nodeid='001')
+        Motor.objects.create(sensor=sensor, name='Pump 1')
+        ThresholdConfig.objects.create(sensor=sensor, threshold=50.0)
+        SystemMode.get_instance()
+        with mock.patch.object(live, '_send') as send:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = APIClient().post(
+                    reverse('soil_moisture:data-receive'), {'nodeid': '001', 'value': 80.0}, format='json'
+                )
+        self.assertEqual(response.status_code, 201)
+        messages = [message for call in send.call_args_list for message in call.args[0]]
+        events = {(group, event['type']) for group, group_events in messages for event in group_events}
+        self.assertIn((live.ALL_GROUP, 'reading'), events)
+        self.assertIn((live.sensor_group('001'), 'reading'), events)
+        self.assertIn((live.sensor_group('001'), 'motor'), events)
+
+
+class ReadingStreamTests(IngestTestCase):
+    """SSE stream: live tail, nodeid filter, Last-Event-ID resume."""
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('soil_moisture:data-stream')
+        sensor = Sensor.objects.create(nodeid='001')
+        Sensor.objects.create(nodeid='002')
+        self.readings = [SoilMoisture.objects.create(sensor=sensor, value=value) for value in (40.0, 41.0)]
+
+    async def open(self, query='', **headers):
+        response = await AsyncClient().get(self.url + query, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = (chunk.decode() async for chunk in response.streaming_content)
+        self.assertEqual(await anext(stream), 'retry: 3000\n\n')
+        return stream
+
+    async def pump_joined(self):
+        for _ in range(100):
+            if event_stream.buffer.complete_after != float('inf'):
+                return
+            await asyncio.sleep(0.01)
+        self.fail('stream pump never joined the live group')
+
+    async def publish(self, *events):
+        await get_channel_layer().group_send(live.ALL_GROUP, {'type': 'live.events', 'events': list(events)})
+
+    def reading(self, nodeid, value, cursor):
+        return {'type': 'reading', 'nodeid': nodeid, 'value': value, 'timestamp': 'x', 'cursor': cursor}
+
+    async def test_live_events_are_filtered_by_nodeid(self):
+        stream = await self.open('?nodeid=001')
+        await self.pump_joined()
+        await self.publish(self.reading('002', 1.0, 10), {'type': 'mode', 'mode': 'MANUAL'}, self.reading('001', 2.0, 11))
+        chunk = await asyncio.wait_for(anext(stream), 2)
+        self.assertTrue(chunk.startswith('id: 11\nevent: reading\ndata: '))
+        self.assertEqual(json.loads(chunk.split('data: ', 1)[1])['value'], 2.0)
+
+    async def test_resume_from_database(self):
+        first = live.cursor_of(self.readings[0].created_at)
+        stream = await self.open(**{'Last-Event-ID': str(first - 1)})
+        ids = [int((await anext(stream)).split('\n')[0][4:]) for _ in self.readings]
+        self.assertEqual(ids, [live.cursor_of(record.created_at) for record in self.readings])
+
+    async def test_resume_from_buffer(self):
+        stream = await self.open()
+        await self.pump_joined()
+        start = event_stream.buffer.complete_after
+        await self.publish(self.reading('001', 1.0, start + 1), self.reading('002', 2.0, start + 2))
+        await asyncio.wait_for(anext(stream), 2)
+        # Resuming after the first event gets only the second, and not from the DB
+        resumed = await self.open(**{'Last-Event-ID': str(start + 1)})
+        chunk = await asyncio.wait_for(anext(resumed), 2)
+        self.assertTrue(chunk.startswith(f'id: {start + 2}\n'))
+
+    async def test_bad_last_event_id(self):
+        for value in ('abc', '-1', '10000000000000000000', str(live.cursor_of(timezone.now() + timedelta(days=1)))):
+            with self.subTest(value=value):
+                response = await AsyncClient().get(self.url, headers={'Last-Event-ID': value})
+                self.assertEqual(response.status_code, 400)
+
+
+class BroadcastChannelLayerTests(TestCase):
+    """Cross-process channel layer; two instances stand in for two workers."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='channels_')
+        self.workers = [BroadcastChannelLayer(transport='unix', path=self.directory) for _ in range(2)]
+
+    def tearDown(self):
+        for worker in self.workers:
+            worker.transport.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    async def receive(self, layer, channel):
+        return await asyncio.wait_for(layer.receive(channel), timeout=2)
+
+    async def test_group_send_reaches_members_in_other_process(self):
+        a, b = self.workers
+        local, remote = await a.new_channel(), await b.new_channel()
+        await a.group_add('live.all', local)
+        await b.group_add('live.all', remote)
+        await a.group_send('live.all', {'type': 'live.events', 'events': [{'type': 'mode', 'mode': 'MANUAL'}]})
+        self.assertEqual((await self.receive(a, local))['events'][0]['mode'], 'MANUAL')
+        self.assertEqual((await self.receive(b, remote))['events'][0]['mode'], 'MANUAL')
+
+    async def test_send_is_routed_to_owning_process(self):
+        a, b = self.workers
+        channel = await b.new_channel()
+        await b.group_add('live.system', channel)
+        await a.send(channel, {'type': 'hello'})
+        self.assertEqual(await self.receive(b, channel), {'type': 'hello'})
+        self.assertNotIn(channel, a.channels)
+
+    def test_send_from_another_thread_wakes_consumer(self):
+        layer = self.workers[0]
+        # The consumers' loop, as daphne's would be
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_forever, daemon=True)
+        thread.start()
+        self.addCleanup(loop.close)
+        self.addCleanup(thread.join, 2)
+        self.addCleanup(loop.call_soon_threadsafe, loop.stop)
+        self.addCleanup(lambda: asyncio.run_coroutine_threadsafe(layer.close(), loop).result(2))
+
+        async def subscribe():
+            channel = await layer.new_channel()
+            await layer.group_add('live.all', channel)
+            return channel
+
+        channel = asyncio.run_coroutine_threadsafe(subscribe(), loop).result(2)
+        received = asyncio.run_coroutine_threadsafe(layer.receive(channel), loop)
+        with self.assertRaises(TimeoutError):
+            received.result(0.1)
+
+        # What live._send() does from the ingest queue or MQTT writer thread
+        async_to_sync(layer.group_send)('live.all', {'type': 'live.events', 'events': []})
+        self.assertEqual(received.result(2)['type'], 'live.events')
+
+    def test_dead_peer_socket_is_removed(self):
+        stale = os.path.join(self.directory, '999999-dead.sock')
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.bind(stale)
+        sock.close()
+        self.workers[0].transport.publish(b'{}')
+        self.assertFalse(os.path.exists(stale))
+
+    def test_long_notify_payload_is_chunked_and_reassembled(self):
+        text = '{"events": "%s"}' % ('x' * 20000)
+        notes = split_notify_payload(text)
+        self.assertGreater(len(notes), 1)
+        self.assertTrue(all(len(note) < 8000 for note in notes))
+        assembler = NotifyAssembler()
+        results = [assembler.feed(note) for note in reversed(notes)]
+        self.assertEqual(results[:-1], [None] * (len(notes) - 1))
+        self.assertEqual(results[-1], text)
+        self.assertEqual(assembler.feed('{"short": 1}'), '{"short": 1}')
+
+
+class IngestQueueTests(IngestTestCase):
+    """Write-behind ingestion queue."""
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.url = reverse('soil_moisture:data-receive')
+        # An unstarted queue so the test flushes synchronously
+        self.queue = IngestQueue(maxsize=2, flush_batch_size=10)
+        patcher = mock.patch.object(ingest_queue, '_default_queue', self.queue)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @override_settings(INGEST_QUEUE_ENABLED=True)
+    def test_reading_queued_then_flushed_with_motor_update(self):
+        sensor = Sensor.objects.create(nodeid='001')
+        Motor.objects.create(sensor=sensor, name='Pump 1')
+
+        response = self.client.post(self.url, {'nodeid': '001', 'value': 80.0}, format='json')
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(SoilMoisture.objects.count(), 0)
+        self.assertEqual(self.queue.flush(), 1)
+        self.assertEqual(SoilMoisture.objects.count(), 1)
+        self.assertEqual(Motor.objects.get(sensor=sensor).state, 'ON')
+        self.assertEqual(self.queue.stats()['flushed'], 1)
+
+    @override_settings(INGEST_QUEUE_ENABLED=True)
+    def test_full_queue_rejects_and_counts_drop(self):
+        for value in (1.0, 2.0):
+            self.client.post(self.url, {'nodeid': '001', 'value': value}, format='json')
+        response = self.client.post(self.url, {'nodeid': '001', 'value': 3.0}, format='json')
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(self.queue.stats()['dropped'], 1)
+        self.assertEqual(self.queue.depth, 2)
+
+    def test_locked_database_keeps_batch_queued(self):
+        self.queue.put({'nodeid': '001', 'value': 40.0})
+        self.queue.put({'nodeid': '001', 'value': 41.0})
+        with mock.patch.object(ingest_queue, 'ingest_readings', side_effect=OperationalError('database is locked')):
+            self.assertEqual(self.queue.flush(), 0)
+
+        stats = self.queue.stats()
+        self.assertEqual((self.queue.depth, stats['dropped'], stats['retry_delay_ms']), (2, 0, 200))
+        self.assertEqual(self.queue.flush(), 2)
+        self.assertEqual(list(SoilMoisture.objects.order_by('value').values_list('value', flat=True)), [40.0, 41.0])
+        self.assertIsNone(self.queue.stats()['retry_delay_ms'])
+
+    def test_only_failing_reading_is_dropped(self):
+        real_ingest = ingest_queue.ingest_readings
+
+        def ingest_readings(readings, **kwargs):
+            if any(reading['value'] == 13.0 for reading in readings):
+                raise ValueError('bad reading')
+            return real_ingest(readings, **kwargs)
+
+        queue = IngestQueue(flush_batch_size=10)
+        for value in (12.0, 13.0, 14.0):
+            queue.put({'nodeid': '001', 'value': value})
+        with mock.patch.object(ingest_queue, 'ingest_readings', ingest_readings):
+            self.assertEqual(queue.flush(), 2)
+        self.assertEqual((queue.depth, queue.stats()['dropped']), (0, 1))
+        self.assertEqual(SoilMoisture.objects.count(), 2)
+
+
+class IdempotentIngestTests(IngestTestCase):
+    """Retried readings are skipped by (sensor, seq) or (sensor, device timestamp)."""
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        sensor = Sensor.objects.create(nodeid='001')
+        self.motor = Motor.objects.create(sensor=sensor, name='Pump 1')
+
+    def test_single_reading_retry_is_ignored(self):
+        url = reverse('soil_moisture:data-receive')
+        first = self.client.post(url, {'nodeid': '001', 'value': 80.0, 'seq': 7}, format='json')
+        self.assertEqual(first.status_code, 201)
+
+        # Motor is switched off by hand; a replay must not switch it back on
+        Motor.objects.filter(pk=self.motor.pk).update(state='OFF')
+        decision_snapshot.clear()
+        retry = self.client.post(url, {'nodeid': '001', 'value': 80.0, 'seq': 7}, format='json')
+
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(retry.data['status'], 'duplicate')
+        self.assertEqual(SoilMoisture.objects.count(), 1)
+        self.assertEqual(Motor.objects.get(pk=self.motor.pk).state, 'OFF')
+
+    def test_batch_skips_stored_and_repeated_readings(self):
+        url = reverse('soil_moisture:data-receive-batch')
+        readings = [
+            {'nodeid': '001', 'value': 40.0, 'seq': 1},
+            {'nodeid': '001', 'value': 41.0, 'seq': 2},
+            {'nodeid': '001', 'value': 42.0, 'timestamp': '2025-01-01T10:00:00Z'},
+        ]
+        self.client.post(url, readings, format='json')
+
+        replay = readings + [readings[0], {'nodeid': '001', 'value': 43.0, 'seq': 3}, {'nodeid': '001', 'value': 44.0}]
+        response = self.client.post(url, replay, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['data']['accepted'], 2)
+        self.assertEqual(response.data['data']['duplicates_skipped'], 4)
+        self.assertEqual(SoilMoisture.objects.count(), 5)
+
+    def test_same_seq_on_other_sensor_is_not_a_duplicate(self):
+        url = reverse('soil_moisture:data-receive-batch')
+        response = self.client.post(url, [
+            {'nodeid': '001', 'value': 40.0, 'seq': 1},
+            {'nodeid': '002', 'value': 40.0, 'seq': 1},
+        ], format='json')
+        self.assertEqual(response.data['data']['accepted'], 2)
+        self.assertEqual(response.data['data']['duplicates_skipped'], 0)
+
+    def test_oversized_seq_is_rejected(self):
+        url = reverse('soil_moisture:data-receive-batch')
+        response = self.client.post(url, [
+            {'nodeid': '001', 'value': 40.0, 'seq': 1},
+            {'nodeid': '001', 'value': 41.0, 'seq': 2 ** 64},
+        ], format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([item['index'] for item in response.data['data']['rejected']], [1])
+
+        url = reverse('soil_moisture:data-receive-stream')
+        body = b'{"nodeid": "001", "value": 42.0, "seq": 3}\n{"nodeid": "001", "value": 43.0, "seq": 18446744073709551616}\n'
+        response = self.client.post(url, body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['data']['rejected_lines'], [2])
+        self.assertEqual(sorted(SoilMoisture.objects.values_list('seq', flat=True)), [1, 3])
+
+    def test_binary_frames_carry_seq(self):
+        url = reverse('soil_moisture:data-receive-batch')
+        body = encode_frame('001', 5, 40.0) + encode_frame('001', 6, 41.0)
+        self.client.post(url, body, content_type=MEDIA_TYPE)
+        response = self.client.post(url, body, content_type=MEDIA_TYPE)
+
+        self.assertEqual(response.data['data']['accepted'], 0)
+        self.assertEqual(response.data['data']['duplicates_skipped'], 2)
+        self.assertEqual(sorted(SoilMoisture.objects.values_list('seq', flat=True)), [5, 6])
+
+    def test_reading_stored_concurrently_gets_no_bookkeeping(self):
+        SystemMode.objects.create(mode=SystemMode.Mode.AUTOMATIC)
+        ThresholdConfig.objects.create(sensor_id='001', threshold=50.0)
+        decision_snapshot.clear()
+
+        def race(readings):
+            fresh, duplicates = real_drop_duplicates(readings)
+            # Another request stores seq 7 after the duplicate check
+            SoilMoisture.objects.create(sensor_id='001', value=60.0, seq=7)
+            return fresh, duplicates
+
+        real_drop_duplicates = ingest.drop_duplicates
+        with mock.patch.object(ingest, 'drop_duplicates', race):
+            result = ingest_readings([{'nodeid': '001', 'value': 10.0, 'seq': 7}])
+
+        self.assertEqual((result['records'], result['duplicates']), ([], 1))
+        self.assertEqual(result['motor_updates'], {})
+        self.assertEqual(Motor.objects.get(pk=self.motor.pk).state, 'OFF')
+        self.assertEqual(counters.total(['001']), 0)
+        self.assertFalse(ReadingRollup.objects.exists())
+        self.assertFalse(LatestReading.objects.exists())
+
+        with mock.patch.object(ingest, 'drop_duplicates', lambda readings: (readings, 0)):
+            result = ingest_readings([
+                {'nodeid': '001', 'value': 10.0, 'seq': 7}, {'nodeid': '001', 'value': 20.0, 'seq': 8},
+            ])
+        self.assertEqual([record.seq for record in result['records']], [8])
+        self.assertEqual(LatestReading.objects.get(sensor_id='001').reading_id, result['records'][0].id)
+
+    def test_stream_replay_reports_duplicates(self):
+        url = reverse('soil_moisture:data-receive-stream')
+        body = b'{"nodeid": "001", "value": 40.0, "seq": 1}\n{"nodeid": "001", "value": 41.0, "seq": 2}\n'
+        self.client.post(url, body, content_type='application/x-ndjson')
+        response = self.client.post(url, body, content_type='application/x-ndjson')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['data']['accepted'], 0)
+        self.assertEqual(response.data['data']['duplicates_skipped'], 2)
+
+
+class MqttIngestTests(IngestTestCase):
+    """MQTT payload decoding and the micro-batching bridge behind `manage.py mqtt_ingest`."""
+
+    def test_decodes_zone_arrays_readings_and_frames(self):
+        readings, rejected = decode_message('irrigation/dev1/sensors', b'{"soil_moisture": [45, 52, 140]}')
+        self.assertEqual([(r['nodeid'], r['value']) for r in readings], [('dev1_zone1', 45.0), ('dev1_zone2', 52.0)])
+        self.assertEqual(rejected, 1)
+
+        telemetry = b'{"status": "online", "sensors": {"soil_moisture": [30], "tank_level": 75}}'
+        readings, _ = decode_message('irrigation/dev1/telemetry', telemetry)
+        self.assertEqual(readings[0]['nodeid'], 'dev1_zone1')
+
+        readings, _ = decode_message('irrigation/gw/sensors', b'{"readings": [{"nodeid": "001", "value": 40, "seq": 9}]}')
+        self.assertEqual(readings[0]['seq'], 9)
+
+        readings, _ = decode_message('irrigation/gw/sensors', encode_frame('001', 4, 41.5))
+        self.assertEqual((readings[0]['nodeid'], readings[0]['value'], readings[0]['seq']), ('001', 41.5, 4))
+
+        self.assertEqual(decode_message('irrigation/dev1/heartbeat', b'{"uptime": 5}'), ([], 0))
+        with self.assertRaises(ValueError):
+            decode_message('irrigation/dev1/sensors', b'not json')
+
+    def test_bridge_writes_micro_batches_with_motor_control(self):
+        sensor = Sensor.objects.create(nodeid='dev1_zone1')
+        Motor.objects.create(sensor=sensor, name='Pump 1')
+        bridge = MqttIngestBridge(batch_size=3, flush_interval_ms=0)
+
+        bridge.handle_message('irrigation/dev1/sensors', b'{"soil_moisture": [70, 20, 30, 40]}')
+        bridge.handle_message('irrigation/dev1/sensors', b'garbage')
+        self.assertEqual(bridge.write_batch(bridge.next_batch(timeout=0)), 3)
+        bridge.drain()
+
+        self.assertEqual(SoilMoisture.objects.count(), 4)
+        self.assertEqual(Motor.objects.get(sensor=sensor).state, 'ON')
+        self.assertEqual(bridge.stats()['rejected'], 1)
+
+    def test_full_queue_blocks_then_drops_after_timeout(self):
+        bridge = MqttIngestBridge(queue_size=2, put_timeout=0.01)
+        bridge.handle_message('irrigation/dev1/sensors', b'{"soil_moisture": [1, 2, 3]}')
+        self.assertEqual(bridge.stats()['queue_depth'], 2)
+        self.assertEqual(bridge.stats()['dropped'], 1)
+
+    def test_command_requires_paho(self):
+        with mock.patch.dict(sys.modules, {'paho': None, 'paho.mqtt': None, 'paho.mqtt.client': None}):
+            with self.assertRaises(CommandError):
+                call_command('mqtt_ingest')
+
+
+class UplinkReportTests(IngestTestCase):
+    """Packet loss / latency report used for gateway load tests."""
+
+    def test_reports_loss_from_sequence_gaps(self):
+        sensor = Sensor.objects.create(nodeid='L000')
+        now = timezone.now()
+        # Boot epoch 1: seq 0-9 with 3 and 4 missing; epoch 2 restarts at 0
+        seqs = [(1 << 16) | n for n in range(10) if n not in (3, 4)] + [(2 << 16) | n for n in range(5)]
+        SoilMoisture.objects.bulk_create([
+            SoilMoisture(sensor=sensor, value=40.0, seq=seq, timestamp=now - timedelta(seconds=2), device_timestamped=True)
+            for seq in seqs
+        ])
+        Sensor.objects.create(nodeid='001')
+        SoilMoisture.objects.create(sensor_id='001', value=40.0, seq=1)
+
+        out = StringIO()
+        call_command('uplink_report', prefix='L', stdout=out)
+        row = next(line for line in out.getvalue().splitlines() if line.startswith('L000')).split()
+
+        self.assertEqual(row[1:5], ['13', '15', '2', '13.33%'])
+        self.assertNotIn('001', out.getvalue())
+
+
+class DecisionSnapshotTests(IngestTestCase):
+    """In-memory sensor/motor/threshold snapshot on the ingest path."""
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.url = reverse('soil_moisture:data-receive')
+        self.sensor = Sensor.objects.create(nodeid='001')
+        Motor.objects.create(sensor=self.sensor, name='Pump 1')
+        ThresholdConfig.objects.create(sensor=self.sensor, threshold=50.0)
+        SystemMode.get_instance()
+        self.post(20.0)  # warm the snapshot
+
+    def post(self, value):
+        # Snapshot updates wait for the commit
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.url, {'nodeid': '001', 'value': value}, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response
+
+    def test_steady_state_is_one_insert_plus_update_on_flip(self):
+        # savepoint + insert + counter, rollup and latest reading upserts + release
+        with self.assertNumQueries(6):
+            self.post(30.0)
+        with self.assertNumQueries(7):
+            response = self.post(80.0)
+        self.assertEqual(response.data['motor_update']['new_state'], 'ON')
+        with self.assertNumQueries(6):
+            self.post(85.0)
+        self.assertEqual(Motor.objects.get(sensor=self.sensor).state, 'ON')
+
+    def test_threshold_change_invalidates_snapshot(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            ThresholdConfig.set_threshold(self.sensor, 90.0)
+        response = self.post(80.0)
+        self.assertEqual(response.data['threshold'], 90.0)
+        self.assertEqual(Motor.objects.get(sensor=self.sensor).state, 'OFF')
+
+    def test_snapshot_waits_for_commit(self):
+        # Before commit nothing changes, in this process or any other
+        version = decision_snapshot.stamp.current()
+        with self.captureOnCommitCallbacks() as callbacks:
+            ThresholdConfig.set_threshold(self.sensor, 90.0)
+        self.assertEqual(decision_snapshot.stamp.current(), version)
+        self.assertEqual(decision_snapshot.sensor_states(['001'])['001'].threshold, 50.0)
+
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(decision_snapshot.stamp.current(), version)
+        self.assertEqual(decision_snapshot.sensor_states(['001'])['001'].threshold, 90.0)
+
+    def test_version_bump_from_another_process_forces_reload(self):
+        decision_snapshot.stamp.bump()
+        with self.assertNumQueries(10):
+            self.post(30.0)
+
+
+class VersionStampTests(TestCase):
+    """File-backed versions shared between worker processes."""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp(prefix='state_')
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        settings = override_settings(STATE_DIR=directory)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.stamp = VersionStamp('test')
+
+    def test_bump_during_rotation_lands_on_the_new_file(self):
+        self.stamp.bump()
+        path = self.stamp.path
+        # Stand in for another process that is rotating the stamp
+        fd = os.open(path, os.O_WRONLY)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        bumper = threading.Thread(target=self.stamp.bump)
+        bumper.start()
+        bumper.join(0.2)
+        fresh = path.with_name(f'{path.name}.rotating')
+        fresh.touch()
+        os.replace(fresh, path)
+        rotated = self.stamp.current()
+        os.close(fd)
+        bumper.join(5)
+
+        self.assertFalse(bumper.is_alive())
+        self.assertEqual(self.stamp.current(), (rotated[0], 1))
 
-# Create your tests here.
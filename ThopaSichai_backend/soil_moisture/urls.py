@@ -8,7 +8,14 @@ urlpatterns = [
     path('data/', views.list_soil_moisture, name='data-list'),
     path('data/filtered/', views.list_soil_moisture_filtered, name='data-filtered'),
     path('data/receive/', views.receive_soil_moisture, name='data-receive'),
+    path('data/receive/fast/', views.receive_soil_moisture_fast, name='data-receive-fast'),
+    path('data/receive/batch/', views.receive_soil_moisture_batch, name='data-receive-batch'),
+    path('data/receive/stream/', views.receive_soil_moisture_stream, name='data-receive-stream'),
+    path('data/receive/queue/', views.ingest_queue_stats, name='data-receive-queue'),
+    path('data/summary/', views.reading_summary, name='data-summary'),
     path('data/latest/', views.get_latest_sensor_data, name='data-latest'),
+    path('data/latest/all/', views.get_latest_readings, name='data-latest-all'),
+    path('data/stream/', views.stream_readings, name='data-stream'),
     
     # Motor management endpoints
     path('motors/', views.list_create_motors, name='motors-list'),
@@ -0,0 +1,69 @@
+"""
+Cross-process version stamps for in-memory caches.
+
+Each stamp is an append-only file under STATE_DIR; bumping appends one byte,
+so the file size is a monotonically increasing version shared by every worker
+process on the box. Checking it is a single os.stat() - no database query.
+
+Stamps bumped on every ingest would grow without end, so a file past MAX_SIZE
+is replaced by an empty one. The new inode makes that a new version too:
+versions are only ever compared for equality. Appends and the rotation run
+under an flock on the stamp file, so no append can land on an inode that is
+being replaced.
+"""
+import fcntl
+import os
+from pathlib import Path
+
+from django.conf import settings
+
+MAX_SIZE = 1 << 20
+
+
+class VersionStamp:
+    """A named, file-backed change counter shared between processes."""
+
+    def __init__(self, name):
+        self.name = name
+
+    @property
+    def path(self):
+        return Path(settings.STATE_DIR) / f'{self.name}.version'
+
+    def current(self):
+        """Current version as (inode, size); (0, 0) before the first bump."""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return (0, 0)
+        return (st.st_ino, st.st_size)
+
+    def bump(self):
+        """
+        Record a change. Returns (previous, new) versions as seen around this
+        process's own append; previous[1] + 1 == new[1] means no other process
+        bumped in between.
+        """
+        path = self.path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        while True:
+            fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                before = os.fstat(fd)
+                try:
+                    current = os.stat(path)
+                except FileNotFoundError:
+                    current = None
+                if current is None or current.st_ino != before.st_ino:
+                    continue  # rotated while we waited for the lock
+                os.write(fd, b'.')
+                after = os.fstat(fd)
+                if after.st_size >= MAX_SIZE:
+                    fresh = path.with_name(f'{path.name}.{os.getpid()}')
+                    fresh.touch()
+                    os.replace(fresh, path)
+                    after = os.stat(path)
+                return (before.st_ino, before.st_size), (after.st_ino, after.st_size)
+            finally:
+                os.close(fd)
@@ -1,19 +1,40 @@
+import json
 import logging
+from asgiref.sync import sync_to_async
 from rest_framework import status
-from rest_framework.decorators import api_view, authentication_classes, permission_classes
+from rest_framework.decorators import api_view, authentication_classes, permission_classes, parser_classes
+from rest_framework.parsers import JSONParser
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.dateparse import parse_datetime
+from django.conf import settings
+from django.db import IntegrityError, transaction
 from django.utils import timezone
 from drf_spectacular.utils import extend_schema, OpenApiParameter, OpenApiExample, OpenApiResponse
 from drf_spectacular.types import OpenApiTypes
-from .models import SoilMoisture, Motor, SystemMode, ThresholdConfig, Sensor
+from .models import SoilMoisture, Motor, SystemMode, ThresholdConfig, Sensor, LatestReading
 from .serializers import (
     SoilMoistureSerializer, MotorSerializer, SystemModeSerializer,
     ThresholdConfigSerializer, BulkMotorControlSerializer,
+    ReadingInputSerializer, BatchReadingsSerializer,
     SystemStatusSerializer, DashboardStatsSerializer, HealthCheckSerializer
 )
+from .motor_feed import motor_feed
 from .motor_logic import get_motor_state
+from .payload_cache import payload_cache
+from .pagination import COUNT_MODES, NEXT, PREV, CursorError, count_readings, encode_cursor, paginate_readings
+from .parsers import FrameBatch, SensorFrameParser
+from .sampling import sampling_advice
+from .live import cursor_of
+from .stream import stream_events
+from . import counters, ingest_queue, rollups
+from .ingest import (
+    apply_automatic_control, drop_duplicates, dedupe_key, ingest_readings, resolve_sensors,
+    ingest_ndjson_stream, readings_stored
+)
 
 logger = logging.getLogger('soil_moisture')
 
@@ -30,13 +51,74 @@ def create_response(success=True, data=None, message=None, errors=None, status_c
     return Response(response_data, status=status_code)
 
 
+def _readings_page(request, queryset, filtered=False, counted=None):
+    """
+    Page of readings (newest first) for the list endpoints. Returns
+    (data, None) or (None, errors).
+    
+    ?cursor= is a next_cursor/prev_cursor from an earlier page (keyset - every
+    page costs the same); ?page= still works for old clients but uses OFFSET.
+    ?count=none|estimate|exact adds total_count (exact runs COUNT(*)). A
+    total the reading counters know (`counted`) is included by default.
+    """
+    try:
+        page = int(request.query_params.get('page', 1))
+        page_size = int(request.query_params.get('page_size', 100))
+    except ValueError:
+        return None, {'pagination': 'Invalid pagination parameters'}
+    cursor = request.query_params.get('cursor')
+    count_mode = request.query_params.get('count', 'none' if counted is None else 'exact')
+    
+    if page < 1 or page_size < 1 or page_size > 1000:
+        return None, {'pagination': 'Invalid pagination parameters'}
+    if count_mode not in COUNT_MODES:
+        return None, {'count': f"Expected one of: {', '.join(COUNT_MODES)}"}
+    
+    if cursor or page == 1:
+        try:
+            records, pagination = paginate_readings(queryset, page_size, cursor)
+        except CursorError as e:
+            return None, {'cursor': str(e)}
+    else:
+        offset = (page - 1) * page_size
+        records = list(queryset.order_by('-timestamp', '-id')[offset:offset + page_size + 1])
+        has_next = len(records) > page_size
+        records = records[:page_size]
+        pagination = {
+            'page': page,
+            'page_size': page_size,
+            'has_next': has_next,
+            'has_prev': True,
+            'next_cursor': encode_cursor(NEXT, records[-1]) if records and has_next else None,
+            'prev_cursor': encode_cursor(PREV, records[0]) if records else None,
+        }
+    
+    total_count, estimated = count_readings(queryset, count_mode, filtered, counted)
+    pagination['total_count'] = total_count
+    pagination['count_is_estimate'] = estimated
+    if total_count is not None:
+        pagination['total_pages'] = (total_count + page_size - 1) // page_size
+    
+    return {
+        'records': SoilMoistureSerializer(records, many=True).data,
+        'pagination': pagination,
+    }, None
+
+
+PAGINATION_PARAMETERS = [
+    OpenApiParameter(name='cursor', type=str, description='next_cursor or prev_cursor from a previous page'),
+    OpenApiParameter(name='page_size', type=int, description='Items per page (default: 100, max: 1000)'),
+    OpenApiParameter(name='count', type=str, enum=list(COUNT_MODES),
+                     description='Include total_count: none, estimate or exact (runs COUNT(*) unless the '
+                                 'reading counters know the total - then it is included by default)'),
+    OpenApiParameter(name='page', type=int, description='Deprecated - OFFSET paging, slow for deep pages; use cursor'),
+]
+
+
 @extend_schema(
-    parameters=[
-        OpenApiParameter(name='page', type=int, description='Page number (default: 1)'),
-        OpenApiParameter(name='page_size', type=int, description='Items per page (default: 100, max: 1000)'),
-    ],
+    parameters=PAGINATION_PARAMETERS,
     responses={200: SoilMoistureSerializer(many=True)},
-    description="Retrieve all soil moisture records with pagination"
+    description="Retrieve all soil moisture records, newest first, with cursor pagination"
 )
 @api_view(['GET'])
 @authentication_classes([])
@@ -46,36 +128,15 @@ def list_soil_moisture(request):
     try:
         logger.info(f"GET request received from IP: {request.META.get('REMOTE_ADDR')}")
         
-        page = int(request.query_params.get('page', 1))
-        page_size = int(request.query_params.get('page_size', 100))
-        
-        if page < 1 or page_size < 1 or page_size > 1000:
-            return create_response(
-                success=False,
-                errors={'pagination': 'Invalid pagination parameters'},
-                status_code=status.HTTP_400_BAD_REQUEST
-            )
-        
-        offset = (page - 1) * page_size
-        queryset = SoilMoisture.objects.all()
-        total_count = queryset.count()
-        records = queryset[offset:offset + page_size]
-        
-        serializer = SoilMoistureSerializer(records, many=True)
+        data, errors = _readings_page(request, SoilMoisture.objects.all(), counted=counters.total())
+        if errors:
+            return create_response(success=False, errors=errors, status_code=status.HTTP_400_BAD_REQUEST)
         
-        logger.info(f"Retrieved {len(records)} records (page {page}, total: {total_count})")
+        logger.info(f"Retrieved {len(data['records'])} records")
         
         return create_response(
             success=True,
-            data={
-                'records': serializer.data,
-                'pagination': {
-                    'page': page,
-                    'page_size': page_size,
-                    'total_count': total_count,
-                    'total_pages': (total_count + page_size - 1) // page_size if total_count > 0 else 0
-                }
-            },
+            data=data,
             message='Records retrieved successfully'
         )
     
@@ -109,9 +170,14 @@ def receive_soil_moisture(request):
     3. Saves moisture reading linked to sensor
     4. If Motor exists for sensor and in AUTOMATIC mode: controls motor
     5. Motor controller ESP32 fetches /motorsinfo to see which motors to turn on/off
-    """
-    from .models import Sensor, Motor, SystemMode, ThresholdConfig
     
+    Readings carrying a "seq" (or a device "timestamp") are idempotent: a retry
+    of an already stored reading answers 200 with status "duplicate" and does
+    not trigger motor control again.
+    
+    The response carries "next_interval_ms", the sample interval the node
+    should use next (see sampling.py).
+    """
     logger.info(f"Received data from ESP32: {request.data}")
     
     # Get nodeid from request
@@ -123,24 +189,37 @@ def receive_soil_moisture(request):
             status_code=status.HTTP_400_BAD_REQUEST
         )
     
-    # Auto-create sensor if it doesn't exist
-    sensor, sensor_created = Sensor.objects.get_or_create(
-        nodeid=nodeid,
-        defaults={'name': f'Auto-created: {nodeid}'}
-    )
+    if ingest_queue.is_enabled():
+        return _enqueue_soil_moisture(request, nodeid)
     
-    if sensor_created:
-        logger.info(f"Auto-created new sensor: {nodeid}")
+    # Auto-create sensor if it doesn't exist (known sensors come from the snapshot)
+    _, created = resolve_sensors([nodeid])
+    sensor_created = nodeid in created
     
     # Add IP address and prepare data
     data = request.data.copy()
     if 'ip_address' not in data:
         data['ip_address'] = request.META.get('REMOTE_ADDR', 'unknown')
     
-    serializer = SoilMoistureSerializer(data=data, context={'sensor': sensor})
+    serializer = SoilMoistureSerializer(data=data)
     
     if serializer.is_valid():
-        moisture_record = serializer.save(sensor=sensor)
+        device_timestamped = bool(request.data.get('timestamp'))
+        reading = {
+            'nodeid': nodeid,
+            'seq': serializer.validated_data.get('seq'),
+            'timestamp': serializer.validated_data.get('timestamp') if device_timestamped else None,
+        }
+        if dedupe_key(reading) is not None and not drop_duplicates([reading])[0]:
+            return _duplicate_response(nodeid)
+        
+        try:
+            with transaction.atomic():
+                moisture_record = serializer.save(sensor_id=nodeid, device_timestamped=device_timestamped)
+                readings_stored([moisture_record])
+        except IntegrityError:
+            # A concurrent retry of the same reading won the insert
+            return _duplicate_response(nodeid)
         logger.info(f"Successfully saved data from nodeid: {nodeid}, value: {moisture_record.value}%")
         
         response_data = {
@@ -153,54 +232,36 @@ def receive_soil_moisture(request):
         
         # Check if we're in AUTOMATIC mode
         try:
-            current_mode = SystemMode.get_current_mode()
+            current_mode, motor_updates = apply_automatic_control({nodeid: moisture_record.value})
             
             if current_mode == 'AUTOMATIC':
-                # Check if motor exists for this sensor
-                try:
-                    motor = sensor.motor  # OneToOne relationship
-                    
-                    # Get threshold config for this sensor (creates default if not exists)
-                    threshold = ThresholdConfig.get_threshold(sensor)
-                    
-                    # Determine desired motor state based on sensor reading
-                    motor_decision = get_motor_state(
-                        moisture_value=moisture_record.value,
-                        current_state=motor.state,
-                        threshold=threshold
-                    )
-                    
-                    desired_state = motor_decision['desired_state']
-                    
-                    # Update motor state if it changed
-                    if motor.state != desired_state:
-                        motor.state = desired_state
-                        motor.save()
-                        logger.info(f"AUTOMATIC mode: Motor '{motor.name}' (sensor={nodeid}) changed to {desired_state}")
-                        response_data['motor_update'] = {
-                            'motor_name': motor.name,
-                            'sensor_nodeid': nodeid,
-                            'new_state': desired_state,
-                            'reason': motor_decision['reason']
-                        }
-                    else:
-                        response_data['motor_update'] = {
-                            'motor_name': motor.name,
-                            'sensor_nodeid': nodeid,
-                            'state': motor.state,
-                            'reason': f'No change needed - {motor_decision["reason"]}'
-                        }
-                    
-                    response_data['mode'] = 'AUTOMATIC'
-                    response_data['threshold'] = threshold
-                
-                except Motor.DoesNotExist:
+                update = motor_updates.get(nodeid)
+                if update is None:
                     logger.warning(f"No motor found for sensor: {nodeid}")
                     response_data['motor_update'] = f'No motor configured for sensor: {nodeid}'
-                    response_data['mode'] = 'AUTOMATIC'
+                elif update['changed']:
+                    response_data['motor_update'] = {
+                        'motor_name': update['motor_name'],
+                        'sensor_nodeid': nodeid,
+                        'new_state': update['state'],
+                        'reason': update['reason']
+                    }
+                    response_data['threshold'] = update['threshold']
+                else:
+                    response_data['motor_update'] = {
+                        'motor_name': update['motor_name'],
+                        'sensor_nodeid': nodeid,
+                        'state': update['state'],
+                        'reason': f"No change needed - {update['reason']}"
+                    }
+                    response_data['threshold'] = update['threshold']
+                response_data['mode'] = 'AUTOMATIC'
             else:
                 response_data['mode'] = 'MANUAL'
                 response_data['motor_update'] = 'Manual mode - motors not automatically controlled'
+            
+            advice = sampling_advice({nodeid: moisture_record.value}, motor_updates)
+            response_data['next_interval_ms'] = advice[nodeid]['next_interval_ms']
         
         except Exception as e:
             logger.error(f"Error in automatic motor control: {str(e)}", exc_info=True)
@@ -213,6 +274,369 @@ def receive_soil_moisture(request):
     return Response({"status": "error", "errors": serializer.errors}, status=400)
 
 
+def _parse_fast_reading(body):
+    """
+    Hand-rolled validation for receive_soil_moisture_fast - the same rules
+    as SoilMoistureSerializer without the field machinery.
+    Returns (reading dict, errors dict).
+    """
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        return None, {'body': 'Invalid JSON'}
+    if not isinstance(payload, dict):
+        return None, {'body': 'Expected a JSON object'}
+    
+    errors = {}
+    nodeid = payload.get('nodeid')
+    if not nodeid or not isinstance(nodeid, str):
+        errors['nodeid'] = 'This field is required'
+    elif len(nodeid) > 100:
+        errors['nodeid'] = 'Ensure this field has no more than 100 characters'
+    
+    value = payload.get('value')
+    if isinstance(value, str):
+        try:
+            value = float(value)
+        except ValueError:
+            value = None
+    if value is None or isinstance(value, bool) or not isinstance(value, (int, float)):
+        errors['value'] = 'A valid number is required'
+    elif value < 0:
+        errors['value'] = 'Moisture value cannot be negative'
+    elif value > 100:
+        errors['value'] = 'Moisture value cannot exceed 100%'
+    
+    timestamp = payload.get('timestamp')
+    if timestamp:
+        try:
+            timestamp = parse_datetime(timestamp) if isinstance(timestamp, str) else None
+        except ValueError:
+            timestamp = None
+        if timestamp is None:
+            errors['timestamp'] = 'Invalid datetime format'
+        elif not timezone.is_aware(timestamp):
+            timestamp = timezone.make_aware(timestamp)
+    else:
+        timestamp = None
+    
+    seq = payload.get('seq')
+    if seq is not None and (isinstance(seq, bool) or not isinstance(seq, int) or seq < 0):
+        errors['seq'] = 'Expected a non-negative integer'
+    elif seq is not None and seq > 2 ** 63 - 1:
+        # PositiveBigIntegerField's range, as the DRF endpoint enforces
+        errors['seq'] = 'Ensure this value is less than or equal to 9223372036854775807.'
+    
+    if errors:
+        return None, errors
+    return {'nodeid': nodeid, 'value': float(value), 'timestamp': timestamp, 'seq': seq}, None
+
+
+@csrf_exempt  # Exempt from CSRF for IoT devices
+@require_POST
+def receive_soil_moisture_fast(request):
+    """
+    Minimal ingest endpoint for devices: POST {"nodeid": "001", "value": 45.5}
+    (optional "timestamp" and "seq") as JSON.
+    
+    Same behaviour as receive_soil_moisture - sensor auto-create, duplicate
+    skipping and AUTOMATIC motor control - but skips DRF's request wrapping,
+    content negotiation and serializers, and answers with a small fixed
+    response: {"status": "ok", "mode": ..., "motor": ..., "changed": ...,
+    "next_interval_ms": ...}.
+    """
+    reading, errors = _parse_fast_reading(request.body)
+    if errors:
+        return JsonResponse({"status": "error", "errors": errors}, status=400)
+    
+    nodeid = reading['nodeid']
+    resolve_sensors([nodeid])
+    
+    if dedupe_key(reading) is not None and not drop_duplicates([reading])[0]:
+        return JsonResponse({"status": "duplicate", "nodeid": nodeid})
+    
+    record = SoilMoisture(
+        sensor_id=nodeid,
+        value=reading['value'],
+        timestamp=reading['timestamp'] or timezone.now(),
+        ip_address=request.META.get('REMOTE_ADDR', 'unknown'),
+        seq=reading['seq'],
+        device_timestamped=reading['timestamp'] is not None,
+    )
+    try:
+        with transaction.atomic():
+            record.save(force_insert=True)
+            readings_stored([record])
+    except IntegrityError:
+        return JsonResponse({"status": "duplicate", "nodeid": nodeid})
+    
+    response_data = {"status": "ok", "nodeid": nodeid}
+    try:
+        current_mode, motor_updates = apply_automatic_control({nodeid: record.value})
+        update = motor_updates.get(nodeid)
+        response_data['mode'] = current_mode
+        response_data['motor'] = update['state'] if update else None
+        response_data['changed'] = update['changed'] if update else False
+        response_data['next_interval_ms'] = sampling_advice(
+            {nodeid: record.value}, motor_updates
+        )[nodeid]['next_interval_ms']
+    except Exception as e:
+        # Don't fail the request, just log the error
+        logger.error(f"Error in automatic motor control: {str(e)}", exc_info=True)
+        response_data['motor_control_error'] = str(e)
+    
+    return JsonResponse(response_data, status=201)
+
+
+def _duplicate_response(nodeid):
+    logger.info(f"Duplicate reading from nodeid: {nodeid} ignored")
+    return Response({
+        "status": "duplicate",
+        "message": "Reading already received",
+        "nodeid": nodeid,
+        "duplicates_skipped": 1
+    }, status=status.HTTP_200_OK)
+
+
+def _enqueue_soil_moisture(request, nodeid):
+    """
+    Write-behind path for receive_soil_moisture (INGEST_QUEUE_ENABLED).
+    Validates the reading, stamps it with the accept time and queues it;
+    the background writer stores it and runs motor control after the flush.
+    """
+    data = request.data.copy()
+    if 'ip_address' not in data:
+        data['ip_address'] = request.META.get('REMOTE_ADDR', 'unknown')
+    
+    serializer = ReadingInputSerializer(data=data)
+    if not serializer.is_valid():
+        logger.warning(f"Validation errors: {serializer.errors}")
+        return Response({"status": "error", "errors": serializer.errors}, status=400)
+    
+    reading = dict(serializer.validated_data)
+    # Keep the accept time separate so it isn't mistaken for a device timestamp
+    reading['received_at'] = timezone.now()
+    
+    queue = ingest_queue.get_ingest_queue()
+    if not queue.put(reading):
+        logger.warning(f"Ingest queue full, rejected reading from nodeid: {nodeid}")
+        return Response(
+            {"status": "error", "errors": {"detail": "Ingest queue full, retry later"}},
+            status=status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+    
+    return Response({
+        "status": "queued",
+        "message": "Data accepted for processing",
+        "nodeid": nodeid,
+        "moisture_value": reading['value'],
+        "queue_depth": queue.depth,
+        # From the current motor state - the queued reading isn't decided yet
+        "next_interval_ms": sampling_advice({nodeid: reading['value']})[nodeid]['next_interval_ms']
+    }, status=status.HTTP_202_ACCEPTED)
+
+
+@extend_schema(
+    responses={200: OpenApiResponse(description="Write-behind ingest queue depth, flush latency and drop counters")},
+    description="Monitoring endpoint for the write-behind ingestion queue"
+)
+@api_view(['GET'])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def ingest_queue_stats(request):
+    """Queue depth, flush latency and dropped-reading counters for this worker process."""
+    queue = ingest_queue.get_ingest_queue() if ingest_queue.is_enabled() else None
+    return create_response(
+        success=True,
+        data={
+            'enabled': ingest_queue.is_enabled(),
+            'stats': queue.stats() if queue else None
+        },
+        message='Ingest queue stats retrieved successfully'
+    )
+
+
+# Upper bound on readings accepted in one batch request
+MAX_BATCH_SIZE = 1000
+
+
+@extend_schema(
+    request=BatchReadingsSerializer,
+    responses={201: OpenApiResponse(description="Readings stored; motors updated once per sensor if in AUTOMATIC mode")},
+    description="Batch sensor endpoint - receives many readings (possibly from many nodeids) in one request. "
+                "Accepts JSON or concatenated binary frames (application/vnd.thopasichai.frame)."
+)
+@api_view(['POST'])
+@csrf_exempt  # Exempt from CSRF for IoT devices
+@authentication_classes([])
+@permission_classes([AllowAny])
+@parser_classes([JSONParser, SensorFrameParser])
+def receive_soil_moisture_batch(request):
+    """
+    Batch endpoint for gateways. No authentication or CSRF required.
+    Accepts either a bare list of readings or {"readings": [...]}:
+        [{"nodeid": "001", "value": 45.5}, {"nodeid": "002", "value": 61.0, "timestamp": "..."}]
+    
+    Gateways can instead POST concatenated binary frames with
+    Content-Type: application/vnd.thopasichai.frame (see wire.py); those are
+    decoded and range-checked by the parser and skip the serializer.
+    
+    Valid readings are stored with a single bulk INSERT in one transaction and
+    the AUTOMATIC mode decision runs once per sensor using its newest reading.
+    Invalid readings are skipped and reported by their index in the batch.
+    
+    "sampling" maps each nodeid in the batch to its recommended
+    next_interval_ms and threshold, which the gateway relays to the node.
+    """
+    readings = request.data.get('readings') if isinstance(request.data, dict) else request.data
+    is_frame_batch = isinstance(readings, FrameBatch)
+    
+    if is_frame_batch and readings.rejected and not readings:
+        return create_response(
+            success=False,
+            data={'rejected': readings.rejected},
+            errors={'readings': 'No valid readings in batch'},
+            status_code=status.HTTP_400_BAD_REQUEST
+        )
+    
+    if not isinstance(readings, list) or not readings:
+        return create_response(
+            success=False,
+            errors={'readings': 'Expected a non-empty list of readings'},
+            status_code=status.HTTP_400_BAD_REQUEST
+        )
+    
+    if len(readings) > MAX_BATCH_SIZE:
+        return create_response(
+            success=False,
+            errors={'readings': f'Batch too large (max {MAX_BATCH_SIZE} readings)'},
+            status_code=status.HTTP_400_BAD_REQUEST
+        )
+    
+    # Validate every reading in one pass, keeping the valid ones
+    if is_frame_batch:
+        # Binary frames are already typed and range-checked by the parser
+        valid_readings, rejected = readings, readings.rejected
+    else:
+        valid_readings = []
+        rejected = []
+        for index, item in enumerate(readings):
+            serializer = ReadingInputSerializer(data=item)
+            if serializer.is_valid():
+                valid_readings.append(serializer.validated_data)
+            else:
+                rejected.append({'index': index, 'errors': serializer.errors})
+    
+    if not valid_readings:
+        logger.warning(f"Batch rejected, no valid readings: {rejected}")
+        return create_response(
+            success=False,
+            data={'rejected': rejected},
+            errors={'readings': 'No valid readings in batch'},
+            status_code=status.HTTP_400_BAD_REQUEST
+        )
+    
+    try:
+        result = ingest_readings(valid_readings, ip_address=request.META.get('REMOTE_ADDR', 'unknown'))
+    except Exception as e:
+        logger.error(f"Error storing reading batch: {str(e)}", exc_info=True)
+        return create_response(
+            success=False,
+            errors={'detail': 'An error occurred while storing readings'},
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+    
+    logger.info(
+        f"Batch stored: {len(result['records'])} reading(s), {result['duplicates']} duplicate(s), "
+        f"{len(rejected)} rejected"
+    )
+    
+    return create_response(
+        success=True,
+        data={
+            'received': len(valid_readings) + len(rejected),
+            'accepted': len(result['records']),
+            'duplicates_skipped': result['duplicates'],
+            'rejected': rejected,
+            'sensors_created': sorted(result['sensors_created']),
+            'mode': result['mode'],
+            'motor_updates': list(result['motor_updates'].values()),
+            'sampling': result['sampling'],
+        },
+        message=f"{len(result['records'])} reading(s) stored",
+        status_code=status.HTTP_201_CREATED
+    )
+
+
+@extend_schema(
+    request={'application/x-ndjson': OpenApiTypes.BINARY},
+    responses={201: OpenApiResponse(description="Per-chunk counts and line numbers of rejected lines")},
+    description="Streaming backfill endpoint - newline-delimited JSON readings, inserted in fixed-size chunks."
+)
+@api_view(['POST'])
+@csrf_exempt  # Exempt from CSRF for IoT devices
+@authentication_classes([])
+@permission_classes([AllowAny])
+def receive_soil_moisture_stream(request):
+    """
+    Streaming endpoint for gateways uploading buffered readings after an outage.
+    Body is newline-delimited JSON, one reading per line:
+        {"nodeid": "001", "value": 45.5, "timestamp": "2025-12-25T10:30:00Z"}
+        {"nodeid": "002", "value": 61.0, "timestamp": "2025-12-25T10:30:05Z"}
+    
+    The body is read line by line from the request stream (request.data is never
+    touched), so memory stays bounded by INGEST_STREAM_CHUNK_SIZE readings.
+    Motor control runs once at the end using each sensor's newest reading.
+    """
+    chunk_size = getattr(settings, 'INGEST_STREAM_CHUNK_SIZE', 500)
+    
+    if request.stream is None:
+        return create_response(
+            success=False,
+            errors={'body': 'Expected newline-delimited JSON readings'},
+            status_code=status.HTTP_400_BAD_REQUEST
+        )
+    
+    try:
+        summary = ingest_ndjson_stream(
+            request.stream,
+            chunk_size=chunk_size,
+            ip_address=request.META.get('REMOTE_ADDR', 'unknown')
+        )
+    except Exception as e:
+        logger.error(f"Error ingesting reading stream: {str(e)}", exc_info=True)
+        return create_response(
+            success=False,
+            errors={'detail': 'An error occurred while storing readings'},
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+    
+    logger.info(
+        f"Stream stored: {summary['accepted']} reading(s) in {len(summary['chunks'])} chunk(s), "
+        f"{summary['duplicates']} duplicate(s), {len(summary['rejected_lines'])} line(s) rejected"
+    )
+    
+    # A fully duplicated replay is still a success - everything is stored
+    stored = summary['accepted'] + summary['duplicates']
+    return create_response(
+        success=stored > 0,
+        data={
+            'lines': summary['lines'],
+            'accepted': summary['accepted'],
+            'duplicates_skipped': summary['duplicates'],
+            'chunk_size': chunk_size,
+            'chunks': summary['chunks'],
+            'rejected_lines': summary['rejected_lines'],
+            'rejected': summary['rejected'],
+            'sensors_created': sorted(summary['sensors_created']),
+            'mode': summary['mode'],
+            'motor_updates': list(summary['motor_updates'].values()),
+        },
+        message=f"{summary['accepted']} reading(s) stored",
+        status_code=status.HTTP_201_CREATED if stored else status.HTTP_400_BAD_REQUEST
+    )
+
+
 @extend_schema(
     parameters=[
         OpenApiParameter(name='nodeid', type=str, description='Filter by specific node ID'),
@@ -233,7 +657,7 @@ def get_latest_sensor_data(request):
     Optional query parameters:
     - nodeid: Filter by specific node ID
     - check_motor: If 'false', excludes motor state recommendation (default: 'true')
-    - low_threshold: Custom low threshold (default: 30)
+    - low_threshold: Custom low threshold (default: 45)
     - high_threshold: Custom high threshold (default: 70)
     - current_motor_state: Current motor state for hysteresis logic (default: 'OFF')
     """
@@ -243,13 +667,12 @@ def get_latest_sensor_data(request):
         
         logger.info(f"GET latest sensor data request from IP: {request.META.get('REMOTE_ADDR')}, nodeid={nodeid}")
         
-        # Build query
-        queryset = SoilMoisture.objects.all()
+        # Latest reading of the sensor, or of the sensor heard from last
+        queryset = LatestReading.objects.all()
         if nodeid:
-            queryset = queryset.filter(nodeid=nodeid)
-        
-        # Get the latest record
-        latest_record = queryset.order_by('-created_at').first()
+            queryset = queryset.filter(sensor_id=nodeid)
+        latest = queryset.order_by('-last_received_at').first()
+        latest_record = latest.as_reading() if latest else None
         
         if not latest_record:
             return create_response(
@@ -276,6 +699,7 @@ def get_latest_sensor_data(request):
                 motor_decision = get_motor_state(
                     moisture_value=latest_record.value,
                     current_state=current_motor_state,
+                    threshold=(low_threshold + high_threshold) / 2,
                     low_threshold=low_threshold,
                     high_threshold=high_threshold
                 )
@@ -305,6 +729,80 @@ def get_latest_sensor_data(request):
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
+
+@extend_schema(
+    parameters=[
+        OpenApiParameter(name='nodeid', type=str, description='Only these node IDs (comma-separated)'),
+    ],
+    responses={200: SoilMoistureSerializer(many=True)},
+    description="Latest reading of every sensor (zone overview) in one query"
+)
+@api_view(['GET'])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def get_latest_readings(request):
+    """
+    GET the newest reading of each sensor, from LatestReading (see latest.py).
+    Sensors without readings are left out.
+    Query params: nodeid (comma-separated)
+    """
+    try:
+        queryset = LatestReading.objects.order_by('sensor_id')
+        nodeid = request.query_params.get('nodeid')
+        if nodeid:
+            queryset = queryset.filter(sensor_id__in=[item for item in nodeid.split(',') if item])
+        
+        readings = [latest.as_reading() for latest in queryset]
+        return create_response(
+            success=True,
+            data={
+                'readings': SoilMoistureSerializer(readings, many=True).data,
+                'count': len(readings),
+            },
+            message='Latest readings retrieved successfully'
+        )
+    
+    except Exception as e:
+        logger.error(f"Error retrieving latest readings: {str(e)}", exc_info=True)
+        return create_response(
+            success=False,
+            errors={'detail': 'An error occurred while retrieving latest readings'},
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+@require_GET
+async def stream_readings(request):
+    """
+    Server-Sent Events stream of new readings and motor changes (see stream.py).
+    
+    GET with optional ?nodeid=001,002 to follow some sensors. On reconnect,
+    EventSource sends Last-Event-ID and missed events are replayed; clients
+    that can't set headers may pass ?last_event_id= instead.
+    """
+    nodeids = {nodeid for value in request.GET.getlist('nodeid') for nodeid in value.split(',') if nodeid}
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    if last_event_id is not None:
+        try:
+            last_event_id = int(last_event_id)
+            # Ids are past write times; anything else can't be replayed (and a
+            # huge one would overflow the datetime once the stream has started)
+            if not 0 <= last_event_id <= cursor_of(timezone.now()):
+                raise ValueError(last_event_id)
+        except ValueError:
+            return JsonResponse(
+                {"status": "error", "errors": {"last_event_id": "Expected an event id from this stream"}},
+                status=400
+            )
+    
+    response = StreamingHttpResponse(
+        stream_events(nodeids or None, last_event_id), content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Stop nginx buffering the stream
+    return response
+
+
 # ===============================
 # MOTOR CONTROL ENDPOINTS
 # ===============================
@@ -583,6 +1081,35 @@ def set_system_mode(request):
 # NEW ENDPOINTS - ADDITIONAL FEATURES
 # ===============================
 
+def _build_system_status():
+    # Get latest moisture reading (of the sensor heard from last)
+    latest = LatestReading.objects.order_by('-last_received_at').first()
+    latest_moisture = latest.as_reading() if latest else None
+    
+    # Get all motors
+    motors = Motor.objects.select_related('sensor')
+    
+    # Get system mode
+    system_mode = SystemMode.get_instance()
+    
+    # Get all threshold configs
+    thresholds = ThresholdConfig.objects.select_related('sensor')
+    
+    return {
+        'latest_moisture': SoilMoistureSerializer(latest_moisture).data if latest_moisture else None,
+        'motors': MotorSerializer(motors, many=True).data,
+        'system_mode': SystemModeSerializer(system_mode).data,
+        'thresholds': ThresholdConfigSerializer(thresholds, many=True).data,
+        'timestamp': timezone.now()
+    }
+
+
+@payload_cache.patcher('system_status')
+def _patch_system_status(response_data, records):
+    newest = max(records, key=lambda record: record.created_at)
+    return {**response_data, 'latest_moisture': SoilMoistureSerializer(newest).data}
+
+
 @extend_schema(
     responses={200: SystemStatusSerializer},
     description="Get combined system status - latest moisture, motors, mode, and thresholds in one call"
@@ -593,28 +1120,10 @@ def set_system_mode(request):
 def get_system_status(request):
     """
     Combined endpoint returning latest moisture, all motor states, system mode, and thresholds.
-    Single call for mobile app dashboard.
+    Single call for mobile app dashboard. Served from the payload cache (see payload_cache.py).
     """
     try:
-        # Get latest moisture reading
-        latest_moisture = SoilMoisture.objects.order_by('-created_at').first()
-        
-        # Get all motors
-        motors = Motor.objects.all()
-        
-        # Get system mode
-        system_mode = SystemMode.get_instance()
-        
-        # Get all threshold configs
-        thresholds = ThresholdConfig.objects.all()
-        
-        response_data = {
-            'latest_moisture': SoilMoistureSerializer(latest_moisture).data if latest_moisture else None,
-            'motors': MotorSerializer(motors, many=True).data,
-            'system_mode': SystemModeSerializer(system_mode).data,
-            'thresholds': ThresholdConfigSerializer(thresholds, many=True).data,
-            'timestamp': timezone.now()
-        }
+        response_data = payload_cache.get('system_status', request.query_params.dict(), _build_system_status)
         
         return create_response(
             success=True,
@@ -636,8 +1145,7 @@ def get_system_status(request):
         OpenApiParameter(name='nodeid', type=str, description='Filter by node ID'),
         OpenApiParameter(name='start_date', type=OpenApiTypes.DATETIME, description='Start date (YYYY-MM-DD or ISO format)'),
         OpenApiParameter(name='end_date', type=OpenApiTypes.DATETIME, description='End date (YYYY-MM-DD or ISO format)'),
-        OpenApiParameter(name='page', type=int, description='Page number'),
-        OpenApiParameter(name='page_size', type=int, description='Items per page (max: 1000)'),
+        *PAGINATION_PARAMETERS,
     ],
     responses={200: SoilMoistureSerializer(many=True)},
     description="List soil moisture data with date range and node filtering"
@@ -648,7 +1156,7 @@ def get_system_status(request):
 def list_soil_moisture_filtered(request):
     """
     Enhanced list endpoint with date range and node filtering.
-    Query params: nodeid, start_date, end_date, page, page_size
+    Query params: nodeid, start_date, end_date, cursor, page_size, count
     """
     try:
         from datetime import datetime
@@ -658,7 +1166,7 @@ def list_soil_moisture_filtered(request):
         # Filter by nodeid
         nodeid = request.query_params.get('nodeid')
         if nodeid:
-            queryset = queryset.filter(nodeid=nodeid)
+            queryset = queryset.filter(sensor_id=nodeid)
         
         # Filter by date range
         start_date = request.query_params.get('start_date')
@@ -686,39 +1194,22 @@ def list_soil_moisture_filtered(request):
                     status_code=status.HTTP_400_BAD_REQUEST
                 )
         
-        # Pagination
-        page = int(request.query_params.get('page', 1))
-        page_size = int(request.query_params.get('page_size', 100))
-        
-        if page < 1 or page_size < 1 or page_size > 1000:
-            return create_response(
-                success=False,
-                errors={'pagination': 'Invalid pagination parameters'},
-                status_code=status.HTTP_400_BAD_REQUEST
-            )
-        
-        total_count = queryset.count()
-        offset = (page - 1) * page_size
-        records = queryset[offset:offset + page_size]
-        
-        serializer = SoilMoistureSerializer(records, many=True)
+        filtered = bool(nodeid or start_date or end_date)
+        counted = None
+        if not (start_date or end_date):
+            counted = counters.total([nodeid] if nodeid else None)
+        data, errors = _readings_page(request, queryset, filtered=filtered, counted=counted)
+        if errors:
+            return create_response(success=False, errors=errors, status_code=status.HTTP_400_BAD_REQUEST)
+        data['filters'] = {
+            'nodeid': nodeid,
+            'start_date': start_date,
+            'end_date': end_date
+        }
         
         return create_response(
             success=True,
-            data={
-                'records': serializer.data,
-                'pagination': {
-                    'page': page,
-                    'page_size': page_size,
-                    'total_count': total_count,
-                    'total_pages': (total_count + page_size - 1) // page_size if total_count > 0 else 0
-                },
-                'filters': {
-                    'nodeid': nodeid,
-                    'start_date': start_date,
-                    'end_date': end_date
-                }
-            },
+            data=data,
             message='Filtered records retrieved successfully'
         )
     
@@ -731,6 +1222,85 @@ def list_soil_moisture_filtered(request):
         )
 
 
+def _parse_window_bound(value):
+    """Aware datetime from YYYY-MM-DD or ISO format, or None when invalid."""
+    from datetime import datetime
+    
+    try:
+        moment = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    return moment if timezone.is_aware(moment) else timezone.make_aware(moment)
+
+
+@extend_schema(
+    parameters=[
+        OpenApiParameter(name='nodeid', type=str, description='Only these node IDs (comma-separated)'),
+        OpenApiParameter(name='start_date', type=OpenApiTypes.DATETIME, description='Window start, inclusive (default: 24 hours before end_date)'),
+        OpenApiParameter(name='end_date', type=OpenApiTypes.DATETIME, description='Window end, exclusive (default: now)'),
+        OpenApiParameter(name='by_sensor', type=bool, description='Also break the summary down per node'),
+    ],
+    description="Count, mean, min, max and standard deviation of the readings in a time window, from the rollups"
+)
+@api_view(['GET'])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def reading_summary(request):
+    """
+    Reading statistics over any window, answered from the minute/hour/day
+    rollups (see rollups.py) - the cost doesn't grow with the window or the
+    table.
+    Query params: nodeid, start_date, end_date, by_sensor
+    """
+    try:
+        from datetime import timedelta
+        
+        errors = {}
+        end = timezone.now()
+        if request.query_params.get('end_date'):
+            end = _parse_window_bound(request.query_params['end_date'])
+            if end is None:
+                errors['end_date'] = 'Invalid date format. Use YYYY-MM-DD or ISO format'
+        start = end - timedelta(hours=24) if end else None
+        if request.query_params.get('start_date'):
+            start = _parse_window_bound(request.query_params['start_date'])
+            if start is None:
+                errors['start_date'] = 'Invalid date format. Use YYYY-MM-DD or ISO format'
+        if not errors and start >= end:
+            errors['start_date'] = 'start_date must be before end_date'
+        if errors:
+            return create_response(success=False, errors=errors, status_code=status.HTTP_400_BAD_REQUEST)
+        
+        nodeid = request.query_params.get('nodeid')
+        nodeids = [item for item in nodeid.split(',') if item] if nodeid else None
+        
+        data = {
+            'start_date': start,
+            'end_date': end,
+            'nodeids': nodeids,
+            **rollups.summarize(start, end, nodeids).as_dict(),
+        }
+        if request.query_params.get('by_sensor', '').lower() in ('1', 'true', 'yes'):
+            per_sensor = rollups.summarize(start, end, nodeids, by_sensor=True)
+            data['sensors'] = {
+                sensor_id: summary.as_dict() for sensor_id, summary in sorted(per_sensor.items())
+            }
+        
+        return create_response(
+            success=True,
+            data=data,
+            message='Reading summary retrieved successfully'
+        )
+    
+    except Exception as e:
+        logger.error(f"Error retrieving reading summary: {str(e)}", exc_info=True)
+        return create_response(
+            success=False,
+            errors={'detail': 'An error occurred while retrieving the reading summary'},
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
 @extend_schema(
     responses={200: ThresholdConfigSerializer},
     description="Get all moisture threshold configurations (per nodeid)"
@@ -843,8 +1413,7 @@ def health_check(request):
         db_status = "healthy"
         
         # Get last sensor update
-        latest_reading = SoilMoisture.objects.order_by('-created_at').first()
-        last_update = latest_reading.created_at if latest_reading else None
+        last_update = _last_reading_time()
         
         time_since_update = None
         if last_update:
@@ -889,6 +1458,57 @@ def health_check(request):
         )
 
 
+def _last_reading_time():
+    """When the last reading was stored, from the per-sensor latest readings."""
+    from django.db.models import Max
+    
+    return LatestReading.objects.aggregate(last=Max('last_received_at'))['last']
+
+
+def _build_dashboard_stats():
+    from datetime import timedelta
+    
+    # Total readings and sensors with readings, from the counters
+    total_readings, unique_nodes = counters.totals()
+    
+    # Average moisture last 24 hours / 7 days, from the rollups
+    now = timezone.now()
+    avg_24h = rollups.summarize(now - timedelta(hours=24), now).mean or 0.0
+    avg_7d = rollups.summarize(now - timedelta(days=7), now).mean or 0.0
+    
+    # Motor counts
+    motors_on = Motor.objects.filter(state='ON').count()
+    motors_off = Motor.objects.filter(state='OFF').count()
+    
+    # System mode
+    system_mode = SystemMode.get_current_mode()
+    
+    # Last reading time
+    last_reading_time = _last_reading_time()
+    
+    return {
+        'total_readings': total_readings,
+        'avg_moisture_24h': round(avg_24h, 2),
+        'avg_moisture_7d': round(avg_7d, 2),
+        'motors_on_count': motors_on,
+        'motors_off_count': motors_off,
+        'system_mode': system_mode,
+        'last_reading_time': last_reading_time,
+        'unique_nodes': unique_nodes
+    }
+
+
+@payload_cache.patcher('dashboard_stats')
+def _patch_dashboard_stats(stats, records):
+    newest = max(record.created_at for record in records)
+    last = stats['last_reading_time']
+    return {
+        **stats,
+        'total_readings': stats['total_readings'] + len(records),
+        'last_reading_time': newest if last is None or newest > last else last,
+    }
+
+
 @extend_schema(
     responses={200: DashboardStatsSerializer},
     description="Dashboard statistics - readings count, averages, motor status"
@@ -897,50 +1517,9 @@ def health_check(request):
 @authentication_classes([])
 @permission_classes([AllowAny])
 def dashboard_stats(request):
-    """Get statistics for dashboard display."""
+    """Get statistics for dashboard display, from the payload cache (see payload_cache.py)."""
     try:
-        from datetime import timedelta
-        from django.db.models import Avg
-        
-        # Total readings
-        total_readings = SoilMoisture.objects.count()
-        
-        # Average moisture last 24 hours
-        yesterday = timezone.now() - timedelta(hours=24)
-        avg_24h = SoilMoisture.objects.filter(
-            timestamp__gte=yesterday
-        ).aggregate(avg=Avg('value'))['avg'] or 0.0
-        
-        # Average moisture last 7 days
-        week_ago = timezone.now() - timedelta(days=7)
-        avg_7d = SoilMoisture.objects.filter(
-            timestamp__gte=week_ago
-        ).aggregate(avg=Avg('value'))['avg'] or 0.0
-        
-        # Motor counts
-        motors_on = Motor.objects.filter(state='ON').count()
-        motors_off = Motor.objects.filter(state='OFF').count()
-        
-        # System mode
-        system_mode = SystemMode.get_current_mode()
-        
-        # Last reading time
-        latest = SoilMoisture.objects.order_by('-created_at').first()
-        last_reading_time = latest.created_at if latest else None
-        
-        # Unique nodes
-        unique_nodes = SoilMoisture.objects.values('nodeid').distinct().count()
-        
-        stats = {
-            'total_readings': total_readings,
-            'avg_moisture_24h': round(avg_24h, 2),
-            'avg_moisture_7d': round(avg_7d, 2),
-            'motors_on_count': motors_on,
-            'motors_off_count': motors_off,
-            'system_mode': system_mode,
-            'last_reading_time': last_reading_time,
-            'unique_nodes': unique_nodes
-        }
+        stats = payload_cache.get('dashboard_stats', request.query_params.dict(), _build_dashboard_stats)
         
         return create_response(
             success=True,
@@ -1036,41 +1615,80 @@ def bulk_motor_control(request):
 # SIMPLE MOTOR INFO ENDPOINT
 # ===============================
 
+@require_GET
+async def motors_info(request):
+    """
+    Simple endpoint that returns motor states by sensor nodeid.
+    Returns: {"sensor_zone1": "ON", "sensor_zone2": "OFF", ...}
+    No authentication required, CSRF exempt for IoT devices.
+    
+    The ETag is the motor-state version (see motor_feed.py). A request whose
+    If-None-Match equals it gets 304 without a database query; with ?wait=N
+    it is held until a motor changes (200 with the new states) or N seconds
+    pass (304). The hold is awaited here, like stream_readings, so waiting
+    actuators don't each tie up a sync worker thread; the reply itself comes
+    from motors_state.
+    """
+    try:
+        wait = float(request.GET.get('wait', 0))
+    except ValueError:
+        return JsonResponse({"error": "wait must be a number of seconds"}, status=400)
+    wait = min(max(wait, 0.0), getattr(settings, 'MOTORS_INFO_MAX_WAIT_SECONDS', 30))
+    
+    # One read: a change landing after the ETag check must end the wait
+    version = motor_feed.version()
+    if wait and request.headers.get('If-None-Match') == motor_feed.etag(version):
+        try:
+            await motor_feed.wait_for_change(version, wait)
+        except Exception as e:
+            # Answer now rather than fail - the actuator just polls again
+            logger.error(f"Error waiting for motor changes: {str(e)}", exc_info=True)
+    return await sync_to_async(motors_state)(request)
+
+
 @extend_schema(
-    responses={200: OpenApiResponse(
-        description="Simple motor status by name",
-        examples=[
-            OpenApiExample(
-                'Motors Info Response',
-                value={
-                    "motor1": "ON",
-                    "motor2": "OFF",
-                    "pump_a": "ON"
-                }
-            )
-        ]
-    )},
-    description="Get simple motor status - returns motor states by name without IDs or extra metadata"
+    parameters=[
+        OpenApiParameter(name='wait', type=float, description='Long-poll: when If-None-Match matches, hold the '
+                         'request up to this many seconds for a change (max MOTORS_INFO_MAX_WAIT_SECONDS)'),
+    ],
+    responses={
+        200: OpenApiResponse(
+            description="Simple motor status by name",
+            examples=[
+                OpenApiExample(
+                    'Motors Info Response',
+                    value={
+                        "motor1": "ON",
+                        "motor2": "OFF",
+                        "pump_a": "ON"
+                    }
+                )
+            ]
+        ),
+        304: OpenApiResponse(description="Motor states unchanged since the If-None-Match ETag"),
+    },
+    description="Get simple motor status - returns motor states by name without IDs or extra metadata. "
+                "Supports ETag/If-None-Match and ?wait=N long-polling."
 )
 @api_view(['GET'])
 @csrf_exempt
 @authentication_classes([])
 @permission_classes([AllowAny])
-def motors_info(request):
+def motors_state(request):
     """
-    Simple endpoint that returns motor states by sensor nodeid.
-    Returns: {"sensor_zone1": "ON", "sensor_zone2": "OFF", ...}
-    No authentication required, CSRF exempt for IoT devices.
+    Motor states by sensor nodeid, or 304 when If-None-Match is the current
+    version. motors_info serves it after any long-poll wait, and its schema
+    documents /api/motorsinfo/ (see schema.py).
     """
     try:
-        motors = Motor.objects.select_related('sensor').all()
-        
-        # Build simple dict with sensor nodeid as key and state as value
-        motors_dict = {motor.sensor.nodeid: motor.state for motor in motors}
+        version = motor_feed.version()
+        if request.headers.get('If-None-Match') == motor_feed.etag(version):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': motor_feed.etag(version)})
         
-        logger.info(f"Motors info requested from IP: {request.META.get('REMOTE_ADDR')}")
+        version, motors_dict = motor_feed.states()
+        logger.debug(f"Motors info requested from IP: {request.META.get('REMOTE_ADDR')}")
         
-        return Response(motors_dict, status=status.HTTP_200_OK)
+        return Response(motors_dict, status=status.HTTP_200_OK, headers={'ETag': motor_feed.etag(version)})
     
     except Exception as e:
         logger.error(f"Error retrieving motors info: {str(e)}", exc_info=True)
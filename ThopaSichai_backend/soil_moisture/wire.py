@@ -0,0 +1,103 @@
+"""
+Compact binary wire format for sensor uplink.
+
+Sensor nodes send one fixed-layout frame per sample over ESP-NOW, the gateway
+forwards frames untouched, and a batch upload is simply frames concatenated
+back to back. All fields are little-endian:
+
+    offset  size  field
+    0       1     version (FRAME_VERSION)
+    1       1     flags - low nibble: number of extra channels (0-15)
+    2       4     node id, ASCII, NUL padded ("001", "us01")
+    6       4     sequence number (uint32, per node, see EspCodes/wireframe.py)
+    10      4     device timestamp, Unix seconds (0 = unknown, server stamps it)
+    14      2     value, uint16 scaled by VALUE_SCALE (45.67% -> 4567)
+    16      2*n   optional extra channels, uint16, same scaling
+
+The MicroPython encoder lives in EspCodes/wireframe.py and must stay in sync.
+"""
+import struct
+from datetime import datetime, timezone as dt_timezone
+
+FRAME_VERSION = 1
+MEDIA_TYPE = 'application/vnd.thopasichai.frame'
+
+HEADER = struct.Struct('<BB4sIIH')
+CHANNEL = struct.Struct('<H')
+VALUE_SCALE = 100
+MAX_EXTRA_CHANNELS = 0x0F
+
+
+class FrameError(ValueError):
+    """Raised when a frame buffer can't be decoded."""
+
+
+def encode_frame(nodeid, seq, value, timestamp=0, extras=()):
+    """Encode one reading as a binary frame (mirrors the firmware encoder)."""
+    if len(extras) > MAX_EXTRA_CHANNELS:
+        raise FrameError(f"At most {MAX_EXTRA_CHANNELS} extra channels are supported")
+    node = nodeid.encode('ascii')
+    if len(node) > 4:
+        raise FrameError("Node id must be at most 4 ASCII characters")
+    frame = HEADER.pack(
+        FRAME_VERSION, len(extras), node, seq, int(timestamp), round(value * VALUE_SCALE)
+    )
+    return frame + b''.join(CHANNEL.pack(round(extra * VALUE_SCALE)) for extra in extras)
+
+
+def decode_frames(data, max_value=100.0):
+    """
+    Decode concatenated frames into reading dicts ready for ingestion.
+
+    Framing errors (unknown version, truncated frame) make the rest of the
+    buffer unreadable, so they raise FrameError. A frame that decodes fine but
+    carries an out-of-range value is skipped and reported instead.
+
+    Returns:
+        Tuple of (readings, rejected) where readings are dicts with 'nodeid',
+        'value', 'seq', 'timestamp' (None when the device didn't know the time)
+        and 'extras', and rejected is a list of {'index', 'errors'} dicts.
+    """
+    view = memoryview(data)
+    readings = []
+    rejected = []
+    offset = 0
+    index = 0
+
+    while offset < len(view):
+        if len(view) - offset < HEADER.size:
+            raise FrameError(f"Truncated frame header at byte {offset}")
+
+        version, flags, node, seq, timestamp, raw_value = HEADER.unpack_from(view, offset)
+        if version != FRAME_VERSION:
+            raise FrameError(f"Unsupported frame version {version} at byte {offset}")
+
+        channels = flags & MAX_EXTRA_CHANNELS
+        end = offset + HEADER.size + channels * CHANNEL.size
+        if end > len(view):
+            raise FrameError(f"Truncated extra channels at byte {offset}")
+
+        extras = [
+            CHANNEL.unpack_from(view, offset + HEADER.size + i * CHANNEL.size)[0] / VALUE_SCALE
+            for i in range(channels)
+        ]
+        offset = end
+
+        nodeid = bytes(node).rstrip(b'\x00').decode('ascii', errors='replace')
+        value = raw_value / VALUE_SCALE
+
+        if not nodeid:
+            rejected.append({'index': index, 'errors': {'nodeid': ['Empty node id']}})
+        elif value > max_value:
+            rejected.append({'index': index, 'errors': {'value': [f'Moisture value cannot exceed {max_value:g}%']}})
+        else:
+            readings.append({
+                'nodeid': nodeid,
+                'value': value,
+                'seq': seq,
+                'timestamp': datetime.fromtimestamp(timestamp, tz=dt_timezone.utc) if timestamp else None,
+                'extras': extras,
+            })
+        index += 1
+
+    return readings, rejected